@@ -2,9 +2,15 @@
 Flask应用主文件
 提供项目路线图工具的后端API服务
 """
-from flask import Flask, jsonify
+import os
+import signal
+import sys
+
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+import config
+
 app = Flask(__name__)
 
 # 配置CORS，允许前端跨域访问
@@ -12,11 +18,54 @@ CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5173"],
         "methods": ["GET", "POST", "PUT", "DELETE"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", "X-Data-Generation"],
+        "expose_headers": ["X-Data-Generation"]
     }
 })
 
 
+@app.before_request
+def guard_replica():
+    """
+    只读副本：确保复制线程运行，并拒绝所有修改请求（修改只能在主节点上进行）
+    """
+    if not config.is_follower():
+        return None
+    from utils.replication import ensure_following
+    
+    ensure_following()
+    if request.path.startswith('/api/') and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return jsonify({
+            'success': False,
+            'error': f'只读副本不接受修改，请在主节点上操作: {config.REPLICATION_LEADER}'
+        }), 403
+    return None
+
+
+@app.before_request
+def start_backups():
+    """
+    确保后台定时备份线程运行（见 utils/backup.py）
+    """
+    from utils.backup import ensure_backups
+    
+    ensure_backups()
+
+
+@app.after_request
+def add_generation_header(response):
+    """
+    在API响应中返回读己之写令牌（当前的全局写入代数，见 utils/dataset.py）
+    客户端在后续请求中带回该值，即可保证读到自己此前的写入
+    """
+    if request.path.startswith('/api/'):
+        from utils.dataset import GENERATION_HEADER
+        from utils.generation import global_generation
+        
+        response.headers[GENERATION_HEADER] = str(global_generation())
+    return response
+
+
 @app.route('/')
 def health_check():
     """
@@ -41,16 +90,51 @@ def api_health():
     })
 
 
+@app.route('/api/stats')
+def api_stats():
+    """
+    运行统计端点
+    返回数据文件缓存的命中、未命中和淘汰计数，组提交的写入合并情况，
+    数据集快照的版本信息，延迟写入的刷盘延迟，文件锁的等待情况，
+    数据文件监视线程的重新加载情况，主从复制的日志位置和延迟，以及定时备份的执行情况
+    """
+    from utils.backup import get_backup_stats
+    from utils.dataset import get_dataset_stats
+    from utils.file_handler import get_cache_stats, get_write_stats
+    from utils.file_lock import get_lock_stats
+    from utils.file_watcher import get_watcher_stats
+    from utils.replication import get_replication_stats
+    from utils.write_behind import get_write_behind_stats
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'cache': get_cache_stats(),
+            'writes': get_write_stats(),
+            'dataset': get_dataset_stats(),
+            'writeBehind': get_write_behind_stats(),
+            'locks': get_lock_stats(),
+            'watcher': get_watcher_stats(),
+            'replication': get_replication_stats(),
+            'backup': get_backup_stats()
+        }
+    })
+
+
 # 注册蓝图
 from routes.productlines import productlines_bp
 from routes.projects import projects_bp
 from routes.settings import bp as settings_bp
 from routes.owners import owners_bp  # 新增：人员路由
+from routes.replication import replication_bp
+from routes.sync import sync_bp
 
 app.register_blueprint(productlines_bp)
 app.register_blueprint(projects_bp)
 app.register_blueprint(settings_bp)
 app.register_blueprint(owners_bp)  # 新增：注册人员路由
+app.register_blueprint(replication_bp)
+app.register_blueprint(sync_bp)
 
 
 # 应用启动时执行数据迁移
@@ -78,13 +162,39 @@ def run_migrations():
         print("应用将继续启动，但可能需要手动执行迁移")
 
 
+def install_shutdown_handlers():
+    """
+    安装终止信号处理，保证处理请求的进程正常退出，由atexit落盘延迟写入的数据
+    
+    SIGTERM由Werkzeug处理为正常退出，但debug模式下重载器父进程收到SIGTERM
+    会立即杀死处理请求的子进程。因此start.py停止后端时向整个进程组发送SIGHUP：
+    父进程按默认处理直接退出，子进程在这里正常退出并落盘。
+    """
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: sys.exit(0))
+
+
 if __name__ == '__main__':
-    # 启动前执行数据迁移
-    run_migrations()
+    # 停止后端时先落盘延迟写入的数据再退出
+    install_shutdown_handlers()
+    
+    if config.is_follower():
+        # 只读副本的数据全部来自主节点，不执行迁移；启动后立即开始复制
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            from utils.replication import ensure_following
+            ensure_following()
+    else:
+        # 启动前执行数据迁移，并按配置归档早已结束的项目、截断过期的变更历史
+        run_migrations()
+        from utils.archive import run_archival
+        from utils.history import run_truncation
+        run_archival()
+        run_truncation()
     
-    # 开发模式运行
+    # 开发模式运行（多线程处理请求，并发的读取共享文件读锁并行进行）
     app.run(
         host='127.0.0.1',
-        port=5000,
-        debug=True
+        port=config.PORT,
+        debug=True,
+        threaded=True
     )
@@ -0,0 +1,181 @@
+"""
+应用配置模块
+从环境变量读取运行参数，未设置时使用默认值
+"""
+import os
+
+# 数据目录（默认为项目根目录下的data；同一台机器上同时运行主节点和只读副本时分别指定）
+DATA_DIR = os.environ.get('ROADMAP_DATA_DIR', '').strip()
+
+# 后端监听端口
+PORT = int(os.environ.get('ROADMAP_PORT', '5000'))
+
+# 存储后端：json（默认，JSON文件 + 追加日志）、sqlite 或 memory（进程内存，见 utils/repository.py）
+STORAGE_BACKEND = os.environ.get('ROADMAP_STORAGE_BACKEND', 'json').strip().lower()
+
+# SQLite数据库文件名（位于data目录下，仅sqlite后端使用）
+SQLITE_DB_NAME = os.environ.get('ROADMAP_SQLITE_DB', 'roadmap.db')
+
+# 项目数据布局：single（默认，单个projects.json）或 sharded（按产品线分片，仅json后端）
+PROJECT_LAYOUT = os.environ.get('ROADMAP_PROJECT_LAYOUT', 'single').strip().lower()
+
+# 内存后端的快照策略：interval（默认，按刷盘间隔写入data/memory_snapshot/）、
+# on-shutdown（进程退出时写入）或 off（不写入）
+MEMORY_SNAPSHOT = os.environ.get('ROADMAP_MEMORY_SNAPSHOT', 'interval').strip().lower()
+
+# 数据文件监视方式（见 utils/file_watcher.py）：auto（默认，优先inotify，不可用时轮询）、
+# inotify、poll 或 off（不监视，每次读取时检查文件签名）
+FILE_WATCHER = os.environ.get('ROADMAP_FILE_WATCHER', 'auto').strip().lower()
+
+# 轮询方式的检查间隔（秒）
+WATCH_INTERVAL = float(os.environ.get('ROADMAP_WATCH_INTERVAL', '1'))
+
+# 获取数据文件锁的超时时间（秒）
+LOCK_TIMEOUT = float(os.environ.get('ROADMAP_LOCK_TIMEOUT', '10'))
+
+# 数据文件写入格式：json（默认，带缩进的普通JSON）、compact（紧凑快照格式）
+# 或 compact-gzip（紧凑格式 + gzip压缩）；读取时自动识别，无需与写入格式一致
+SNAPSHOT_FORMAT = os.environ.get('ROADMAP_SNAPSHOT_FORMAT', 'json').strip().lower()
+
+# 数据文件持久化策略（见 utils/write_behind.py）：逗号分隔，不带等号的项为默认策略，
+# "文件名模式=策略" 为单个文件的策略，如 "sync,settings.json=interval"
+def _parse_durability(value):
+    """
+    解析持久化策略配置
+    
+    Args:
+        value: 配置字符串
+        
+    Returns:
+        tuple: (默认策略, [(文件名模式, 策略), ...])
+    """
+    default = 'sync'
+    overrides = []
+    for item in value.split(','):
+        item = item.strip()
+        if '=' in item:
+            pattern, mode = item.split('=', 1)
+            overrides.append((pattern.strip(), mode.strip().lower()))
+        elif item:
+            default = item.lower()
+    return default, overrides
+
+
+WRITE_DURABILITY, WRITE_DURABILITY_OVERRIDES = _parse_durability(
+    os.environ.get('ROADMAP_WRITE_DURABILITY', 'sync')
+)
+
+# 延迟写入的刷盘间隔（秒）和触发立即刷盘的未落盘修改次数
+FLUSH_INTERVAL = float(os.environ.get('ROADMAP_FLUSH_INTERVAL', '1'))
+FLUSH_DIRTY_THRESHOLD = int(os.environ.get('ROADMAP_FLUSH_DIRTY_THRESHOLD', '100'))
+
+# 复制角色（见 utils/replication.py）：off（默认）、leader（主节点，记录修改日志供副本拉取）
+# 或 follower（只读副本，从主节点拉取日志并应用到自己的数据目录，只提供GET接口）
+REPLICATION_ROLE = os.environ.get('ROADMAP_REPLICATION_ROLE', 'off').strip().lower()
+
+# 主节点地址（follower必须设置），如 http://10.0.0.5:5000
+REPLICATION_LEADER = os.environ.get('ROADMAP_REPLICATION_LEADER', '').strip().rstrip('/')
+
+# 副本拉取日志时在主节点上等待新修改的最长时间（秒，长轮询）
+REPLICATION_POLL_TIMEOUT = float(os.environ.get('ROADMAP_REPLICATION_POLL_TIMEOUT', '10'))
+
+# 归档期限（天，见 utils/archive.py）：启动时把结束日期早于该天数之前的已上、暂停项目
+# 移入按年份划分的归档分区；0（默认）为不自动归档
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ROADMAP_ARCHIVE_AFTER_DAYS', '0'))
+
+# 项目变更历史的检查点间隔（见 utils/history.py）：每个项目每隔N个版本保存一次完整记录，
+# 还原任意版本最多回放N-1个增量
+HISTORY_CHECKPOINT_INTERVAL = int(os.environ.get('ROADMAP_HISTORY_CHECKPOINT_INTERVAL', '20'))
+
+# 项目变更历史的保留期限（天）：启动时和执行 maintenance compact 时把更早的版本合并为
+# 截断时间点的检查点，早于该时间点的状态无法再查询；0为不截断
+HISTORY_RETENTION_DAYS = int(os.environ.get('ROADMAP_HISTORY_RETENTION_DAYS', '365'))
+
+# 定时备份间隔（秒，见 utils/backup.py）：后台线程把全部数据的一致快照压缩保存到
+# 备份目录；0为关闭
+BACKUP_INTERVAL = float(os.environ.get('ROADMAP_BACKUP_INTERVAL', '3600'))
+
+# 备份目录（可选，默认为data目录旁的data_backup目录）
+BACKUP_DIR = os.environ.get('ROADMAP_BACKUP_DIR', '').strip()
+
+# 备份保留策略：保留最近N次备份，另外按小时、天、周各保留最近N个时间段中最新的备份
+BACKUP_KEEP_LAST = int(os.environ.get('ROADMAP_BACKUP_KEEP_LAST', '10'))
+BACKUP_KEEP_HOURLY = int(os.environ.get('ROADMAP_BACKUP_KEEP_HOURLY', '24'))
+BACKUP_KEEP_DAILY = int(os.environ.get('ROADMAP_BACKUP_KEEP_DAILY', '7'))
+BACKUP_KEEP_WEEKLY = int(os.environ.get('ROADMAP_BACKUP_KEEP_WEEKLY', '8'))
+
+if STORAGE_BACKEND not in ('json', 'sqlite', 'memory'):
+    raise ValueError(f"不支持的存储后端: {STORAGE_BACKEND}（可选值: json, sqlite, memory）")
+
+if MEMORY_SNAPSHOT not in ('interval', 'on-shutdown', 'off'):
+    raise ValueError(f"不支持的内存快照策略: {MEMORY_SNAPSHOT}（可选值: interval, on-shutdown, off）")
+
+if FILE_WATCHER not in ('auto', 'inotify', 'poll', 'off'):
+    raise ValueError(f"不支持的文件监视方式: {FILE_WATCHER}（可选值: auto, inotify, poll, off）")
+
+if WATCH_INTERVAL <= 0:
+    raise ValueError(f"文件监视轮询间隔必须大于0: {WATCH_INTERVAL}")
+
+if PROJECT_LAYOUT not in ('single', 'sharded'):
+    raise ValueError(f"不支持的项目数据布局: {PROJECT_LAYOUT}（可选值: single, sharded）")
+
+for _mode in [WRITE_DURABILITY] + [mode for _, mode in WRITE_DURABILITY_OVERRIDES]:
+    if _mode not in ('sync', 'interval', 'on-shutdown'):
+        raise ValueError(f"不支持的持久化策略: {_mode}（可选值: sync, interval, on-shutdown）")
+
+if SNAPSHOT_FORMAT not in ('json', 'compact', 'compact-gzip'):
+    raise ValueError(f"不支持的数据文件格式: {SNAPSHOT_FORMAT}（可选值: json, compact, compact-gzip）")
+
+if REPLICATION_ROLE not in ('off', 'leader', 'follower'):
+    raise ValueError(f"不支持的复制角色: {REPLICATION_ROLE}（可选值: off, leader, follower）")
+
+if REPLICATION_ROLE == 'follower' and not REPLICATION_LEADER:
+    raise ValueError("只读副本必须通过 ROADMAP_REPLICATION_LEADER 指定主节点地址")
+
+if REPLICATION_POLL_TIMEOUT < 0:
+    raise ValueError(f"复制长轮询时间不能为负数: {REPLICATION_POLL_TIMEOUT}")
+
+if ARCHIVE_AFTER_DAYS < 0:
+    raise ValueError(f"归档期限不能为负数: {ARCHIVE_AFTER_DAYS}")
+
+if HISTORY_CHECKPOINT_INTERVAL < 1:
+    raise ValueError(f"历史检查点间隔必须大于0: {HISTORY_CHECKPOINT_INTERVAL}")
+
+if HISTORY_RETENTION_DAYS < 0:
+    raise ValueError(f"历史保留期限不能为负数: {HISTORY_RETENTION_DAYS}")
+
+if BACKUP_INTERVAL < 0:
+    raise ValueError(f"备份间隔不能为负数: {BACKUP_INTERVAL}")
+
+if min(BACKUP_KEEP_LAST, BACKUP_KEEP_HOURLY, BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY) < 0:
+    raise ValueError("备份保留数量不能为负数")
+
+
+def use_sqlite():
+    """
+    是否使用SQLite存储后端
+    
+    Returns:
+        bool: 使用SQLite返回True
+    """
+    return STORAGE_BACKEND == 'sqlite'
+
+
+def is_follower():
+    """
+    是否作为只读副本运行
+    
+    Returns:
+        bool: 复制角色为follower返回True
+    """
+    return REPLICATION_ROLE == 'follower'
+
+
+def use_shards():
+    """
+    是否按产品线分片保存项目（只有JSON后端分片）
+    
+    Returns:
+        bool: 使用分片存储返回True
+    """
+    return PROJECT_LAYOUT == 'sharded' and STORAGE_BACKEND == 'json'
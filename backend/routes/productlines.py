@@ -20,9 +20,12 @@ def get_productlines():
     获取所有产品线
     
     Returns:
-        JSON响应，包含产品线列表
+        JSON响应，包含产品线列表（含每个产品线的关联项目数，包括归档项目）
     """
     productlines = service.get_all()
+    # 前端只加载可见产品线的项目，关联项目数由服务端统计
+    for productline in productlines:
+        productline['projectCount'] = service.get_related_projects_count(productline['id'])
     return jsonify({
         'success': True,
         'data': {
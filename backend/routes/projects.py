@@ -2,13 +2,24 @@
 项目路由
 定义项目相关的API端点
 """
+import base64
+import binascii
+import json
+from datetime import datetime
 from flask import Blueprint, request, jsonify
+from models.project import Project
 from services.project_service import ProjectService
 from utils.decorators import handle_errors
+from utils.history import parse_timestamp
+from utils.sorted_index import SORT_FIELDS, valid_key
 
 # 创建蓝图
 projects_bp = Blueprint('projects', __name__)
 
+# 分页的默认和最大每页数量
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 # 创建服务实例
 service = ProjectService()
 
@@ -17,12 +28,59 @@ service = ProjectService()
 @handle_errors
 def get_projects():
     """
-    获取所有项目
+    获取项目（默认不包含归档项目）
     
+    Query Parameters:
+        includeArchived: true时包含归档项目（可选）
+        from: 只返回结束日期不早于该日期的项目，YYYY-MM-DD（可选）
+        to: 只返回开始日期不晚于该日期的项目，YYYY-MM-DD（可选）
+        指定日期范围时还会返回范围内的归档项目
+        asOf: 毫秒时间戳或YYYY-MM-DD[THH:MM:SS]（可选），返回该时间点的全部项目
+        productLineIds: 产品线ID，逗号分隔或重复参数（可选）
+        ownerIds: 负责人ID，逗号分隔或重复参数（可选）
+        status: 项目状态，逗号分隔或重复参数（可选）
+        isPending: true/false，只返回暂定或非暂定项目（可选）
+        各条件同时满足才返回，列表参数满足其中任意一个值即可
+        limit: 每页数量（可选，默认100，最大1000）
+        cursor: 上一页返回的nextCursor（可选）
+        sort: 排序字段 startDate、endDate、updatedAt、createdAt 或 name（可选，默认startDate）
+        order: asc或desc（可选，默认asc）
+        指定limit、cursor或sort时分页返回，翻页时需带上相同的筛选条件
+        
     Returns:
-        JSON响应，包含项目列表
+        JSON响应，包含项目列表；分页时还包含nextCursor（没有下一页时为null）
     """
-    projects = service.get_all()
+    include_archived = request.args.get('includeArchived', '').lower() in ('true', '1')
+    date_from = _date_arg('from')
+    date_to = _date_arg('to')
+    as_of = request.args.get('asOf')
+    as_of = parse_timestamp(as_of) if as_of else None
+    statuses = _list_arg('status')
+    invalid = [s for s in statuses if s not in Project.VALID_STATUSES]
+    if invalid:
+        raise ValueError(f"项目状态必须是以下之一: {', '.join(Project.VALID_STATUSES)}")
+    filters = {
+        'product_line_ids': _list_arg('productLineIds'),
+        'owner_ids': _list_arg('ownerIds'),
+        'statuses': statuses,
+        'is_pending': _bool_arg('isPending')
+    }
+    
+    if any(name in request.args for name in ('limit', 'cursor', 'sort')):
+        sort, descending, after = _page_args()
+        limit = _limit_arg()
+        projects, last = service.get_page(
+            sort, limit, after, descending, include_archived, date_from, date_to, as_of=as_of, **filters
+        )
+        return jsonify({
+            'success': True,
+            'data': {
+                'projects': projects,
+                'nextCursor': _encode_cursor(sort, descending, last) if last else None
+            }
+        })
+    
+    projects = service.get_all(include_archived, date_from, date_to, as_of=as_of, **filters)
     return jsonify({
         'success': True,
         'data': {
@@ -31,6 +89,176 @@ def get_projects():
     })
 
 
+def _date_arg(name):
+    """
+    读取日期查询参数
+    
+    Args:
+        name: 参数名
+        
+    Returns:
+        str: YYYY-MM-DD格式的日期，未提供返回None
+        
+    Raises:
+        ValueError: 日期格式不正确
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"日期格式错误: {name}={value}（应为YYYY-MM-DD）")
+    return value
+
+
+def _list_arg(name):
+    """
+    读取列表查询参数（逗号分隔，参数可重复）
+    
+    Args:
+        name: 参数名
+        
+    Returns:
+        list: 去掉空白项后的值列表，未提供时为空列表
+    """
+    return [
+        value.strip()
+        for raw in request.args.getlist(name)
+        for value in raw.split(',')
+        if value.strip()
+    ]
+
+
+def _bool_arg(name):
+    """
+    读取布尔查询参数
+    
+    Args:
+        name: 参数名
+        
+    Returns:
+        bool: true/1为True，false/0为False，未提供返回None
+        
+    Raises:
+        ValueError: 参数值不是布尔值
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f"参数格式错误: {name}={value}（应为true或false）")
+
+
+def _limit_arg():
+    """
+    读取每页数量参数
+    
+    Returns:
+        int: 每页数量，未提供时为DEFAULT_PAGE_SIZE
+        
+    Raises:
+        ValueError: 参数不是1到MAX_PAGE_SIZE之间的整数
+    """
+    value = request.args.get('limit')
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    if not value.isdigit() or not 1 <= int(value) <= MAX_PAGE_SIZE:
+        raise ValueError(f"参数格式错误: limit={value}（应为1到{MAX_PAGE_SIZE}之间的整数）")
+    return int(value)
+
+
+def _page_args():
+    """
+    读取排序和游标参数（sort、order未提供时使用游标中记录的值）
+    
+    Returns:
+        tuple: (排序字段, 是否降序, 游标键或None)
+        
+    Raises:
+        ValueError: 参数不正确，或游标与排序条件不一致
+    """
+    sort = request.args.get('sort')
+    order = request.args.get('order')
+    if sort is not None and sort not in SORT_FIELDS:
+        raise ValueError(f"排序字段必须是以下之一: {', '.join(SORT_FIELDS)}")
+    if order is not None and order not in ('asc', 'desc'):
+        raise ValueError(f"参数格式错误: order={order}（应为asc或desc）")
+    
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_sort, cursor_order, after = _decode_cursor(cursor)
+        if (sort or cursor_sort) != cursor_sort or (order or cursor_order) != cursor_order:
+            raise ValueError("分页游标与排序条件不一致")
+        sort, order = cursor_sort, cursor_order
+    return sort or 'startDate', order == 'desc', after
+
+
+def _encode_cursor(sort, descending, key):
+    """
+    生成分页游标（对客户端不透明）
+    
+    Args:
+        sort: 排序字段
+        descending: 是否降序
+        key: 本页最后一个项目的键 (字段值, 项目ID)
+        
+    Returns:
+        str: 游标
+    """
+    payload = json.dumps([sort, 'desc' if descending else 'asc', key[0], key[1]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """
+    解析分页游标
+    
+    Args:
+        cursor: 游标
+        
+    Returns:
+        tuple: (排序字段, asc或desc, 游标键)
+        
+    Raises:
+        ValueError: 游标无效
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, order, value, record_id = json.loads(payload.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError(f"分页游标无效: {cursor}")
+    if sort not in SORT_FIELDS or order not in ('asc', 'desc') or not valid_key((value, record_id), sort):
+        raise ValueError(f"分页游标无效: {cursor}")
+    return sort, order, (value, record_id)
+
+
+@projects_bp.route('/api/projects/date-range', methods=['GET'])
+@handle_errors
+def get_projects_date_range():
+    """
+    获取项目的整体日期范围（不受时间轴范围影响，不含归档项目）
+    
+    Query Parameters:
+        productLineIds: 产品线ID，逗号分隔或重复参数（可选）
+        
+    Returns:
+        JSON响应，包含minDate（最早开始日期）和maxDate（最晚结束日期），没有项目时均为null
+    """
+    min_date, max_date = service.get_date_range(_list_arg('productLineIds'))
+    return jsonify({
+        'success': True,
+        'data': {
+            'minDate': min_date,
+            'maxDate': max_date
+        }
+    })
+
+
 @projects_bp.route('/api/projects/<project_id>', methods=['GET'])
 @handle_errors
 def get_project(project_id):
@@ -57,6 +285,34 @@ def get_project(project_id):
     })
 
 
+@projects_bp.route('/api/projects/<project_id>/history', methods=['GET'])
+@handle_errors
+def get_project_history(project_id):
+    """
+    获取项目的历史版本
+    
+    Args:
+        project_id: 项目ID
+        
+    Returns:
+        JSON响应，包含按版本号升序的历史版本（version、timestamp、op和changes）
+    """
+    versions = service.get_history(project_id)
+    
+    if not versions:
+        return jsonify({
+            'success': False,
+            'error': f'项目不存在: {project_id}'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'history': versions
+        }
+    })
+
+
 @projects_bp.route('/api/projects', methods=['POST'])
 @handle_errors
 def create_project():
@@ -74,7 +330,7 @@ def create_project():
             "isPending": false,
             "remarks": "项目备注（可选）"
         }
-    
+        
     Returns:
         JSON响应，包含创建的项目数据
     """
@@ -126,7 +382,7 @@ def update_project(project_id):
             "isPending": false,
             "remarks": "项目备注（可选）"
         }
-    
+        
     Returns:
         JSON响应，包含更新后的项目数据
     """
@@ -0,0 +1,97 @@
+"""
+复制路由
+主节点向只读副本提供复制日志和数据快照，主节点和副本都提供复制状态
+"""
+from flask import Blueprint, jsonify, request
+
+import config
+from utils.decorators import handle_errors
+from utils.replication import get_replication_stats
+from utils.repository import get_repository
+
+replication_bp = Blueprint('replication', __name__, url_prefix='/api/replication')
+
+# 长轮询等待时间上限（秒）
+MAX_WAIT = 60
+
+
+def _require_leader():
+    """
+    检查本节点是否为主节点
+    
+    Raises:
+        ValueError: 未以主节点角色运行
+    """
+    if config.REPLICATION_ROLE != 'leader':
+        raise ValueError('本节点未以主节点角色运行（ROADMAP_REPLICATION_ROLE=leader）')
+
+
+@replication_bp.route('/log', methods=['GET'])
+@handle_errors
+def get_log():
+    """
+    拉取复制日志
+    
+    Query Parameters:
+        after: 副本已应用的日志序号（默认0）
+        limit: 最多返回的条数（默认500）
+        wait: 没有新日志时最多等待的秒数（默认0，最大60）
+        
+    Returns:
+        JSON响应，包含entries、firstSeq、lastSeq、lastTs和gap
+        
+    Example:
+        GET /api/replication/log?after=41&wait=10
+        Response: {
+            "success": true,
+            "data": {
+                "entries": [{"seq": 42, "ts": 1700000000000, "type": "project", "op": "update", ...}],
+                "firstSeq": 1,
+                "lastSeq": 42,
+                "lastTs": 1700000000000,
+                "gap": false
+            }
+        }
+    """
+    _require_leader()
+    from utils.replication import PULL_LIMIT, get_log as get_replication_log
+    
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', PULL_LIMIT, type=int), 1), PULL_LIMIT)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_WAIT)
+    
+    return jsonify({
+        'success': True,
+        'data': get_replication_log().read(after, limit=limit, wait=wait)
+    })
+
+
+@replication_bp.route('/snapshot', methods=['GET'])
+@handle_errors
+def get_snapshot():
+    """
+    获取与复制日志位置一致的完整数据快照（副本首次启动或日志断档时使用）
+    
+    Returns:
+        JSON响应，包含seq、projects和documents
+    """
+    _require_leader()
+    return jsonify({
+        'success': True,
+        'data': get_repository().replication_snapshot()
+    })
+
+
+@replication_bp.route('/status', methods=['GET'])
+@handle_errors
+def get_status():
+    """
+    获取复制状态（主节点返回日志位置，副本返回复制延迟）
+    
+    Returns:
+        JSON响应，包含复制状态
+    """
+    return jsonify({
+        'success': True,
+        'data': get_replication_stats()
+    })
@@ -0,0 +1,94 @@
+"""
+数据同步路由
+提供Merkle树节点、按ID读取记录和写入同步记录的接口，供两个实例之间
+只交换有差异的数据（见 utils/merkle_sync.py）
+"""
+from flask import Blueprint, jsonify, request
+
+from utils.decorators import handle_errors
+from utils.merkle_sync import FETCH_BATCH, apply_changes, get_records, get_tree
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+
+@sync_bp.route('/<part>/tree', methods=['GET'])
+@handle_errors
+def get_tree_nodes(part):
+    """
+    获取Merkle树节点
+    
+    Query Parameters:
+        prefix: 节点前缀，可重复；不提供时返回根节点
+        
+    Returns:
+        JSON响应，包含 {前缀: 节点} 的nodes
+        
+    Example:
+        GET /api/sync/projects/tree?prefix=3&prefix=a
+        Response: {
+            "success": true,
+            "data": {
+                "nodes": {
+                    "3": {"hash": "...", "children": {"30": "...", "3f": "..."}},
+                    "a": {"hash": "", "children": {}}
+                }
+            }
+        }
+    """
+    tree = get_tree(part)
+    prefixes = request.args.getlist('prefix') or ['']
+    return jsonify({
+        'success': True,
+        'data': {
+            'nodes': {prefix: tree.node(prefix) for prefix in prefixes}
+        }
+    })
+
+
+@sync_bp.route('/<part>/records', methods=['GET'])
+@handle_errors
+def get_records_by_id(part):
+    """
+    按ID获取记录
+    
+    Query Parameters:
+        ids: 逗号分隔的记录ID（最多100个）
+        
+    Returns:
+        JSON响应，包含存在的记录列表
+    """
+    ids = [i for i in request.args.get('ids', '').split(',') if i]
+    if len(ids) > FETCH_BATCH:
+        raise ValueError(f"一次最多获取{FETCH_BATCH}条记录")
+    return jsonify({
+        'success': True,
+        'data': {
+            'records': get_records(part, ids)
+        }
+    })
+
+
+@sync_bp.route('/<part>/apply', methods=['POST'])
+@handle_errors
+def apply_sync(part):
+    """
+    写入同步的记录
+    
+    Request Body:
+        {
+            "upsert": [记录, ...],
+            "delete": ["id", ...]
+        }
+        
+    Returns:
+        JSON响应，包含upserted和deleted数量
+    """
+    data = request.get_json(silent=True) or {}
+    upsert = data.get('upsert', [])
+    delete = data.get('delete', [])
+    if not isinstance(upsert, list) or not isinstance(delete, list):
+        raise ValueError("upsert和delete必须是列表")
+    return jsonify({
+        'success': True,
+        'data': apply_changes(part, upsert, delete)
+    })
@@ -2,13 +2,16 @@
 人员服务层
 处理人员相关的业务逻辑
 """
-import os
+from contextlib import contextmanager
+
 from models.owner import Owner
-from utils.file_handler import read_json_file, write_json_file
+from utils import dataset
+from utils.file_handler import get_data_file_path
+from utils.repository import get_repository
 
 
-# 数据文件路径
-OWNERS_FILE = 'data/owners.json'
+# 数据文件路径（JSON后端，与其他数据文件一样位于项目根目录的data目录下，与当前工作目录无关）
+OWNERS_FILE = get_data_file_path('owners.json')
 
 
 def get_all_owners():
@@ -19,12 +22,12 @@ def get_all_owners():
         list: 人员对象列表
     """
     try:
-        data = read_json_file(OWNERS_FILE)
-        owners = [Owner.from_dict(owner_data) for owner_data in data.get('owners', [])]
+        # 从数据集快照读取，文件不存在时为None
+        data = dataset.current().owners
+        if data is None:
+            return []
+        owners = [Owner.from_dict(owner_data) for owner_data in data]
         return owners
-    except FileNotFoundError:
-        # 文件不存在时返回空列表
-        return []
     except Exception as e:
         raise Exception(f"获取人员列表失败: {str(e)}")
 
@@ -39,11 +42,10 @@ def get_owner_by_id(owner_id):
     Returns:
         Owner: 人员对象，不存在时返回None
     """
-    owners = get_all_owners()
-    for owner in owners:
-        if owner.id == owner_id:
-            return owner
-    return None
+    data = dataset.current().get_owner(owner_id)
+    if data is None:
+        return None
+    return Owner.from_dict(data)
 
 
 def owner_exists(owner_id):
@@ -72,23 +74,18 @@ def create_owner(name):
     Raises:
         ValueError: 姓名重复或验证失败
     """
-    # 获取现有人员列表
-    owners = get_all_owners()
-    
-    # 检查姓名是否重复
-    for owner in owners:
-        if owner.name == name:
+    # 在事务中获取现有人员列表，退出时保存
+    with _owners_transaction() as owners:
+        # 检查姓名是否重复
+        if dataset.name_exists(owners, 'owners', name):
             raise ValueError(f"人员姓名 '{name}' 已存在")
-    
-    # 分配颜色
-    color = _assign_color(owners)
-    
-    # 创建人员对象
-    new_owner = Owner(name=name, color=color)
-    
-    # 保存到文件
-    owners.append(new_owner)
-    _save_owners(owners)
+        
+        # 分配颜色
+        color = _assign_color(owners)
+        
+        # 创建人员对象
+        new_owner = Owner(name=name, color=color)
+        owners.append(new_owner)
     
     return new_owner
 
@@ -112,10 +109,12 @@ def create_default_owner():
         color='#95A5A6'  # 灰色
     )
     
-    # 保存到文件
-    owners = get_all_owners()
-    owners.insert(0, default_owner)  # 放在列表开头
-    _save_owners(owners)
+    # 保存到文件（事务内再检查一次，避免并发迁移重复创建）
+    with _owners_transaction() as owners:
+        position = dataset.locate(owners, 'owners', default_owner.id)
+        if position is not None:
+            return owners[position]
+        owners.insert(0, default_owner)  # 放在列表开头
     
     return default_owner
 
@@ -141,9 +140,10 @@ def delete_owner(owner_id):
         raise ValueError(f"该人员有 {project_count} 个关联项目，无法删除")
     
     # 删除人员
-    owners = get_all_owners()
-    owners = [o for o in owners if o.id != owner_id]
-    _save_owners(owners)
+    with _owners_transaction() as owners:
+        position = dataset.locate(owners, 'owners', owner_id)
+        if position is not None:
+            del owners[position]
 
 
 def update_owner(owner_id, data):
@@ -160,23 +160,18 @@ def update_owner(owner_id, data):
     Raises:
         ValueError: 人员不存在
     """
-    owners = get_all_owners()
-    target_owner = None
-    
-    # 查找并更新
-    for owner in owners:
-        if owner.id == owner_id:
-            target_owner = owner
-            # 更新属性
-            if 'visible' in data:
-                owner.visible = bool(data['visible'])
-            # 可以在此添加其他可更新字段
-            break
-            
-    if not target_owner:
-        raise ValueError(f"人员ID {owner_id} 不存在")
+    # 在事务中查找并更新（属性未变化时不写入）
+    with _owners_transaction() as owners:
+        position = dataset.locate(owners, 'owners', owner_id)
+        if position is None:
+            raise ValueError(f"人员ID {owner_id} 不存在")
         
-    _save_owners(owners)
+        target_owner = owners[position]
+        # 更新属性
+        if 'visible' in data:
+            target_owner.visible = bool(data['visible'])
+        # 可以在此添加其他可更新字段
+    
     return target_owner
 
 
@@ -194,10 +189,7 @@ def get_owner_project_count(owner_id):
         # 导入项目服务（避免循环导入）
         from services.project_service import ProjectService
         
-        service = ProjectService()
-        projects = service.get_all()
-        count = sum(1 for p in projects if p.get('ownerId') == owner_id)
-        return count
+        return ProjectService().count_by('ownerId', owner_id)
     except Exception as e:
         # 打印错误信息以便调试
         print(f"获取项目数量失败: {str(e)}")
@@ -226,30 +218,40 @@ def _assign_color(existing_owners):
     return Owner.generate_hsl_color(owner_count)
 
 
-def _save_owners(owners):
+@contextmanager
+def _owners_transaction():
     """
-    保存人员列表到文件
+    修改人员列表的事务（通过数据仓库），退出时发布新的数据集版本
+    读取、修改和写回在同一次加锁内完成，数据没有变化时不写入；
+    代码块抛出异常时放弃修改
     
-    Args:
-        owners: 人员对象列表
+    Yields:
+        list: 可修改的人员对象列表（原地增删或修改对象属性）
     """
-    # 确保data目录存在
-    os.makedirs('data', exist_ok=True)
-    
-    # 转换为字典格式
-    data = {
-        'owners': [owner.to_dict() for owner in owners]
-    }
+    with dataset.mutation():
+        with get_repository().document_transaction('owners', default={'owners': []}) as data:
+            owners = [Owner.from_dict(owner_data) for owner_data in data.get('owners', [])]
+            yield owners
+            # 转换为字典格式
+            data['owners'] = [owner.to_dict() for owner in owners]
+
+
+def owners_data_exists():
+    """
+    人员数据是否已存在（JSON后端检查owners.json，SQLite后端始终存在）
     
-    # 写入文件
-    write_json_file(OWNERS_FILE, data)
+    Returns:
+        bool: 存在返回True
+    """
+    return get_repository().document_exists('owners')
 
 
 def initialize_owners_file():
     """
     初始化人员数据文件
-    如果文件不存在，创建空文件
+    如果人员数据不存在，创建空的人员列表
     """
-    if not os.path.exists(OWNERS_FILE):
-        os.makedirs('data', exist_ok=True)
-        write_json_file(OWNERS_FILE, {'owners': []})
+    if not owners_data_exists():
+        # 数据不存在时事务从空列表开始并写入
+        with _owners_transaction():
+            pass
@@ -2,8 +2,14 @@
 产品线服务层
 处理产品线相关的业务逻辑
 """
+from contextlib import contextmanager
+
+import config
 from models.productline import ProductLine
-from utils.file_handler import read_json_file, write_json_file, get_data_file_path
+from services.project_service import ProjectService
+from utils import dataset
+from utils.file_handler import get_data_file_path
+from utils.repository import get_repository
 
 
 class ProductLineService:
@@ -16,15 +22,37 @@ class ProductLineService:
         """初始化服务，设置数据文件路径"""
         self.data_file = get_data_file_path('productlines.json')
     
+    @contextmanager
+    def _transaction(self):
+        """
+        修改产品线数据的事务（通过数据仓库），退出时发布新的数据集版本
+        读取、修改和写回在同一次加锁内完成，数据没有变化时不写入
+        
+        Yields:
+            dict: 可修改的 {'productlines': [...]}
+            
+        Raises:
+            FileNotFoundError: 产品线数据文件不存在
+        """
+        with dataset.mutation():
+            with get_repository().document_transaction('productlines') as data:
+                yield data
+    
     def get_all(self):
         """
         获取所有产品线（按order排序）
         
         Returns:
             list: 产品线列表
+            
+        Raises:
+            FileNotFoundError: 产品线数据文件不存在
         """
-        data = read_json_file(self.data_file)
-        productlines = data.get('productlines', [])
+        snapshot = dataset.current().productlines
+        if snapshot is None:
+            raise FileNotFoundError(f"文件不存在: {self.data_file}")
+        # 快照只读，复制后再补充order和排序
+        productlines = [dict(pl) for pl in snapshot]
         
         # 数据迁移：为没有order字段的产品线添加order
         self._migrate_productline_order(productlines)
@@ -47,10 +75,13 @@ class ProductLineService:
                 pl['order'] = i
                 needs_migration = True
         
-        # 如果有数据需要迁移，保存到文件
-        if needs_migration:
-            data = {'productlines': productlines}
-            write_json_file(self.data_file, data)
+        # 如果有数据需要迁移，在事务中对最新数据补充order并保存
+        # （只读副本不写入，由主节点迁移后复制过来）
+        if needs_migration and not config.is_follower():
+            with self._transaction() as data:
+                for i, pl in enumerate(data.get('productlines', [])):
+                    if 'order' not in pl:
+                        pl['order'] = i
     
     def get_by_id(self, productline_id):
         """
@@ -61,12 +92,20 @@ class ProductLineService:
             
         Returns:
             dict: 产品线数据，如果不存在返回None
+            
+        Raises:
+            FileNotFoundError: 产品线数据文件不存在
         """
-        productlines = self.get_all()
-        for pl in productlines:
-            if pl['id'] == productline_id:
-                return pl
-        return None
+        version = dataset.current()
+        if version.productlines is None:
+            raise FileNotFoundError(f"文件不存在: {self.data_file}")
+        productline = version.get_productline(productline_id)
+        if productline is None:
+            return None
+        if 'order' not in productline:
+            # 旧数据没有order字段，通过get_all补充并迁移
+            return next((pl for pl in self.get_all() if pl['id'] == productline_id), None)
+        return dict(productline)
     
     def create(self, name):
         """
@@ -81,28 +120,23 @@ class ProductLineService:
         Raises:
             ValueError: 数据验证失败
         """
-        # 读取现有数据
-        data = read_json_file(self.data_file)
-        productlines = data.get('productlines', [])
-        
-        # 检查名称是否已存在
-        for pl in productlines:
-            if pl['name'] == name:
+        # 在事务中读取现有数据，退出时保存
+        with self._transaction() as data:
+            productlines = data.setdefault('productlines', [])
+            
+            # 检查名称是否已存在
+            if dataset.name_exists(productlines, 'productlines', name):
                 raise ValueError(f"产品线名称已存在: {name}")
-        
-        # 计算新的order值（最大order + 1）
-        max_order = max([pl.get('order', 0) for pl in productlines], default=-1)
-        new_order = max_order + 1
-        
-        # 创建产品线对象（会自动验证）
-        productline = ProductLine(name=name, order=new_order)
-        
-        # 添加新产品线
-        productlines.append(productline.to_dict())
-        data['productlines'] = productlines
-        
-        # 保存到文件
-        write_json_file(self.data_file, data)
+            
+            # 计算新的order值（最大order + 1）
+            max_order = max([pl.get('order', 0) for pl in productlines], default=-1)
+            new_order = max_order + 1
+            
+            # 创建产品线对象（会自动验证）
+            productline = ProductLine(name=name, order=new_order)
+            
+            # 添加新产品线
+            productlines.append(productline.to_dict())
         
         return productline.to_dict()
     
@@ -116,20 +150,15 @@ class ProductLineService:
         Returns:
             bool: 删除成功返回True，产品线不存在返回False
         """
-        data = read_json_file(self.data_file)
-        productlines = data.get('productlines', [])
-        
-        # 查找并删除
-        original_length = len(productlines)
-        productlines = [pl for pl in productlines if pl['id'] != productline_id]
-        
-        if len(productlines) == original_length:
-            return False  # 未找到要删除的产品线
-        
-        data['productlines'] = productlines
-        write_json_file(self.data_file, data)
+        with self._transaction() as data:
+            productlines = data.get('productlines', [])
+            
+            # 查找并删除（未找到时数据不变，事务不会写入）
+            position = dataset.locate(productlines, 'productlines', productline_id)
+            if position is not None:
+                del productlines[position]
         
-        return True
+        return position is not None
     
     def update(self, productline_id, name):
         """
@@ -153,28 +182,23 @@ class ProductLineService:
         # 创建ProductLine对象进行验证（会自动验证名称格式）
         ProductLine(name=name)
         
-        # 读取现有数据
-        data = read_json_file(self.data_file)
-        productlines = data.get('productlines', [])
-        
-        # 检查名称是否与其他产品线重复（排除自己）
-        for pl in productlines:
-            if pl['id'] != productline_id and pl['name'] == name:
+        # 在事务中读取现有数据，退出时保存（名称未变化时不写入）
+        with self._transaction() as data:
+            productlines = data.get('productlines', [])
+            
+            # 检查名称是否与其他产品线重复（排除自己）
+            if dataset.name_exists(productlines, 'productlines', name, exclude_id=productline_id):
                 raise ValueError(f"产品线名称已存在: {name}")
-        
-        # 更新产品线名称
-        for pl in productlines:
-            if pl['id'] == productline_id:
-                pl['name'] = name
-                break
-        
-        data['productlines'] = productlines
-        
-        # 保存到文件
-        write_json_file(self.data_file, data)
+            
+            # 更新产品线名称（产品线已被并发删除时放弃修改）
+            position = dataset.locate(productlines, 'productlines', productline_id)
+            if position is None:
+                raise ValueError(f"产品线不存在: {productline_id}")
+            productlines[position]['name'] = name
+            updated = dict(productlines[position])
         
         # 返回更新后的产品线数据
-        return self.get_by_id(productline_id)
+        return updated
     
     def get_related_projects_count(self, productline_id):
         """
@@ -186,15 +210,8 @@ class ProductLineService:
         Returns:
             int: 关联的项目数量
         """
-        # 读取项目数据
-        projects_file = get_data_file_path('projects.json')
-        projects_data = read_json_file(projects_file)
-        projects = projects_data.get('projects', [])
-        
         # 统计productLineId等于指定ID的项目数量
-        count = sum(1 for project in projects if project.get('productLineId') == productline_id)
-        
-        return count
+        return ProjectService().count_by('productLineId', productline_id)
     
     def delete_with_check(self, productline_id):
         """
@@ -247,21 +264,14 @@ class ProductLineService:
         if not order_list or not isinstance(order_list, list):
             raise ValueError('orderList必须是非空数组')
         
-        # 读取数据
-        data = read_json_file(self.data_file)
-        productlines = data.get('productlines', [])
-        
         # 创建ID到order的映射
         order_map = {item['id']: item['order'] for item in order_list}
         
-        # 更新order
-        for pl in productlines:
-            if pl['id'] in order_map:
-                pl['order'] = order_map[pl['id']]
-        
-        # 保存数据
-        data['productlines'] = productlines
-        write_json_file(self.data_file, data)
+        # 在事务中更新order，顺序未变化时不写入
+        with self._transaction() as data:
+            for pl in data.get('productlines', []):
+                if pl['id'] in order_map:
+                    pl['order'] = order_map[pl['id']]
         
         # 返回排序后的列表
         return self.get_all()
@@ -1,9 +1,29 @@
 """
 项目服务层
 处理项目相关的业务逻辑
+
+项目数据通过数据仓库的项目存储读写（见 utils/repository.py）：JSON后端
+以 projects.json 为快照、projects.journal 为追加日志保存，增删改只追加一行
+日志（见 utils/journal.py），分片布局时按产品线拆分到多个文件（见
+utils/sharded_store.py）；SQLite后端读写SQLite数据库；内存后端读写进程内存。
+
+早已结束的项目可以归档到按年份划分的冷数据分区（见 utils/archive.py），
+默认只读取热数据，请求归档数据或日期范围延伸到归档年份时才读取分区。
+
+项目的每次修改都记录在变更历史中（见 utils/history.py），可以查询单个项目的
+历史版本，或还原任意时间点的全部项目。
+
+项目列表可以按排序字段游标分页（见 get_page），热数据的分页由数据集版本的
+排序索引支持（见 utils/sorted_index.py）。
 """
+import heapq
+
 from models.project import Project
-from utils.file_handler import read_json_file, write_json_file, get_data_file_path
+from utils.archive import overlaps, read_archived
+from utils.file_handler import get_data_file_path
+from utils import dataset, history
+from utils.repository import get_repository
+from utils.sorted_index import sort_key
 
 
 class ProjectService:
@@ -15,20 +35,186 @@ class ProjectService:
     def __init__(self):
         """初始化服务，设置数据文件路径"""
         self.data_file = get_data_file_path('projects.json')
+        self.store = get_repository().project_store()
+        self.archive = get_repository().archive_store()
+    
+    def get_all(self, include_archived=False, date_from=None, date_to=None, as_of=None,
+                product_line_ids=None, owner_ids=None, statuses=None, is_pending=None):
+        """
+        获取项目（默认只返回热数据）
+        返回的是数据集快照中的只读数据，调用方不得修改
+        
+        Args:
+            include_archived: 是否包含归档项目
+            date_from: 只返回结束日期不早于该日期的项目（YYYY-MM-DD，可选）
+            date_to: 只返回开始日期不晚于该日期的项目（YYYY-MM-DD，可选）
+            as_of: 毫秒时间戳（可选），返回该时间点存在的全部项目（包括此后归档的项目）
+            product_line_ids: 只返回属于这些产品线的项目（可选）
+            owner_ids: 只返回这些负责人的项目（可选）
+            statuses: 只返回这些状态的项目（可选）
+            is_pending: 只返回暂定（True）或非暂定（False）的项目（可选）
+            
+        Returns:
+            list: 项目列表；指定日期范围时还包含范围内年份的归档项目
+            
+        Raises:
+            FileNotFoundError: 项目数据文件不存在
+            ValueError: 时间点早于历史开始的时间
+        """
+        fields, matches = _conditions(date_from, date_to, product_line_ids, owner_ids, statuses, is_pending)
+        
+        if as_of is not None:
+            return [p for p in history.projects_as_of(as_of) if matches(p)]
+        
+        version = dataset.current()
+        projects = version.projects
+        if projects is None:
+            raise FileNotFoundError(f"文件不存在: {self.data_file}")
+        
+        ranged = bool(date_from or date_to)
+        if ranged or fields or is_pending is not None:
+            projects = self._select(version, date_from, date_to, fields, matches)
+        if include_archived or ranged:
+            archived = self._archived(version, date_from, date_to, matches)
+            if archived:
+                projects = list(projects) + archived
+        return projects
     
-    def get_all(self):
+    def get_page(self, sort, limit, after=None, descending=False, include_archived=False,
+                 date_from=None, date_to=None, as_of=None,
+                 product_line_ids=None, owner_ids=None, statuses=None, is_pending=None):
         """
-        获取所有项目
+        按排序字段分页获取项目（keyset分页）
+        返回的是数据集快照中的只读数据，调用方不得修改
         
+        热数据沿排序索引从游标位置开始读取，逐条检查筛选条件；按索引条件估计
+        （假设条件相互独立），沿排序索引凑满一页需要检查的项目比候选更多时，
+        改为只对候选排序。每一页的开销与页码无关，
+        翻页期间的写入不会使未修改的项目重复或遗漏。归档项目和历史时间点的
+        项目没有排序索引，筛选后按相同的键合并。
+        
+        Args:
+            sort: 排序字段（utils/sorted_index.py 中的 SORT_FIELDS 之一）
+            limit: 每页数量
+            after: 上一页最后一个项目的键 (字段值, 项目ID)（可选，不提供则返回第一页）
+            descending: 是否按降序
+            include_archived: 是否包含归档项目
+            其余参数同 get_all
+            
         Returns:
-            list: 项目列表
+            tuple: (项目列表, 本页最后一个项目的键)，没有下一页时键为None
+            
+        Raises:
+            FileNotFoundError: 项目数据文件不存在
+            ValueError: 时间点早于历史开始的时间
         """
-        data = read_json_file(self.data_file)
-        return data.get('projects', [])
+        fields, matches = _conditions(date_from, date_to, product_line_ids, owner_ids, statuses, is_pending)
+        
+        def key(project):
+            return sort_key(project, sort)
+        
+        if as_of is not None:
+            projects = [p for p in history.projects_as_of(as_of) if matches(p)]
+            return _paginate(_first(projects, key, after, descending, limit), key, limit)
+        
+        version = dataset.current()
+        if version.projects is None:
+            raise FileNotFoundError(f"文件不存在: {self.data_file}")
+        
+        candidates, estimate = self._candidates(version, date_from, date_to, fields)
+        if candidates is not None and len(candidates) * estimate <= (limit + 1) * len(version.projects):
+            selected = [p for p in version.projects_by_ids(candidates) if matches(p)]
+            page = _first(selected, key, after, descending, limit)
+        else:
+            page = []
+            for _, project_id in version.sorted_index(sort).keys_after(after, descending):
+                project = version.get_project(project_id)
+                if matches(project):
+                    page.append(project)
+                    if len(page) > limit:
+                        break
+        
+        if include_archived or date_from or date_to:
+            archived = self._archived(version, date_from, date_to, matches)
+            if archived:
+                page = list(heapq.merge(
+                    page, _first(archived, key, after, descending, limit), key=key, reverse=descending
+                ))
+        return _paginate(page, key, limit)
+    
+    def _archived(self, version, date_from, date_to, matches):
+        """
+        读取满足条件的归档项目
+        
+        Args:
+            version: 数据集版本
+            date_from: 范围开始日期（可选）
+            date_to: 范围结束日期（可选）
+            matches: 判断项目是否满足全部条件的函数
+            
+        Returns:
+            list: 归档项目列表（只读）
+        """
+        # 归档中断时项目可能同时存在于热数据和归档中，以热数据为准
+        return [
+            p for p in read_archived(date_from, date_to)
+            if matches(p) and version.get_project(p['id']) is None
+        ]
+    
+    def _candidates(self, version, date_from, date_to, fields):
+        """
+        从索引中取得候选项目ID
+        
+        候选取自二级索引（产品线、负责人、状态中命中项目最少的条件）；有日期
+        范围且二级索引的候选超过全部项目的1/8（或没有这些条件）时，改用日期
+        区间索引。
+        
+        Args:
+            version: 数据集版本
+            date_from: 范围开始日期（可选）
+            date_to: 范围结束日期（可选）
+            fields: {字段名: 允许的值集合}
+            
+        Returns:
+            tuple: (候选项目ID，没有可用的索引条件时为None,
+                    假设条件相互独立时满足已查询的索引条件的项目数量估计)
+        """
+        total = len(version.projects)
+        candidates = None
+        estimate = float(total)
+        for field, values in fields.items():
+            ids = [i for value in values for i in version.project_ids_by(field, value)]
+            estimate *= len(ids) / total if total else 0
+            if candidates is None or len(ids) < len(candidates):
+                candidates = ids
+        if (date_from or date_to) and (candidates is None or len(candidates) > total // 8):
+            candidates = version.interval_index().overlapping(date_from, date_to)
+            estimate *= len(candidates) / total if total else 0
+        return candidates, estimate
+    
+    def _select(self, version, date_from, date_to, fields, matches):
+        """
+        按条件筛选热数据：先用最小的索引结果作为候选（见 _candidates），再逐条
+        检查其余条件；只有isPending条件时扫描全部项目
+        
+        Args:
+            version: 数据集版本
+            date_from: 范围开始日期（可选）
+            date_to: 范围结束日期（可选）
+            fields: {字段名: 允许的值集合}
+            matches: 判断项目是否满足全部条件的函数
+            
+        Returns:
+            list: 项目列表（按项目列表中的顺序）
+        """
+        candidates, _ = self._candidates(version, date_from, date_to, fields)
+        if candidates is None:
+            return [p for p in version.projects if matches(p)]
+        return [p for p in version.projects_by_ids(candidates) if matches(p)]
     
     def get_by_id(self, project_id):
         """
-        根据ID获取项目
+        根据ID获取项目（热数据中不存在时查找归档）
         
         Args:
             project_id: 项目ID
@@ -36,11 +222,10 @@ class ProjectService:
         Returns:
             dict: 项目数据，如果不存在返回None
         """
-        projects = self.get_all()
-        for project in projects:
-            if project['id'] == project_id:
-                return project
-        return None
+        project = dataset.current().get_project(project_id)
+        if project is None:
+            _, project = self.archive.find(project_id)
+        return project
     
     def create(self, name, productLineId, ownerId, startDate, endDate, status, isPending=False, remarks=''):
         """
@@ -74,16 +259,9 @@ class ProjectService:
             remarks=remarks
         )
         
-        # 读取现有数据
-        data = read_json_file(self.data_file)
-        projects = data.get('projects', [])
-        
-        # 添加新项目
-        projects.append(project.to_dict())
-        data['projects'] = projects
-        
-        # 保存到文件
-        write_json_file(self.data_file, data)
+        # 追加到日志，并发布新的数据集版本
+        with dataset.mutation():
+            self.store.put(project.to_dict(), op='create')
         
         return project.to_dict()
     
@@ -101,53 +279,213 @@ class ProjectService:
         Raises:
             ValueError: 数据验证失败
         """
-        data = read_json_file(self.data_file)
-        projects = data.get('projects', [])
+        def apply(current):
+            # 创建项目对象并更新
+            project = Project.from_dict(current)
+            project.update(**kwargs)
+            updated = project.to_dict()
+            
+            # 字段没有实际变化时保留原记录（包括更新时间），存储层不会重写
+            if _without_timestamp(updated) == _without_timestamp(current):
+                return current
+            return updated
         
-        # 查找项目
-        project_index = None
-        for i, proj in enumerate(projects):
-            if proj['id'] == project_id:
-                project_index = i
-                break
+        # 在存储层的同一次加锁内读取最新数据、修改并写回，并发布新的数据集版本
+        with dataset.mutation():
+            updated = self.store.modify(project_id, apply)
+            if updated is None and self._restore(project_id):
+                # 修改归档中的项目：先移回热数据
+                updated = self.store.modify(project_id, apply)
+            return updated
+    
+    def _restore(self, project_id):
+        """
+        把归档中的项目移回热数据（调用方需在dataset.mutation()中）
         
-        if project_index is None:
-            return None
+        Args:
+            project_id: 项目ID
+            
+        Returns:
+            bool: 项目在归档中并已移回返回True
+        """
+        year, record = self.archive.find(project_id)
+        if record is None:
+            return False
+        # 先写入热数据再从归档删除，中途中断时项目只会重复而不会丢失；移动不产生历史版本
+        with history.untracked():
+            self.store.put(record)
+        self.archive.remove(year, [project_id])
+        return True
+    
+    def delete(self, project_id):
+        """
+        删除项目
         
-        # 创建项目对象并更新
-        project = Project.from_dict(projects[project_index])
-        project.update(**kwargs)
+        Args:
+            project_id: 项目ID
+            
+        Returns:
+            bool: 删除成功返回True，项目不存在返回False
+        """
+        with dataset.mutation():
+            if self.store.remove(project_id):
+                return True
+            year, record = self.archive.find(project_id)
+            if record is None or self.archive.remove(year, [project_id]) == 0:
+                return False
+            get_repository().record_change(project_id, record, None)
+            return True
+    
+    def get_date_range(self, product_line_ids=None):
+        """
+        获取项目的整体日期范围（最早的开始日期和最晚的结束日期，不含归档项目），
+        与项目列表的筛选无关，供前端提示覆盖全部项目的时间轴范围
         
-        # 更新列表
-        projects[project_index] = project.to_dict()
-        data['projects'] = projects
+        指定的产品线项目不超过全部项目的1/8时从二级索引逐个检查；否则沿开始
+        日期和结束日期的排序索引从两端查找第一个属于这些产品线的项目
         
-        # 保存到文件
-        write_json_file(self.data_file, data)
+        Args:
+            product_line_ids: 只统计这些产品线的项目（可选）
+            
+        Returns:
+            tuple: (最早开始日期, 最晚结束日期)，没有项目时为 (None, None)
+            
+        Raises:
+            FileNotFoundError: 项目数据文件不存在
+        """
+        version = dataset.current()
+        if version.projects is None:
+            raise FileNotFoundError(f"文件不存在: {self.data_file}")
         
-        return project.to_dict()
+        product_line_ids = set(product_line_ids or ())
+        if product_line_ids:
+            ids = [i for value in product_line_ids for i in version.project_ids_by('productLineId', value)]
+            if len(ids) <= len(version.projects) // 8:
+                projects = [version.get_project(project_id) for project_id in ids]
+                starts = [sort_key(p, 'startDate')[0] for p in projects]
+                ends = [sort_key(p, 'endDate')[0] for p in projects]
+                return min(filter(None, starts), default=None), max(filter(None, ends), default=None)
+        
+        def first(field, descending):
+            for value, project_id in version.sorted_index(field).keys_after(descending=descending):
+                if not value:
+                    continue
+                if not product_line_ids or version.get_project(project_id).get('productLineId') in product_line_ids:
+                    return value
+            return None
+        
+        return first('startDate', False), first('endDate', True)
     
-    def delete(self, project_id):
+    def get_history(self, project_id):
         """
-        删除项目
+        获取项目的历史版本
         
         Args:
             project_id: 项目ID
             
         Returns:
-            bool: 删除成功返回True，项目不存在返回False
+            list: 按版本号升序的历史版本，项目没有历史时为空列表
+        """
+        return history.project_history(project_id)
+    
+    def count_by(self, field, value):
         """
-        data = read_json_file(self.data_file)
-        projects = data.get('projects', [])
+        统计指定字段等于指定值的项目数量（包括归档项目）
+        热数据查数据集版本的二级索引（ownerId、productLineId、status），
+        归档查各分区的计数
         
-        # 查找并删除
-        original_length = len(projects)
-        projects = [proj for proj in projects if proj['id'] != project_id]
+        Args:
+            field: 字段名（如productLineId、ownerId）
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+        """
+        if field in dataset.PROJECT_INDEX_FIELDS:
+            count = dataset.current().count_projects(field, value)
+        else:
+            count = self.store.count_by(field, value)
+        return count + self.archive.count_by(field, value)
+
+
+def _conditions(date_from, date_to, product_line_ids, owner_ids, statuses, is_pending):
+    """
+    整理项目的筛选条件
+    
+    Args:
+        date_from: 范围开始日期（可选）
+        date_to: 范围结束日期（可选）
+        product_line_ids: 产品线ID列表（可选）
+        owner_ids: 负责人ID列表（可选）
+        statuses: 状态列表（可选）
+        is_pending: 是否暂定（可选）
         
-        if len(projects) == original_length:
-            return False  # 未找到要删除的项目
+    Returns:
+        tuple: ({字段名: 允许的值集合}, 判断项目是否满足全部条件的函数)
+    """
+    fields = {
+        field: set(values)
+        for field, values in (('productLineId', product_line_ids), ('ownerId', owner_ids), ('status', statuses))
+        if values
+    }
+    
+    def matches(project):
+        return (
+            overlaps(project, date_from, date_to)
+            and all(project.get(field) in values for field, values in fields.items())
+            and (is_pending is None or bool(project.get('isPending')) == is_pending)
+        )
+    
+    return fields, matches
+
+
+def _first(projects, key, after, descending, limit):
+    """
+    取出排在游标之后的前 limit + 1 个项目（用于没有排序索引的项目）
+    
+    Args:
+        projects: 项目列表
+        key: 排序键函数
+        after: 游标键（可选）
+        descending: 是否按降序
+        limit: 每页数量
         
-        data['projects'] = projects
-        write_json_file(self.data_file, data)
+    Returns:
+        list: 排好序的项目列表
+    """
+    if after is not None:
+        projects = [p for p in projects if (key(p) < after if descending else key(p) > after)]
+    if descending:
+        return heapq.nlargest(limit + 1, projects, key=key)
+    return heapq.nsmallest(limit + 1, projects, key=key)
+
+
+def _paginate(projects, key, limit):
+    """
+    截取一页项目（多取一个用于判断是否还有下一页）
+    
+    Args:
+        projects: 排好序的项目列表（最多 limit + 1 个有意义）
+        key: 排序键函数
+        limit: 每页数量
         
-        return True
+    Returns:
+        tuple: (项目列表, 本页最后一个项目的键)，没有下一页时键为None
+    """
+    if len(projects) <= limit:
+        return projects, None
+    page = projects[:limit]
+    return page, key(page[-1])
+
+
+def _without_timestamp(record):
+    """
+    去掉更新时间后的项目字段（用于判断更新是否有实际变化）
+    
+    Args:
+        record: 项目数据字典
+        
+    Returns:
+        dict: 不含updatedAt的字段
+    """
+    return {key: value for key, value in record.items() if key != 'updatedAt'}
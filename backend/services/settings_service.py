@@ -2,9 +2,10 @@
 设置服务层
 处理用户设置相关的业务逻辑
 """
+from contextlib import contextmanager
+
 from models.settings import Settings
-from utils.file_handler import read_json_file, write_json_file, get_data_file_path
-import os
+from utils.repository import get_repository
 
 
 class SettingsService:
@@ -14,8 +15,20 @@ class SettingsService:
     """
     
     def __init__(self):
-        """初始化服务，设置数据文件路径"""
-        self.data_file = get_data_file_path('settings.json')
+        """初始化服务，获取数据仓库"""
+        self.repository = get_repository()
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        修改设置数据的事务（通过数据仓库）
+        设置尚未保存过时从默认设置开始，数据没有变化时不写入
+        
+        Yields:
+            dict: 可修改的设置数据字典
+        """
+        with self.repository.document_transaction('settings', default=Settings().to_dict()) as data:
+            yield data
     
     def get_settings(self):
         """
@@ -25,14 +38,13 @@ class SettingsService:
         Returns:
             dict: 设置数据字典
         """
-        # 如果文件不存在，返回默认设置
-        if not os.path.exists(self.data_file):
-            return Settings().to_dict()
-        
         try:
-            data = read_json_file(self.data_file)
+            data = self.repository.read_document('settings')
             settings = Settings.from_dict(data)
             return settings.to_dict()
+        except FileNotFoundError:
+            # 如果文件不存在，返回默认设置（不预先检查文件：延迟写入的设置可能尚未落盘）
+            return Settings().to_dict()
         except Exception as e:
             # 文件损坏时返回默认设置
             print(f"读取设置文件失败: {e}")
@@ -55,8 +67,10 @@ class SettingsService:
         settings = Settings(visibleProductLines=productline_ids)
         settings.validate()
         
-        # 保存到文件
-        write_json_file(self.data_file, settings.to_dict())
+        # 保存到文件（与当前设置相同时不写入）
+        with self._transaction() as data:
+            data.clear()
+            data.update(settings.to_dict())
         
         return settings.to_dict()
     
@@ -68,5 +82,7 @@ class SettingsService:
             dict: 默认设置数据字典
         """
         settings = Settings()
-        write_json_file(self.data_file, settings.to_dict())
+        with self._transaction() as data:
+            data.clear()
+            data.update(settings.to_dict())
         return settings.to_dict()
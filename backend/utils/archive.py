@@ -0,0 +1,364 @@
+"""
+项目归档模块
+把早已结束的项目从热数据中移出，按年份分区保存为冷数据，热数据的大小不再随
+公司年限增长
+
+- 状态为已上或暂停、且结束日期早于归档期限（config.ARCHIVE_AFTER_DAYS 天前）
+  的项目，按结束日期的年份移入归档分区
+- JSON和内存后端的归档分区为 data/archive/projects-<年份>.json，只在需要时读取
+  （由 file_handler 缓存）；SQLite后端保存在 archived_projects 表中
+- GET /api/projects 默认只返回热数据；includeArchived=true，或日期范围
+  （from/to）延伸到归档年份时才读取对应的分区
+- 修改归档中的项目会先把它移回热数据；删除直接从分区中删除
+
+启动时按 ROADMAP_ARCHIVE_AFTER_DAYS 自动归档（0为关闭，默认关闭），也可以
+在backend目录下手动执行（适合放入定时任务）：
+    python utils/archive.py 365
+    python utils/archive.py 365 --dry-run
+"""
+import os
+import re
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+if __name__ == '__main__':
+    # 作为脚本运行时添加项目根目录到Python路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils.file_handler import get_write_generation, read_json_file, transaction
+
+# 归档分区目录名（位于data目录下）
+ARCHIVE_DIR = 'archive'
+
+# 可以归档的项目状态
+ARCHIVE_STATUSES = ('已上', '暂停')
+
+_PARTITION_PATTERN = re.compile(r'^projects-(\d{4})\.json$')
+
+
+def archive_year(record):
+    """
+    计算项目所属的归档年份
+    
+    Args:
+        record: 项目字典
+        
+    Returns:
+        int: 结束日期的年份
+    """
+    return int(record['endDate'][:4])
+
+
+class FileArchiveStore:
+    """
+    以JSON文件保存的归档分区（每年一个文件）
+    
+    Attributes:
+        directory: 归档目录
+    """
+    
+    def __init__(self, directory):
+        """
+        Args:
+            directory: 归档目录
+        """
+        self.directory = directory
+        # {年份: (分区的缓存记录列表, {字段: {字段值: 数量}})}，分区重新读取后失效
+        self._counts = {}
+        # (分区文件签名, {项目ID: (年份, 项目字典)})，任一分区文件变化后失效
+        self._ids = (None, {})
+    
+    def _file(self, year):
+        """
+        获取分区文件路径
+        
+        Args:
+            year: 年份
+            
+        Returns:
+            str: 文件路径
+        """
+        return os.path.join(self.directory, f'projects-{year}.json')
+    
+    def years(self):
+        """
+        获取所有归档年份
+        
+        Returns:
+            list: 升序排列的年份
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(_PARTITION_PATTERN.match, names) if m)
+    
+    def values(self, year):
+        """
+        读取一个分区的项目（只读）
+        
+        Args:
+            year: 年份
+            
+        Returns:
+            list: 项目列表，分区不存在时为空列表
+        """
+        try:
+            return read_json_file(self._file(year), copy=False).get('projects', [])
+        except FileNotFoundError:
+            return []
+    
+    def put(self, year, records):
+        """
+        把项目写入分区（按ID新增或替换）
+        
+        Args:
+            year: 年份
+            records: 项目字典列表
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with transaction(self._file(year), default={'projects': []}) as data:
+            items = data.setdefault('projects', [])
+            positions = {item['id']: i for i, item in enumerate(items)}
+            for record in records:
+                if record['id'] in positions:
+                    items[positions[record['id']]] = record
+                else:
+                    items.append(record)
+    
+    def remove(self, year, ids):
+        """
+        从分区中删除项目
+        
+        Args:
+            year: 年份
+            ids: 项目ID列表
+            
+        Returns:
+            int: 实际删除的数量
+        """
+        ids = set(ids)
+        try:
+            with transaction(self._file(year)) as data:
+                items = data.get('projects', [])
+                kept = [item for item in items if item['id'] not in ids]
+                removed = len(items) - len(kept)
+                data['projects'] = kept
+        except FileNotFoundError:
+            return 0
+        return removed
+    
+    def count_by(self, field, value):
+        """
+        统计所有分区中指定字段等于指定值的项目数量
+        每个分区按字段计数一次，分区文件未变化时（file_handler缓存的是同一对象）
+        直接查计数
+        
+        Args:
+            field: 字段名
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+        """
+        count = 0
+        for year in self.years():
+            records = self.values(year)
+            cached = self._counts.get(year)
+            if cached is None or cached[0] is not records:
+                cached = self._counts[year] = (records, {})
+            counts = cached[1].get(field)
+            if counts is None:
+                counts = cached[1][field] = Counter(record.get(field) for record in records)
+            count += counts[value]
+        return count
+    
+    def _signature(self, years):
+        """
+        计算分区文件的签名（本进程的延迟写入尚未落盘时同样能检测到变化）
+        
+        Args:
+            years: 年份列表
+            
+        Returns:
+            tuple: 每个分区的 (年份, (mtime_ns, size, inode), 写入次数)
+        """
+        signature = []
+        for year in years:
+            path = self._file(year)
+            try:
+                st = os.stat(path)
+                stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except OSError:
+                stat_key = None
+            signature.append((year, stat_key, get_write_generation(path)))
+        return tuple(signature)
+    
+    def find(self, record_id):
+        """
+        查找归档中的项目
+        按 {项目ID: (年份, 项目字典)} 索引查找，索引在分区文件变化后重新建立，
+        未命中时不再逐个扫描分区
+        
+        Args:
+            record_id: 项目ID
+            
+        Returns:
+            tuple: (年份, 项目字典)，不存在返回 (None, None)
+        """
+        years = self.years()
+        signature = self._signature(years)
+        cached_signature, ids = self._ids
+        if cached_signature != signature:
+            ids = {}
+            for year in years:
+                # 从最早的年份开始，同一ID出现在多个分区时以最近的年份为准
+                ids.update((record['id'], (year, record)) for record in self.values(year))
+            self._ids = (signature, ids)
+        return ids.get(record_id, (None, None))
+
+
+def overlaps(record, date_from, date_to):
+    """
+    判断项目是否与日期范围重叠（日期为YYYY-MM-DD字符串，可直接比较）
+    
+    Args:
+        record: 项目字典
+        date_from: 范围开始日期（可选）
+        date_to: 范围结束日期（可选）
+        
+    Returns:
+        bool: 重叠返回True
+    """
+    if date_from and record.get('endDate', '') < date_from:
+        return False
+    if date_to and record.get('startDate', '') > date_to:
+        return False
+    return True
+
+
+def read_archived(date_from=None, date_to=None):
+    """
+    读取与日期范围重叠的归档项目，只打开可能包含这些项目的分区
+    （分区按结束日期的年份划分，早于范围开始年份的分区不会被读取）
+    
+    Args:
+        date_from: 范围开始日期（可选，不提供则读取全部分区）
+        date_to: 范围结束日期（可选）
+        
+    Returns:
+        list: 归档项目列表（只读）
+    """
+    from utils.repository import get_repository
+    
+    archive = get_repository().archive_store()
+    first_year = int(date_from[:4]) if date_from else None
+    projects = []
+    for year in archive.years():
+        if first_year is not None and year < first_year:
+            continue
+        projects.extend(p for p in archive.values(year) if overlaps(p, date_from, date_to))
+    return projects
+
+
+def archive_projects(days, dry_run=False):
+    """
+    归档结束日期早于期限的已上、暂停项目
+    
+    Args:
+        days: 归档期限（天），结束日期早于今天减去该天数的项目会被归档
+        dry_run: 只统计不移动
+        
+    Returns:
+        dict: 包含cutoff（截止日期）、archived（归档数量）和years（{年份: 数量}）的结果
+    """
+    from utils import dataset
+    from utils.history import untracked
+    from utils.repository import get_repository
+    
+    cutoff = (date.today() - timedelta(days=days)).isoformat()
+    result = {'cutoff': cutoff, 'archived': 0, 'years': {}}
+    
+    with dataset.mutation():
+        repository = get_repository()
+        store = repository.project_store()
+        archive = repository.archive_store()
+        try:
+            candidates = [
+                p for p in store.values()
+                if p.get('status') in ARCHIVE_STATUSES and p.get('endDate', '9999') < cutoff
+            ]
+        except FileNotFoundError:
+            return result
+        
+        groups = {}
+        for record in candidates:
+            groups.setdefault(archive_year(record), []).append(record)
+        
+        for year, records in sorted(groups.items()):
+            result['years'][year] = len(records)
+            if dry_run:
+                continue
+            # 先写入归档再从热数据删除，中途中断时项目只会重复而不会丢失
+            archive.put(year, records)
+            for record in records:
+                if store.get(record['id']) != record:
+                    # 归档期间项目被修改，保留在热数据中
+                    archive.remove(year, [record['id']])
+                    result['years'][year] -= 1
+                    continue
+                # 归档只是移动项目，不产生历史版本
+                with untracked():
+                    store.remove(record['id'])
+    
+    result['archived'] = sum(result['years'].values())
+    return result
+
+
+def run_archival():
+    """
+    按配置自动归档（应用启动时调用，ROADMAP_ARCHIVE_AFTER_DAYS为0时不执行）
+    """
+    if config.ARCHIVE_AFTER_DAYS <= 0:
+        return
+    try:
+        result = archive_projects(config.ARCHIVE_AFTER_DAYS)
+    except Exception as e:
+        print(f"项目归档失败: {str(e)}")
+        return
+    if result['archived']:
+        print(f"已归档 {result['archived']} 个结束于 {result['cutoff']} 之前的项目")
+
+
+def main(argv):
+    """
+    命令行入口
+    
+    Args:
+        argv: 命令行参数（不含程序名）
+        
+    Returns:
+        int: 退出码
+    """
+    args = [arg for arg in argv if not arg.startswith('--')]
+    dry_run = '--dry-run' in argv
+    if len(args) > 1 or (args and not args[0].isdigit()):
+        print(__doc__)
+        return 1
+    days = int(args[0]) if args else config.ARCHIVE_AFTER_DAYS
+    if days <= 0:
+        print("请指定归档期限（天），或设置 ROADMAP_ARCHIVE_AFTER_DAYS")
+        return 1
+    
+    result = archive_projects(days, dry_run=dry_run)
+    prefix = '[演练] ' if dry_run else ''
+    print(f"{prefix}结束于 {result['cutoff']} 之前的已上/暂停项目: {result['archived']} 个")
+    for year, count in sorted(result['years'].items()):
+        print(f"  {year}: {count}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
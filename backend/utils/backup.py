@@ -0,0 +1,596 @@
+"""
+数据备份模块
+定时把全部数据（项目、人员、产品线、设置和归档分区）保存为一致的快照，
+压缩后存入 data_backup/，按内容去重并按保留策略清理
+
+- 一致性：读取全部数据源前后比较各数据源的变化签名（见 Repository.change_token）
+  和跨进程的全局写入代数（见 utils/generation.py），两次相同说明读取期间没有
+  任何写入，快照对应同一个时间点；否则稍后重试。读取只持有与普通读取相同的
+  短暂共享锁，不会让编辑方等待整个备份过程
+- 存储：快照序列化为排序键的紧凑JSON，以其SHA-256命名保存为
+  snapshots/<sha256>.json.gz；数据没有变化时复用已有的快照文件，只在清单
+  manifest.json 中登记新的备份时间点
+- 保留策略：保留最近 ROADMAP_BACKUP_KEEP_LAST 次备份，另外按小时、天、周各保留
+  最近的 ROADMAP_BACKUP_KEEP_HOURLY / DAILY / WEEKLY 个时间段中最新的一个备份，
+  不再被任何备份引用的快照文件会被删除
+- 恢复：先校验快照文件的SHA-256与清单一致，再为当前数据做一次备份，然后只
+  写入有差异的记录（见 replication.apply_snapshot）；也可以用 --to 把快照
+  还原为JSON文件写入指定目录，不影响当前数据
+
+应用运行时由后台线程每隔 ROADMAP_BACKUP_INTERVAL 秒备份一次（0为关闭），多个
+worker进程共用清单，间隔内只会备份一次。也可以在backend目录下手动执行：
+    python utils/backup.py run
+    python utils/backup.py list
+    python utils/backup.py verify
+    python utils/backup.py restore <备份ID|latest> [--to 目录]
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+if __name__ == '__main__':
+    # 作为脚本运行时添加项目根目录到Python路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils import generation, snapshot_format
+from utils.file_handler import get_data_file_path, read_json_file, transaction
+
+# 备份目录下的清单文件名和快照目录名
+MANIFEST_FILE = 'manifest.json'
+SNAPSHOT_DIR = 'snapshots'
+
+# 读取期间数据发生变化时的最大尝试次数
+SNAPSHOT_ATTEMPTS = 10
+
+# 后台备份失败后的重试间隔（秒）
+RETRY_INTERVAL = 60
+
+_SNAPSHOT_PATTERN = re.compile(r'^([0-9a-f]{64})\.json\.gz$')
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+_stats = {
+    'runs': 0,
+    'deduplicated': 0,
+    'errors': 0,
+    'lastError': None
+}
+
+
+def get_backup_dir():
+    """
+    获取备份目录（默认为data目录旁的data_backup目录）
+    
+    Returns:
+        str: 备份目录路径
+    """
+    if config.BACKUP_DIR:
+        return os.path.abspath(config.BACKUP_DIR)
+    data_dir = os.path.dirname(get_data_file_path('projects.json'))
+    return os.path.join(os.path.dirname(data_dir), 'data_backup')
+
+
+def _manifest_file():
+    """清单文件路径"""
+    return os.path.join(get_backup_dir(), MANIFEST_FILE)
+
+
+def _snapshot_file(digest):
+    """
+    获取快照文件路径
+    
+    Args:
+        digest: 快照内容的SHA-256
+        
+    Returns:
+        str: 文件路径
+    """
+    return os.path.join(get_backup_dir(), SNAPSHOT_DIR, f'{digest}.json.gz')
+
+
+def _markers(repository):
+    """
+    获取所有数据源的变化签名和全局写入代数
+    
+    Args:
+        repository: 数据仓库
+        
+    Returns:
+        tuple: 可比较的标记，两次相同说明期间没有写入
+    """
+    from utils.repository import DOCUMENTS
+    
+    tokens = tuple(repository.change_token(part) for part in ('projects',) + DOCUMENTS)
+    return generation.global_generation(), tokens
+
+
+def _read_all(repository):
+    """
+    读取全部数据
+    
+    Args:
+        repository: 数据仓库
+        
+    Returns:
+        dict: 包含projects、documents（{文档名: 数据或None}）和
+              archive（{年份字符串: 归档项目列表}）的快照
+    """
+    from utils.repository import DOCUMENTS
+    
+    try:
+        projects = [dict(record) for record in repository.project_store().values()]
+    except FileNotFoundError:
+        projects = []
+    documents = {}
+    for name in DOCUMENTS:
+        try:
+            documents[name] = repository.read_document(name)
+        except FileNotFoundError:
+            documents[name] = None
+    archive = repository.archive_store()
+    return {
+        'projects': projects,
+        'documents': documents,
+        'archive': {str(year): list(archive.values(year)) for year in archive.years()}
+    }
+
+
+def take_snapshot():
+    """
+    读取全部数据的一致快照（乐观读取，期间有写入时重试，不阻塞写入方）
+    
+    Returns:
+        dict: 快照数据
+        
+    Raises:
+        TimeoutError: 多次尝试期间数据都在变化
+    """
+    from utils.repository import get_repository
+    
+    repository = get_repository()
+    for attempt in range(SNAPSHOT_ATTEMPTS):
+        before = _markers(repository)
+        snapshot = _read_all(repository)
+        if _markers(repository) == before:
+            return snapshot
+        time.sleep(0.05 * (attempt + 1))
+    raise TimeoutError(f"备份期间数据持续变化，{SNAPSHOT_ATTEMPTS}次尝试均未取得一致的快照")
+
+
+def _encode(snapshot):
+    """
+    把快照序列化为确定的字节串（键排序的紧凑JSON），相同数据得到相同结果
+    
+    Args:
+        snapshot: 快照数据
+        
+    Returns:
+        tuple: (字节串, SHA-256十六进制摘要)
+    """
+    payload = json.dumps(snapshot, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return payload, hashlib.sha256(payload).hexdigest()
+
+
+def _write_snapshot(digest, payload):
+    """
+    压缩并原子写入快照文件
+    
+    Args:
+        digest: 快照内容的SHA-256
+        payload: 快照字节串
+    """
+    path = _snapshot_file(digest)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(gzip.compress(payload, mtime=0))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _counts(snapshot):
+    """
+    统计快照中的记录数量
+    
+    Args:
+        snapshot: 快照数据
+        
+    Returns:
+        dict: 各数据源的记录数量
+    """
+    counts = {'projects': len(snapshot['projects'])}
+    for name in ('owners', 'productlines'):
+        data = snapshot['documents'].get(name)
+        counts[name] = len(data.get(name, [])) if data else 0
+    counts['archived'] = sum(len(records) for records in snapshot['archive'].values())
+    return counts
+
+
+def _retained(backups, keep_last, keep_hourly, keep_daily, keep_weekly):
+    """
+    按保留策略计算需要保留的备份
+    最近一次备份始终保留；每个层级按时间从新到旧，保留最近N个时间段中最新的备份
+    
+    Args:
+        backups: 备份列表（按时间升序）
+        keep_last: 保留的最近备份次数
+        keep_hourly: 保留的小时数
+        keep_daily: 保留的天数
+        keep_weekly: 保留的周数
+        
+    Returns:
+        set: 需要保留的备份ID
+    """
+    if not backups:
+        return set()
+    newest_first = sorted(backups, key=lambda b: b['time'], reverse=True)
+    keep = {backup['id'] for backup in newest_first[:max(keep_last, 1)]}
+    tiers = (
+        (keep_hourly, lambda t: t.strftime('%Y%m%d%H')),
+        (keep_daily, lambda t: t.strftime('%Y%m%d')),
+        (keep_weekly, lambda t: t.isocalendar()[:2])
+    )
+    for count, period in tiers:
+        seen = set()
+        for backup in newest_first:
+            key = period(datetime.fromtimestamp(backup['time'] / 1000))
+            if key in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(key)
+            keep.add(backup['id'])
+    return keep
+
+
+def _remove_unreferenced(backups):
+    """
+    删除不再被任何备份引用的快照文件（调用方持有清单锁，清单已落盘）
+    
+    Args:
+        backups: 清单中的全部备份
+    """
+    referenced = {backup['sha256'] for backup in backups}
+    directory = os.path.join(get_backup_dir(), SNAPSHOT_DIR)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        match = _SNAPSHOT_PATTERN.match(name)
+        if match and match.group(1) not in referenced:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError as e:
+                print(f"删除过期的备份快照失败: {name}: {str(e)}")
+
+
+def run_backup(force=True):
+    """
+    执行一次备份并按保留策略清理
+    
+    整个过程持有清单的排他锁（只有其他备份会等待），多个进程不会重复备份。
+    
+    Args:
+        force: 为False时，距上次备份不足 ROADMAP_BACKUP_INTERVAL 秒则跳过
+        
+    Returns:
+        dict: 本次登记的备份（包含id、time、sha256、bytes、deduplicated和records），
+              跳过时返回None
+    """
+    os.makedirs(get_backup_dir(), exist_ok=True)
+    with transaction(_manifest_file(), default={'backups': []}) as data:
+        backups = data.setdefault('backups', [])
+        now = datetime.now()
+        now_ms = int(now.timestamp() * 1000)
+        if not force and backups and now_ms - backups[-1]['time'] < config.BACKUP_INTERVAL * 1000:
+            return None
+        
+        snapshot = take_snapshot()
+        payload, digest = _encode(snapshot)
+        path = _snapshot_file(digest)
+        deduplicated = os.path.exists(path)
+        if not deduplicated:
+            _write_snapshot(digest, payload)
+        
+        backup_id = now.strftime('%Y%m%d-%H%M%S')
+        existing = {backup['id'] for backup in backups}
+        suffix = 1
+        while backup_id in existing:
+            suffix += 1
+            backup_id = f"{now.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+        
+        entry = {
+            'id': backup_id,
+            'time': now_ms,
+            'sha256': digest,
+            'bytes': os.path.getsize(path),
+            'deduplicated': deduplicated,
+            'records': _counts(snapshot)
+        }
+        backups.append(entry)
+        keep = _retained(
+            backups, config.BACKUP_KEEP_LAST, config.BACKUP_KEEP_HOURLY,
+            config.BACKUP_KEEP_DAILY, config.BACKUP_KEEP_WEEKLY
+        )
+        data['backups'] = [backup for backup in backups if backup['id'] in keep]
+    
+    # 清单写入后再删除快照文件，清单引用的文件始终存在
+    with transaction(_manifest_file()) as data:
+        _remove_unreferenced(data['backups'])
+    
+    _stats['runs'] += 1
+    if deduplicated:
+        _stats['deduplicated'] += 1
+    return entry
+
+
+def list_backups():
+    """
+    获取全部备份（按时间升序）
+    
+    Returns:
+        list: 备份列表
+    """
+    try:
+        return read_json_file(_manifest_file()).get('backups', [])
+    except FileNotFoundError:
+        return []
+
+
+def load_backup(backup_id='latest'):
+    """
+    读取备份快照并校验SHA-256
+    
+    Args:
+        backup_id: 备份ID，latest为最近一次备份
+        
+    Returns:
+        tuple: (备份清单项, 快照数据)
+        
+    Raises:
+        FileNotFoundError: 备份或快照文件不存在
+        ValueError: 快照文件损坏或校验和不一致
+    """
+    backups = list_backups()
+    if backup_id == 'latest':
+        entry = backups[-1] if backups else None
+    else:
+        entry = next((backup for backup in backups if backup['id'] == backup_id), None)
+    if entry is None:
+        raise FileNotFoundError(f"备份不存在: {backup_id}")
+    
+    path = _snapshot_file(entry['sha256'])
+    with open(path, 'rb') as f:
+        try:
+            payload = gzip.decompress(f.read())
+        except (OSError, EOFError) as e:
+            raise ValueError(f"备份快照文件损坏: {path}: {str(e)}")
+    digest = hashlib.sha256(payload).hexdigest()
+    if digest != entry['sha256']:
+        raise ValueError(f"备份快照校验失败: {entry['id']}（期望 {entry['sha256']}，实际 {digest}）")
+    return entry, json.loads(payload.decode('utf-8'))
+
+
+def verify_backups():
+    """
+    校验全部备份
+    
+    Returns:
+        list: 每个备份的 (备份ID, 错误信息)，校验通过时错误信息为None
+    """
+    results = []
+    for backup in list_backups():
+        try:
+            load_backup(backup['id'])
+            results.append((backup['id'], None))
+        except (OSError, ValueError) as e:
+            results.append((backup['id'], str(e)))
+    return results
+
+
+def export_backup(snapshot, target_dir):
+    """
+    把快照还原为JSON数据文件写入目录（与data目录的文件结构相同，不产生锁文件）
+    
+    Args:
+        snapshot: 快照数据
+        target_dir: 目标目录
+        
+    Returns:
+        list: 写入的文件路径
+    """
+    from utils.archive import ARCHIVE_DIR
+    
+    files = {'projects.json': {'projects': snapshot['projects']}}
+    for name, data in snapshot['documents'].items():
+        if data is not None:
+            files[f'{name}.json'] = data
+    for year, records in snapshot['archive'].items():
+        files[os.path.join(ARCHIVE_DIR, f'projects-{year}.json')] = {'projects': records}
+    
+    written = []
+    for name, data in sorted(files.items()):
+        path = os.path.join(target_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(snapshot_format.dumps(data, 'json'))
+        written.append(path)
+    return written
+
+
+def restore_backup(backup_id='latest'):
+    """
+    把当前数据恢复为备份的内容（校验通过后先备份当前数据，只写入有差异的记录）
+    
+    Args:
+        backup_id: 备份ID，latest为最近一次备份
+        
+    Returns:
+        tuple: (恢复的备份清单项, 恢复前为当前数据所做的备份)
+        
+    Raises:
+        FileNotFoundError: 备份或快照文件不存在
+        ValueError: 快照文件损坏或校验和不一致
+    """
+    from utils import dataset
+    from utils.replication import apply_snapshot
+    from utils.repository import get_repository
+    
+    entry, snapshot = load_backup(backup_id)
+    safety = run_backup()
+    with dataset.mutation():
+        apply_snapshot(get_repository(), snapshot)
+    return entry, safety
+
+
+class _Scheduler:
+    """
+    后台备份线程：按间隔检查清单中最近一次备份的时间，到期时备份
+    """
+    
+    def __init__(self):
+        self.pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+    
+    def start(self):
+        """启动线程"""
+        self._thread.start()
+    
+    def is_alive(self):
+        """
+        线程是否在本进程中运行（fork后的子进程需要重新启动）
+        
+        Returns:
+            bool: 正在运行返回True
+        """
+        return self.pid == os.getpid() and self._thread.is_alive()
+    
+    def _run(self):
+        """备份循环"""
+        interval = config.BACKUP_INTERVAL
+        while True:
+            try:
+                backups = list_backups()
+                last = backups[-1]['time'] / 1000 if backups else 0
+                delay = last + interval - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                    continue
+                entry = run_backup(force=False)
+                if entry is not None and not entry['deduplicated']:
+                    print(f"已备份数据: {entry['id']}（{entry['bytes']} 字节）")
+            except Exception as e:
+                _stats['errors'] += 1
+                _stats['lastError'] = str(e)
+                print(f"数据备份失败，{RETRY_INTERVAL}秒后重试: {str(e)}")
+                time.sleep(RETRY_INTERVAL)
+
+
+def ensure_backups():
+    """
+    确保本进程的后台备份线程正在运行（ROADMAP_BACKUP_INTERVAL为0时不运行）
+    
+    Returns:
+        bool: 后台备份线程正在运行返回True
+    """
+    global _scheduler
+    
+    if config.BACKUP_INTERVAL <= 0:
+        return False
+    scheduler = _scheduler
+    if scheduler is not None and scheduler.is_alive():
+        return True
+    
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = _Scheduler()
+            _scheduler.start()
+        return True
+
+
+def get_backup_stats():
+    """
+    获取备份统计信息
+    
+    Returns:
+        dict: 包含enabled（是否启用定时备份）、runs（本进程的备份次数）、
+              deduplicated（内容未变化复用快照的次数）、errors和lastError的统计数据
+    """
+    return {
+        'enabled': config.BACKUP_INTERVAL > 0,
+        'runs': _stats['runs'],
+        'deduplicated': _stats['deduplicated'],
+        'errors': _stats['errors'],
+        'lastError': _stats['lastError']
+    }
+
+
+def main(argv):
+    """
+    命令行入口
+    
+    Args:
+        argv: 命令行参数（不含程序名）
+        
+    Returns:
+        int: 退出码
+    """
+    command = argv[0] if argv else None
+    
+    if command == 'run' and len(argv) == 1:
+        entry = run_backup()
+        note = '（数据未变化，复用已有快照）' if entry['deduplicated'] else ''
+        print(f"已备份: {entry['id']} {entry['sha256'][:12]} {entry['bytes']} 字节{note}")
+        return 0
+    
+    if command == 'list' and len(argv) == 1:
+        for backup in list_backups():
+            records = ' '.join(f'{name}={count}' for name, count in sorted(backup['records'].items()))
+            print(f"{backup['id']}  {backup['sha256'][:12]}  {backup['bytes']:>8} 字节  {records}")
+        return 0
+    
+    if command == 'verify' and len(argv) == 1:
+        failed = 0
+        for backup_id, error in verify_backups():
+            print(f"{backup_id}: {error or '校验通过'}")
+            failed += error is not None
+        return 1 if failed else 0
+    
+    if command == 'restore' and len(argv) in (2, 4) and (len(argv) == 2 or argv[2] == '--to'):
+        try:
+            if len(argv) == 4:
+                entry, snapshot = load_backup(argv[1])
+                written = export_backup(snapshot, argv[3])
+                print(f"备份 {entry['id']} 校验通过，已写入 {len(written)} 个文件到 {argv[3]}")
+                return 0
+            entry, safety = restore_backup(argv[1])
+        except (OSError, ValueError) as e:
+            print(f"恢复失败: {str(e)}")
+            return 1
+        print(f"已恢复备份 {entry['id']}（恢复前的数据已备份为 {safety['id']}）")
+        return 0
+    
+    print(__doc__)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
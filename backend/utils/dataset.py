@@ -0,0 +1,716 @@
+"""
+数据集版本模块
+以不可变的版本化快照发布项目、产品线和人员数据（多版本并发控制）
+
+- 读取方直接取当前快照的引用，不获取任何锁；快照发布后不再修改
+- 写入方在 mutation() 上下文中完成写入，退出时构建下一个版本并原子替换引用；
+  写入进行期间读取方继续读取上一个版本，不会阻塞在写入的文件锁上
+- 同一个HTTP请求内首次读取时固定快照版本，之后该请求看到的项目、产品线
+  和人员都来自同一版本；请求自身的写入会把固定的版本推进到新版本
+- 每个版本记录了各数据源的签名（见 Repository.change_token），其他进程或
+  外部编辑修改文件后，签名不一致的部分会被重建：启用文件监视时由后台线程
+  发现变化并在请求路径之外重建（见 utils/file_watcher.py），否则读取方每次
+  检查签名
+- 启用文件监视时，读取方先比较跨进程的全局写入代数（见 utils/generation.py）：
+  代数未变说明没有任何进程通过API写入过数据，直接使用当前版本；代数变化后
+  才检查签名，其他worker进程的写入在下一个请求中即可见
+- 响应头 X-Data-Generation 返回写入代数，客户端在后续请求中带回该请求头时，
+  服务端保证返回的数据至少包含该代数之前的写入（读己之写）
+- 每个版本带有派生索引：主键、项目的二级索引（负责人、产品线、状态）、名称
+  索引、项目的日期区间索引（见 utils/interval_index.py）、用于游标分页的排序
+  索引（见 utils/sorted_index.py）和用于实例间同步的Merkle树（见
+  utils/merkle_tree.py）；一次写入只改变少量项目时，新版本的项目索引在上一
+  版本的基础上增量修改
+
+快照中的列表和记录都是只读的，调用方不得修改。
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+import config
+from utils import file_watcher, generation
+from utils.file_handler import get_data_file_path
+from utils.interval_index import IntervalIndex
+from utils.merkle_tree import MerkleTree
+from utils.repository import get_repository
+from utils.sorted_index import SORT_FIELDS, SortedIndex
+
+# 当前版本（读取方无锁访问，只由持有_build_lock的线程替换）
+_current = None
+_build_lock = threading.Lock()
+
+# 当前版本最近一次确认与数据源一致时的全局写入代数
+_checked_generation = 0
+
+# 读己之写令牌的HTTP头
+GENERATION_HEADER = 'X-Data-Generation'
+
+# 正在进行的写入数量（进程内）
+_writers = 0
+_writers_lock = threading.Lock()
+
+_stats = {
+    'builds': 0,
+    'staleReads': 0
+}
+
+# 快照包含的数据源
+PARTS = ('projects', 'productlines', 'owners')
+
+# 项目的二级索引字段（{字段值: [项目ID, ...]}）
+PROJECT_INDEX_FIELDS = ('ownerId', 'productLineId', 'status')
+
+# 名称唯一的数据源（{名称: [记录ID, ...]}，区分大小写）
+NAMED_PARTS = ('productlines', 'owners')
+
+# 项目变化的记录数不超过总数的该比例时，项目的索引在上一版本的基础上增量修改
+INCREMENTAL_RATIO = 0.05
+
+
+class DatasetVersion:
+    """
+    数据集的一个不可变版本
+    
+    Attributes:
+        version: 版本号（进程内单调递增）
+        projects: 项目列表，项目文件不存在时为None
+        productlines: 产品线列表，产品线文件不存在时为None
+        owners: 人员数据列表，人员文件不存在时为None
+        tokens: {数据源: 构建时的签名}
+    """
+    
+    __slots__ = ('version', 'projects', 'productlines', 'owners', 'tokens', '_indexes')
+    
+    def __init__(self, version, parts, tokens):
+        self.version = version
+        self.projects = parts['projects']
+        self.productlines = parts['productlines']
+        self.owners = parts['owners']
+        self.tokens = tokens
+        self._indexes = {}
+    
+    def _derived(self, part, kind, build):
+        """
+        获取数据源的派生索引（在首次调用时构建，之后随版本只读）
+        
+        Args:
+            part: 数据源名称
+            kind: 索引名称
+            build: 构建函数，接收记录列表（数据不存在时为空元组）
+            
+        Returns:
+            dict: 索引
+        """
+        index = self._indexes.get((part, kind))
+        if index is None:
+            index = self._indexes[(part, kind)] = build(getattr(self, part) or ())
+        return index
+    
+    def _index(self, part):
+        """
+        获取数据源的主键索引
+        
+        Args:
+            part: 数据源名称
+            
+        Returns:
+            dict: {ID: (列表中的位置, 记录)}
+        """
+        return self._derived(part, 'id', lambda records: {r['id']: (i, r) for i, r in enumerate(records)})
+    
+    def _groups(self, part, field):
+        """
+        获取按字段分组的二级索引
+        
+        Args:
+            part: 数据源名称
+            field: 字段名
+            
+        Returns:
+            dict: {字段值: [记录ID, ...]}
+        """
+        def build(records):
+            groups = {}
+            for record in records:
+                groups.setdefault(record.get(field), []).append(record['id'])
+            return groups
+        
+        return self._derived(part, field, build)
+    
+    def get_project(self, project_id):
+        """
+        根据ID获取项目
+        
+        Args:
+            project_id: 项目ID
+            
+        Returns:
+            dict: 项目（只读），不存在返回None
+        """
+        return self._index('projects').get(project_id, (None, None))[1]
+    
+    def get_productline(self, productline_id):
+        """
+        根据ID获取产品线
+        
+        Args:
+            productline_id: 产品线ID
+            
+        Returns:
+            dict: 产品线（只读），不存在返回None
+        """
+        return self._index('productlines').get(productline_id, (None, None))[1]
+    
+    def get_owner(self, owner_id):
+        """
+        根据ID获取人员
+        
+        Args:
+            owner_id: 人员ID
+            
+        Returns:
+            dict: 人员数据（只读），不存在返回None
+        """
+        return self._index('owners').get(owner_id, (None, None))[1]
+    
+    def position(self, part, record_id):
+        """
+        获取记录在数据源列表中的位置
+        
+        Args:
+            part: 数据源名称
+            record_id: 记录ID
+            
+        Returns:
+            int: 位置，不存在返回None
+        """
+        return self._index(part).get(record_id, (None, None))[0]
+    
+    def project_ids_by(self, field, value):
+        """
+        获取指定字段等于指定值的项目ID
+        
+        Args:
+            field: 字段名（PROJECT_INDEX_FIELDS之一）
+            value: 字段值
+            
+        Returns:
+            list: 项目ID列表（只读）
+        """
+        return self._groups('projects', field).get(value, [])
+    
+    def count_projects(self, field, value):
+        """
+        统计指定字段等于指定值的项目数量
+        
+        Args:
+            field: 字段名（PROJECT_INDEX_FIELDS之一）
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+        """
+        return len(self.project_ids_by(field, value))
+    
+    def ids_by_name(self, part, name):
+        """
+        获取指定名称的记录ID
+        
+        Args:
+            part: 数据源名称（NAMED_PARTS之一）
+            name: 名称（区分大小写）
+            
+        Returns:
+            list: 记录ID列表（只读），名称未被使用时为空列表
+        """
+        return self._groups(part, 'name').get(name, [])
+    
+    def interval_index(self):
+        """
+        获取项目的日期区间索引（见 utils/interval_index.py）
+        
+        Returns:
+            IntervalIndex: 区间索引
+        """
+        return self._derived('projects', 'interval', IntervalIndex.build)
+    
+    def sorted_index(self, field):
+        """
+        获取项目按字段的排序索引（见 utils/sorted_index.py）
+        
+        Args:
+            field: 排序字段（SORT_FIELDS之一）
+            
+        Returns:
+            SortedIndex: 排序索引
+        """
+        return self._derived('projects', 'sorted:' + field, lambda records: SortedIndex.build(records, field))
+    
+    def merkle_tree(self, part):
+        """
+        获取数据源的Merkle树（见 utils/merkle_tree.py）
+        
+        Args:
+            part: 数据源名称
+            
+        Returns:
+            MerkleTree: Merkle树
+        """
+        return self._derived(part, 'merkle', MerkleTree.build)
+    
+    def projects_by_ids(self, ids):
+        """
+        按项目列表中的顺序获取项目
+        
+        Args:
+            ids: 项目ID列表
+            
+        Returns:
+            list: 项目列表（只读）
+        """
+        index = self._index('projects')
+        return [record for _, record in sorted(index[record_id] for record_id in ids)]
+    
+    def projects_overlapping(self, date_from=None, date_to=None):
+        """
+        获取与日期范围重叠的项目（结束日期不早于date_from且开始日期不晚于date_to）
+        
+        Args:
+            date_from: 范围开始日期（YYYY-MM-DD，可选）
+            date_to: 范围结束日期（YYYY-MM-DD，可选）
+            
+        Returns:
+            list: 项目列表（只读，按项目列表中的顺序）
+        """
+        return self.projects_by_ids(self.interval_index().overlapping(date_from, date_to))
+    
+    def projects_active_on(self, day):
+        """
+        获取在某一天进行中的项目
+        
+        Args:
+            day: 日期（YYYY-MM-DD）
+            
+        Returns:
+            list: 项目列表（只读，按项目列表中的顺序）
+        """
+        return self.projects_by_ids(self.interval_index().active_on(day))
+    
+    def warm(self):
+        """
+        预先构建派生索引（在发布前调用，之后的读取不再承担构建开销）
+        """
+        for part in PARTS:
+            self._index(part)
+        for field in PROJECT_INDEX_FIELDS:
+            self._groups('projects', field)
+        for part in NAMED_PARTS:
+            self._groups(part, 'name')
+        self.interval_index()
+        for field in SORT_FIELDS:
+            self.sorted_index(field)
+
+
+def _changed_records(before, after):
+    """
+    比较两个版本的项目列表（存储中未修改的记录在两个版本中是同一个对象）
+    
+    Args:
+        before: 上一版本的项目列表
+        after: 新版本的项目列表
+        
+    Returns:
+        tuple: (只在上一版本中的记录, 只在新版本中的记录)
+    """
+    old = dict(zip(map(id, before), before))
+    new = dict(zip(map(id, after), after))
+    return [old[k] for k in old.keys() - new.keys()], [new[k] for k in new.keys() - old.keys()]
+
+
+def _patch_id_index(index, records, removed, added):
+    """
+    在上一版本的主键索引上应用项目的修改和新增
+    只适用于修改的项目保持原位置、新增的项目追加在末尾的情况
+    
+    Args:
+        index: 上一版本的主键索引 {ID: (位置, 记录)}
+        records: 新版本的项目列表
+        removed: 只在上一版本中的记录
+        added: 只在新版本中的记录
+        
+    Returns:
+        dict: 新的主键索引，不适用时（如有项目被删除，之后的位置都会变化）返回None
+    """
+    added_ids = {record['id'] for record in added}
+    if any(record['id'] not in added_ids for record in removed):
+        return None
+    updated = dict(index)
+    for record in added:
+        entry = index.get(record['id'])
+        if entry is not None:
+            if records[entry[0]] is not record:
+                return None
+            updated[record['id']] = (entry[0], record)
+    for position in range(len(index), len(records)):
+        record = records[position]
+        if record['id'] in index:
+            return None
+        updated[record['id']] = (position, record)
+    return updated if len(updated) == len(records) else None
+
+
+def _patch_groups(groups, field, removed, added):
+    """
+    在上一版本的二级索引上应用项目的变化（只复制涉及的分组）
+    
+    Args:
+        groups: 上一版本的二级索引 {字段值: [项目ID, ...]}
+        field: 字段名
+        removed: 只在上一版本中的记录
+        added: 只在新版本中的记录
+        
+    Returns:
+        dict: 新的二级索引
+    """
+    updated = dict(groups)
+    copied = set()
+    
+    def group(value):
+        if value not in copied:
+            updated[value] = list(updated.get(value, ()))
+            copied.add(value)
+        return updated[value]
+    
+    for record in removed:
+        group(record.get(field)).remove(record['id'])
+    for record in added:
+        group(record.get(field)).append(record['id'])
+    return updated
+
+
+def _carry_indexes(previous, version):
+    """
+    把上一版本的派生索引带到新版本：数据源未变化的索引直接沿用；项目只有少量
+    变化时（一次API写入），项目的索引在上一版本的基础上增量修改，不再整体重建
+    
+    Args:
+        previous: 上一版本
+        version: 新版本
+    """
+    changes = None
+    for key, index in previous._indexes.items():
+        part, kind = key
+        if getattr(version, part) is getattr(previous, part):
+            version._indexes[key] = index
+            continue
+        if part != 'projects' or previous.projects is None or version.projects is None:
+            continue
+        if changes is None:
+            removed, added = _changed_records(previous.projects, version.projects)
+            small = len(removed) + len(added) <= max(1, len(version.projects) * INCREMENTAL_RATIO)
+            changes = (removed, added) if small else False
+        if not changes:
+            continue
+        
+        if kind == 'interval' or isinstance(index, (SortedIndex, MerkleTree)):
+            updated = index.with_changes(*changes)
+        elif kind == 'id':
+            updated = _patch_id_index(index, version.projects, *changes)
+        elif kind in PROJECT_INDEX_FIELDS:
+            updated = _patch_groups(index, kind, *changes)
+        else:
+            updated = None
+        if updated is not None:
+            version._indexes[key] = updated
+
+
+def _record_field(item, field):
+    """
+    读取记录的字段（记录为字典或模型对象）
+    
+    Args:
+        item: 记录
+        field: 字段名
+        
+    Returns:
+        字段值
+    """
+    return item[field] if isinstance(item, dict) else getattr(item, field)
+
+
+def _published():
+    """
+    获取已发布的版本，不检查签名也不构建（供事务内使用，避免在持有数据锁时重新读取）
+    
+    Returns:
+        DatasetVersion: 本次请求固定的版本或最新发布的版本，尚未发布时为None
+    """
+    if has_request_context():
+        pinned = g.get('dataset_version')
+        if pinned is not None:
+            return pinned
+    return _current
+
+
+def is_current(part):
+    """
+    已发布的版本中的数据源是否与存储中的数据一致
+    （调用方在该数据源的事务中时，结果在事务结束前一直有效）
+    
+    Args:
+        part: 数据源名称
+        
+    Returns:
+        bool: 一致返回True
+    """
+    version = _published()
+    return version is not None and version.tokens[part] == get_repository().change_token(part)
+
+
+def name_exists(items, part, name, exclude_id=None):
+    """
+    检查名称是否已被事务中读取的列表里的其他记录使用
+    当前版本与存储一致时直接查名称索引，否则逐条比较
+    
+    Args:
+        items: 事务中的记录列表（字典或模型对象）
+        part: 数据源名称（NAMED_PARTS之一）
+        name: 名称
+        exclude_id: 不参与比较的记录ID（修改名称时为记录自身，可选）
+        
+    Returns:
+        bool: 名称已被使用返回True
+    """
+    if is_current(part):
+        return any(record_id != exclude_id for record_id in _published().ids_by_name(part, name))
+    return any(
+        _record_field(item, 'name') == name and _record_field(item, 'id') != exclude_id
+        for item in items
+    )
+
+
+def locate(items, part, record_id):
+    """
+    在事务中读取的列表里查找记录的位置
+    先使用当前版本的位置索引，位置上的记录ID不一致（数据已被其他写入修改）时
+    退回逐条查找
+    
+    Args:
+        items: 事务中的记录列表（字典或带id属性的对象）
+        part: 数据源名称
+        record_id: 记录ID
+        
+    Returns:
+        int: 位置，不存在返回None
+    """
+    version = _published()
+    position = version.position(part, record_id) if version is not None else None
+    if position is not None and position < len(items) and _record_field(items[position], 'id') == record_id:
+        return position
+    for i, item in enumerate(items):
+        if _record_field(item, 'id') == record_id:
+            return i
+    return None
+
+
+def _tokens():
+    """
+    计算所有数据源的当前签名
+    
+    Returns:
+        dict: {数据源: 签名元组}
+    """
+    repository = get_repository()
+    return {part: repository.change_token(part) for part in PARTS}
+
+
+def _load(part):
+    """
+    从数据仓库读取一个数据源（文件存储会获取对应的文件锁）
+    
+    Args:
+        part: 数据源名称
+        
+    Returns:
+        list: 记录列表，数据不存在时返回None
+    """
+    repository = get_repository()
+    try:
+        if part == 'projects':
+            return repository.project_store().values()
+        return repository.read_document(part).get(part, [])
+    except FileNotFoundError:
+        return None
+
+
+def _rebuild(force=False, warm=False):
+    """
+    构建并发布新版本，只重新读取签名发生变化的数据源
+    
+    Args:
+        force: 是否忽略签名强制重新读取全部数据源
+        warm: 是否在发布前构建派生索引
+        
+    Returns:
+        DatasetVersion: 最新版本
+    """
+    global _current, _checked_generation
+    
+    with _build_lock:
+        previous = _current
+        # 先取代数和签名再读数据：读取期间发生的写入会在下次检查时被发现
+        observed = generation.global_generation()
+        tokens = _tokens()
+        if previous is not None and not force and previous.tokens == tokens:
+            _checked_generation = observed
+            return previous
+        
+        parts = {}
+        for part in PARTS:
+            if previous is not None and not force and previous.tokens[part] == tokens[part]:
+                parts[part] = getattr(previous, part)
+            else:
+                parts[part] = _load(part)
+        
+        version = DatasetVersion((previous.version + 1) if previous else 1, parts, tokens)
+        if previous is not None:
+            _carry_indexes(previous, version)
+        if warm:
+            version.warm()
+        _stats['builds'] += 1
+        _current = version
+        _checked_generation = observed
+        return version
+
+
+def current():
+    """
+    获取当前数据集版本（不获取锁）
+    
+    在请求上下文中，首次调用的结果会固定到本次请求，保证同一请求内看到同一版本。
+    请求带有 X-Data-Generation 头时，返回的版本至少包含该代数之前的写入。
+    
+    Returns:
+        DatasetVersion: 数据集版本
+    """
+    if has_request_context():
+        pinned = g.get('dataset_version')
+        if pinned is None:
+            pinned = g.dataset_version = _latest(_requested_generation())
+        return pinned
+    return _latest()
+
+
+def _requested_generation():
+    """
+    解析请求带回的读己之写令牌
+    
+    Returns:
+        int: 令牌中的写入代数，没有或格式错误时返回0
+    """
+    from flask import request
+    
+    try:
+        return int(request.headers.get(GENERATION_HEADER, 0))
+    except ValueError:
+        return 0
+
+
+def _latest(min_generation=0):
+    """
+    获取最新的已发布版本，数据源被修改时重建
+    
+    Args:
+        min_generation: 版本至少需要包含的写入代数（读己之写令牌）
+        
+    Returns:
+        DatasetVersion: 数据集版本
+    """
+    global _checked_generation
+    
+    watching = _watching()
+    version = _current
+    if version is None:
+        return _rebuild()
+    checked = _checked_generation
+    observed = generation.global_generation()
+    if watching and observed == checked and min_generation <= checked:
+        # 没有任何进程通过API写入过数据，外部修改由监视线程发现并重建，
+        # 请求路径只读取一次共享内存中的代数
+        return version
+    if version.tokens == _tokens():
+        _checked_generation = max(_checked_generation, observed)
+        return version
+    if _writers > 0:
+        # 本进程有写入尚未完成（尚未向调用方确认），继续读取上一个版本，不等待写锁
+        _stats['staleReads'] += 1
+        return version
+    return _rebuild()
+
+
+def _watching():
+    """
+    确保文件监视线程运行（内存后端没有需要监视的数据文件）
+    
+    Returns:
+        bool: 由监视线程负责发现外部修改时返回True
+    """
+    if config.STORAGE_BACKEND == 'memory':
+        return False
+    data_dir = os.path.dirname(get_data_file_path('projects.json'))
+    return file_watcher.ensure_watching(data_dir, refresh)
+
+
+def refresh():
+    """
+    检查数据源并在有变化时构建新版本（由文件监视线程调用，不在请求路径上）
+    新版本在发布前完成派生索引的构建，发布即原子替换
+    
+    Returns:
+        bool: 构建了新版本返回True
+    """
+    previous = _current
+    return _rebuild(warm=True) is not previous
+
+
+@contextmanager
+def mutation():
+    """
+    写入上下文：写入期间读取方继续使用旧版本，退出时发布新版本
+    写入失败时同样会重建版本，保证快照与磁盘一致
+    """
+    global _writers
+    
+    with _writers_lock:
+        _writers += 1
+    try:
+        yield
+    finally:
+        # 先发布新版本再减少计数，避免读取方在两者之间自行重建
+        try:
+            version = _rebuild()
+        finally:
+            with _writers_lock:
+                _writers -= 1
+        if has_request_context():
+            g.dataset_version = version
+
+
+def get_dataset_stats():
+    """
+    获取数据集版本统计信息
+    
+    Returns:
+        dict: 包含version（当前版本号）、generation（当前版本确认过的全局写入代数）、
+              builds（构建次数）和staleReads（写入期间读取旧版本的次数）的统计数据
+    """
+    version = _current
+    return {
+        'version': version.version if version else 0,
+        'generation': _checked_generation,
+        'builds': _stats['builds'],
+        'staleReads': _stats['staleReads']
+    }
@@ -25,6 +25,12 @@ def handle_errors(f):
                 'success': False,
                 'error': f'数据验证失败: {str(e)}'
             }), 400
+        except TimeoutError as e:
+            # 获取数据文件锁超时（其他进程长时间持有锁）
+            return jsonify({
+                'success': False,
+                'error': f'服务繁忙，请稍后重试: {str(e)}'
+            }), 503
         except Exception as e:
             return jsonify({
                 'success': False,
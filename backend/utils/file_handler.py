@@ -1,15 +1,91 @@
 """
 文件读写工具模块
 提供JSON文件的读取和写入功能，包含文件锁机制防止并发问题
+
+读取时会在内存中缓存解析后的数据，并以文件的 (mtime_ns, size, inode)
+作为版本签名进行校验：签名一致即命中缓存，只需一次 os.stat。
+
+写入时先写临时文件并fsync，再用 os.replace 原子替换目标文件，中途崩溃
+不会留下截断的数据文件。同一文件在组提交窗口内到达的多次写入会合并为
+一次物理写入（组提交），所有写入方都在数据落盘后才返回。
+
+文件锁同时在进程内和进程间生效（见 utils/file_lock.py）：读取持共享锁，
+写入持排他锁，应用可以以多个worker进程运行。
+
+按 config.WRITE_DURABILITY 配置为延迟写入（interval / on-shutdown）的文件，
+写入后数据立即在本进程内生效并返回，由后台线程落盘（见 utils/write_behind.py）。
+
+写入格式由 config.SNAPSHOT_FORMAT 决定（普通JSON或紧凑快照格式，见
+utils/snapshot_format.py），读取时自动识别，两种格式可以混用。
+
+读取-修改-写回的操作应使用 transaction()：整个过程持有排他锁，
+不会丢失并发的修改；数据没有变化时不会重写文件。
+
+每次物理写入后递增该文件在跨进程代数表中的代数（见 utils/generation.py），
+其他worker进程据此判断自己的缓存是否过期。
 """
-import json
 import os
-from threading import Lock
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+import config
+from utils import generation, snapshot_format, write_behind
+from utils.file_lock import get_lock
 
-# 文件锁字典，为每个文件维护一个锁
-_file_locks = {}
+# 保护组提交状态字典
 _locks_lock = Lock()
 
+# 解析结果缓存：{文件路径: (版本签名, 数据)}
+_cache = {}
+_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0
+}
+
+# 组提交窗口（秒）：窗口内到达的同一文件写入合并为一次物理写入
+GROUP_COMMIT_WINDOW = 0.002
+
+# 组提交状态字典，为每个文件维护一个提交组
+_commit_groups = {}
+_write_stats = {
+    'requested': 0,
+    'physical': 0,
+    'transactions': 0,
+    'unchanged': 0
+}
+
+# 延迟写入中尚未落盘的数据：{文件路径: (数据, 格式)}
+_behind = {}
+
+# 进程内每个文件的写入次数（包括尚未落盘的延迟写入），用于检测数据变化
+_generations = {}
+
+
+class _CommitGroup:
+    """
+    单个文件的组提交状态
+    
+    Attributes:
+        cond: 保护以下字段的条件变量
+        pending: 等待落盘的最新 (数据, 格式)（None表示没有待写数据）
+        next_seq: 最近一次写入请求的序号
+        completed_seq: 已完成（成功或失败）的最大序号
+        leader: 当前是否有线程负责执行物理写入
+        failures: 最近失败批次的 (起始序号, 结束序号, 异常) 列表
+    """
+    
+    def __init__(self):
+        self.cond = Condition(Lock())
+        self.pending = None
+        self.next_seq = 0
+        self.completed_seq = 0
+        self.leader = False
+        self.failures = []
+
 
 def _get_file_lock(filepath):
     """
@@ -19,58 +95,636 @@ def _get_file_lock(filepath):
         filepath: 文件路径
         
     Returns:
-        Lock: 文件锁对象
+        FileLock: 文件锁对象（进程内 + 跨进程）
+    """
+    return get_lock(filepath)
+
+
+def _get_commit_group(filepath):
+    """
+    获取指定文件的组提交状态
+    
+    Args:
+        filepath: 文件路径
+        
+    Returns:
+        _CommitGroup: 组提交状态对象
     """
     with _locks_lock:
-        if filepath not in _file_locks:
-            _file_locks[filepath] = Lock()
-        return _file_locks[filepath]
+        if filepath not in _commit_groups:
+            _commit_groups[filepath] = _CommitGroup()
+        return _commit_groups[filepath]
+
+
+def _file_signature(filepath):
+    """
+    获取文件的版本签名
+    
+    Args:
+        filepath: 文件路径
+        
+    Returns:
+        tuple: (mtime_ns, size, inode)，文件不存在时返回None
+    """
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _clone(value):
+    """
+    复制JSON数据（只处理dict/list，其余类型不可变直接复用）
+    比copy.deepcopy快得多，用于防止调用方修改缓存中的数据
+    
+    Args:
+        value: JSON数据
+        
+    Returns:
+        JSON数据的副本
+    """
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
 
 
-def read_json_file(filepath):
+def _evict(filepath):
+    """
+    移除文件的缓存项（调用方需持有文件锁）
+    
+    Args:
+        filepath: 文件路径
+    """
+    if _cache.pop(filepath, None) is not None:
+        _cache_stats['evictions'] += 1
+
+
+def read_json_file(filepath, copy=True):
     """
     读取JSON文件内容
     
     Args:
         filepath: JSON文件路径
-        
+        copy: 是否返回缓存数据的副本（默认True）。
+              只读调用方可传False直接使用缓存对象，但不得修改返回值
+              
     Returns:
         dict: 解析后的JSON数据
         
     Raises:
         FileNotFoundError: 文件不存在
         json.JSONDecodeError: JSON格式错误
+        LockTimeoutError: 获取文件锁超时
     """
+    # 延迟写入尚未落盘时，内存中的数据才是最新的
+    pending = _behind.get(filepath)
+    if pending is not None:
+        return _clone(pending[0]) if copy else pending[0]
+    
     lock = _get_file_lock(filepath)
     
-    with lock:
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"文件不存在: {filepath}")
+    with lock.shared():
+        data = _load_locked(filepath)
+    
+    return _clone(data) if copy else data
+
+
+def _load_locked(filepath):
+    """
+    读取文件的最新数据（调用方需持有文件锁），返回的是缓存对象，不得修改
+    
+    Args:
+        filepath: JSON文件路径
+        
+    Returns:
+        dict: 解析后的JSON数据
+        
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    pending = _behind.get(filepath)
+    if pending is not None:
+        return pending[0]
+    
+    signature = _file_signature(filepath)
+    if signature is None:
+        _evict(filepath)
+        raise FileNotFoundError(f"文件不存在: {filepath}")
+    
+    entry = _cache.get(filepath)
+    if entry is not None and entry[0] == signature:
+        _cache_stats['hits'] += 1
+        return entry[1]
+    
+    # 缓存未命中或已过期，重新解析文件
+    if entry is not None:
+        _evict(filepath)
+    _cache_stats['misses'] += 1
+    with open(filepath, 'rb') as f:
+        data = snapshot_format.loads(f.read())
+    # 以打开文件前的签名入缓存：若读取期间文件被替换，下次读取会因签名不一致而重新解析
+    _cache[filepath] = (signature, data)
+    return data
+
+
+def _fsync_directory(directory):
+    """
+    同步目录项，确保os.replace的重命名本身已落盘
+    不支持目录fsync的平台（如Windows）直接跳过
+    
+    Args:
+        directory: 目录路径
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(filepath, data, fmt):
+    """
+    原子写入JSON文件：写临时文件 -> fsync -> os.replace
+    
+    Args:
+        filepath: JSON文件路径
+        data: 要写入的数据
+        fmt: 文件格式（json / compact / compact-gzip）
+        
+    Raises:
+        IOError: 文件写入失败（临时文件会被清理，原文件保持不变）
+    """
+    tmp_path = _write_temp(filepath, data, fmt)
+    try:
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        _remove_temp(tmp_path)
+        raise
+    
+    _fsync_directory(os.path.dirname(filepath) or '.')
+
+
+def _write_temp(filepath, data, fmt):
+    """
+    把数据写入目标文件同目录下的临时文件并fsync
+    
+    Args:
+        filepath: 目标文件路径
+        data: 要写入的数据
+        fmt: 文件格式
+        
+    Returns:
+        str: 临时文件路径
+        
+    Raises:
+        IOError: 文件写入失败（临时文件会被清理）
+    """
+    payload = snapshot_format.dumps(data, fmt)
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    
+    # 临时文件放在同一目录下，保证os.replace不会跨文件系统
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory,
+        prefix=f'.{os.path.basename(filepath)}.',
+        suffix='.tmp'
+    )
+    try:
+        # mkstemp创建的文件权限为0600，沿用原文件权限
+        try:
+            mode = stat.S_IMODE(os.stat(filepath).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        _remove_temp(tmp_path)
+        raise
+    return tmp_path
+
+
+def _remove_temp(tmp_path):
+    """
+    删除临时文件（忽略错误）
+    
+    Args:
+        tmp_path: 临时文件路径
+    """
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+
+
+def _flush_pending(filepath, group):
+    """
+    由提交组的leader线程调用：取出最新待写数据并执行一次物理写入
+    调用时不得持有group.cond
+    
+    Args:
+        filepath: JSON文件路径
+        group: 组提交状态对象
+    """
+    # 等待组提交窗口，让并发到达的写入合并到本批次
+    if GROUP_COMMIT_WINDOW > 0:
+        time.sleep(GROUP_COMMIT_WINDOW)
+    
+    lock = _get_file_lock(filepath)
+    try:
+        lock.acquire(shared=False)
+    except Exception as e:
+        # 获取文件锁超时，本批次所有写入方都会收到该错误
+        _, batch_start, batch_seq = _take_batch(group)
+        _finish_batch(group, batch_start, batch_seq, e)
+        return
+    try:
+        _flush_pending_locked(filepath, group)
+    finally:
+        lock.release()
+
+
+def _take_batch(group):
+    """
+    取出提交组中等待落盘的数据作为一个批次
+    
+    Args:
+        group: 组提交状态对象
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    Returns:
+        tuple: (待写数据或None, 批次起始序号, 批次结束序号)
+    """
+    with group.cond:
+        pending = group.pending
+        group.pending = None
+        return pending, group.completed_seq + 1, group.next_seq
+
+
+def _finish_batch(group, batch_start, batch_seq, error=None):
+    """
+    标记批次完成并唤醒等待的写入方
+    
+    Args:
+        group: 组提交状态对象
+        batch_start: 批次起始序号
+        batch_seq: 批次结束序号
+        error: 写入失败时的异常
+    """
+    with group.cond:
+        group.completed_seq = max(group.completed_seq, batch_seq)
+        if error is not None:
+            group.failures.append((batch_start, batch_seq, error))
+            # 只保留最近的失败记录，等待者在被唤醒后立即检查
+            del group.failures[:-16]
+        group.cond.notify_all()
+
+
+def _flush_pending_locked(filepath, group):
+    """
+    执行提交组中等待落盘的写入（调用方需持有文件排他锁）
+    
+    待写数据在持有文件锁之后才取出，因此同一文件的事务（见transaction）
+    可以先落盘已排队的写入，再在其结果之上修改。
+    
+    Args:
+        filepath: JSON文件路径
+        group: 组提交状态对象
+    """
+    pending, batch_start, batch_seq = _take_batch(group)
+    if pending is None:
+        # 待写数据已被上一批次（或事务）带走
+        _finish_batch(group, batch_start, batch_seq)
+        return
+    
+    error = None
+    try:
+        _write_locked(filepath, *pending)
+    except Exception as e:
+        error = e
+    _finish_batch(group, batch_start, batch_seq, error)
+
+
+def _write_locked(filepath, data, fmt):
+    """
+    执行一次物理写入并更新缓存（调用方需持有文件排他锁）
+    
+    Args:
+        filepath: JSON文件路径
+        data: 要写入的数据（写入后作为缓存对象，调用方不得再修改）
+        fmt: 文件格式
+    """
+    _atomic_write(filepath, data, fmt)
+    _written(filepath, data)
+
+
+def _written(filepath, data):
+    """
+    物理写入完成后更新统计、代数和缓存（调用方需持有文件排他锁）
+    
+    Args:
+        filepath: JSON文件路径
+        data: 已写入的数据（作为缓存对象，调用方不得再修改）
+    """
+    _write_stats['physical'] += 1
+    # 新内容已对其他进程可见，递增共享代数使它们的缓存失效
+    generation.bump(filepath)
+    
+    # 写入后直接更新缓存，避免下次读取重新解析
+    signature = _file_signature(filepath)
+    if signature is not None:
+        _cache[filepath] = (signature, data)
+    else:
+        _evict(filepath)
 
 
-def write_json_file(filepath, data):
+def write_json_file(filepath, data, fmt=None):
     """
     写入数据到JSON文件
     
+    sync策略（默认）下，同一文件在组提交窗口内的并发写入合并为一次物理写入，
+    以最后到达的数据为准（每次写入都是完整文件内容，效果等同于依次写入），
+    函数在包含本次写入的批次落盘后才返回。
+    延迟写入策略下，数据立即在本进程内生效，函数不等待落盘直接返回。
+    
     Args:
         filepath: JSON文件路径
         data: 要写入的数据（字典或列表）
+        fmt: 文件格式（可选，默认使用config.SNAPSHOT_FORMAT）
+        
+    Raises:
+        IOError: 文件写入失败
+        LockTimeoutError: 获取文件锁超时
+    """
+    # 复制一份，避免调用方在落盘前继续修改数据
+    snapshot = (_clone(data), fmt or config.SNAPSHOT_FORMAT)
+    
+    with _locks_lock:
+        _write_stats['requested'] += 1
+        _generations[filepath] = _generations.get(filepath, 0) + 1
+        mode = write_behind.get_durability(filepath)
+        if mode != 'sync':
+            _behind[filepath] = snapshot
+    
+    if mode != 'sync':
+        write_behind.mark_dirty(filepath, lambda: _flush_behind(filepath), mode)
+        return
+    
+    _commit(filepath, snapshot)
+
+
+def _flush_behind(filepath):
+    """
+    由后台刷盘线程调用：把延迟写入的最新数据落盘
+    
+    Args:
+        filepath: JSON文件路径
+    """
+    snapshot = _behind.get(filepath)
+    if snapshot is None:
+        return
+    _commit(filepath, snapshot)
+    with _locks_lock:
+        # 落盘期间没有新的写入时才移除，否则保留更新的数据等待下次落盘
+        if _behind.get(filepath) is snapshot:
+            del _behind[filepath]
+
+
+def _commit(filepath, snapshot):
+    """
+    通过组提交把数据落盘，返回时包含本次写入的批次已完成
+    
+    Args:
+        filepath: JSON文件路径
+        snapshot: (数据, 格式)
         
     Raises:
         IOError: 文件写入失败
+        LockTimeoutError: 获取文件锁超时
+    """
+    group = _get_commit_group(filepath)
+    
+    with group.cond:
+        group.next_seq += 1
+        seq = group.next_seq
+        group.pending = snapshot
+        
+        while group.completed_seq < seq:
+            if group.leader:
+                group.cond.wait()
+                continue
+            
+            # 没有进行中的写入，由当前线程担任leader执行物理写入
+            group.leader = True
+            group.cond.release()
+            try:
+                _flush_pending(filepath, group)
+            finally:
+                group.cond.acquire()
+                group.leader = False
+                group.cond.notify_all()
+        
+        for batch_start, batch_seq, error in group.failures:
+            if batch_start <= seq <= batch_seq:
+                if isinstance(error, TimeoutError):
+                    raise error
+                raise IOError(f"写入文件失败: {filepath}: {error}") from error
+
+
+@contextmanager
+def staged_write(filepath, data, fmt=None):
+    """
+    分两步写入文件：先把数据写入临时文件并fsync（不持有文件锁），代码块内
+    调用产出的commit()时才原子替换目标文件，返回时数据已落盘
+    
+    用于必须确认落盘后才能继续的写入（如日志压缩删除旧日志之前，见
+    utils/journal.py）：不经过组提交，也不遵循文件的延迟写入策略，提交时
+    丢弃该文件尚未落盘的延迟写入。代码块内没有调用commit()或抛出异常时
+    删除临时文件，目标文件不变。
+    
+    用法：
+        with staged_write(path, data) as commit:
+            commit()
+            
+    Args:
+        filepath: JSON文件路径
+        data: 要写入的数据（提交后作为缓存对象，调用方不得再修改）
+        fmt: 文件格式（可选，默认使用config.SNAPSHOT_FORMAT）
+        
+    Yields:
+        callable: 提交函数
+        
+    Raises:
+        IOError: 文件写入失败
+        LockTimeoutError: 提交时获取文件锁超时
+    """
+    tmp_path = _write_temp(filepath, data, fmt or config.SNAPSHOT_FORMAT)
+    committed = []
+    
+    def commit():
+        with _get_file_lock(filepath).exclusive():
+            os.replace(tmp_path, filepath)
+            committed.append(True)
+            _fsync_directory(os.path.dirname(filepath) or '.')
+            with _locks_lock:
+                _write_stats['requested'] += 1
+                _generations[filepath] = _generations.get(filepath, 0) + 1
+                _behind.pop(filepath, None)
+            _written(filepath, data)
+    
+    try:
+        yield commit
+    finally:
+        if not committed:
+            _remove_temp(tmp_path)
+
+
+@contextmanager
+def transaction(filepath, default=None):
+    """
+    读取-修改-写回事务：在同一次排他锁内读取文件、交给调用方修改并写回
+    
+    用法：
+        with transaction(path) as data:
+            data['items'].append(item)
+            
+    调用方直接修改产出的数据即可；退出时数据与读取时相同则不写入文件。
+    代码块抛出异常时放弃修改。写入遵循文件的持久化策略：sync策略下
+    退出时数据已落盘，延迟写入策略下由后台线程落盘。
+    
+    事务持有文件锁期间不得再读写同一文件（文件锁不可重入）。
+    
+    Args:
+        filepath: JSON文件路径
+        default: 文件不存在时使用的初始数据（可选，不提供则抛出FileNotFoundError）
+        
+    Yields:
+        dict: 可修改的数据副本
+        
+    Raises:
+        FileNotFoundError: 文件不存在且未提供default
+        IOError: 文件写入失败
+        LockTimeoutError: 获取文件锁超时
     """
     lock = _get_file_lock(filepath)
     
-    with lock:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with lock.exclusive():
+        # 先落盘已排队的组提交写入，事务在其结果之上修改
+        group = _get_commit_group(filepath)
+        if group.pending is not None:
+            _flush_pending_locked(filepath, group)
+        
+        try:
+            original = _load_locked(filepath)
+        except FileNotFoundError:
+            if default is None:
+                raise
+            original = None
+        
+        data = _clone(default if original is None else original)
+        yield data
+        
+        if original is not None and data == original:
+            with _locks_lock:
+                _write_stats['unchanged'] += 1
+            return
+        
+        # 复制一份，调用方在退出后仍可能修改产出的数据
+        snapshot = (_clone(data), config.SNAPSHOT_FORMAT)
+        with _locks_lock:
+            _write_stats['requested'] += 1
+            _write_stats['transactions'] += 1
+            _generations[filepath] = _generations.get(filepath, 0) + 1
+            mode = write_behind.get_durability(filepath)
+            if mode != 'sync':
+                _behind[filepath] = snapshot
+        
+        if mode != 'sync':
+            write_behind.mark_dirty(filepath, lambda: _flush_behind(filepath), mode)
+            return
         
-        # 写入文件，使用缩进格式化
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_locked(filepath, *snapshot)
+
+
+def invalidate_cache(filepath=None):
+    """
+    使缓存失效
+    
+    Args:
+        filepath: 文件路径，不提供则清空全部缓存
+    """
+    if filepath is not None:
+        with _get_file_lock(filepath):
+            _evict(filepath)
+        return
+    
+    with _locks_lock:
+        paths = list(_cache.keys())
+    for path in paths:
+        with _get_file_lock(path):
+            _evict(path)
+
+
+def get_cache_stats():
+    """
+    获取缓存统计信息
+    
+    Returns:
+        dict: 包含hits、misses、evictions、entries和hitRate的统计数据
+    """
+    hits = _cache_stats['hits']
+    misses = _cache_stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'evictions': _cache_stats['evictions'],
+        'entries': len(_cache),
+        'hitRate': round(hits / total, 4) if total else 0.0
+    }
+
+
+def get_write_stats():
+    """
+    获取写入统计信息
+    
+    Returns:
+        dict: 包含requested（写入请求数）、physical（物理写入数）、
+              mergeRatio（平均每次物理写入合并的请求数）、transactions
+              （写回的事务数）和unchanged（数据未变化而跳过写入的事务数）的统计数据
+    """
+    requested = _write_stats['requested']
+    physical = _write_stats['physical']
+    return {
+        'requested': requested,
+        'physical': physical,
+        'mergeRatio': round(requested / physical, 2) if physical else 0.0,
+        'transactions': _write_stats['transactions'],
+        'unchanged': _write_stats['unchanged']
+    }
+
+
+def get_write_generation(filepath):
+    """
+    获取本进程对文件的写入次数（包括尚未落盘的延迟写入）
+    
+    Args:
+        filepath: 文件路径
+        
+    Returns:
+        int: 写入次数
+    """
+    return _generations.get(filepath, 0)
 
 
 def get_data_file_path(filename):
@@ -83,9 +737,12 @@ def get_data_file_path(filename):
     Returns:
         str: 完整文件路径
     """
-    # 获取项目根目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    data_dir = os.path.join(project_root, 'data')
+    if config.DATA_DIR:
+        data_dir = os.path.abspath(config.DATA_DIR)
+    else:
+        # 获取项目根目录
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        project_root = os.path.dirname(os.path.dirname(current_dir))
+        data_dir = os.path.join(project_root, 'data')
     
     return os.path.join(data_dir, filename)
@@ -0,0 +1,383 @@
+"""
+文件锁工具模块
+提供进程内 + 跨进程的数据文件锁
+
+进程内使用写优先的读写锁：并发的读取（如多个看板同时加载）可以并行进行，
+写入独占，有写入等待时新的读取排在写入之后。应用以多个worker进程运行时，
+还需要操作系统级的建议锁：对每个数据文件使用一个旁路锁文件（如
+projects.json.lock）并通过 fcntl.flock 加锁，读取方持共享锁，写入方持排他锁，
+均支持超时。每把锁记录加锁等待时间和当前等待的线程数（见 get_lock_stats）。
+
+不支持fcntl的平台（如Windows）退化为仅进程内加锁。
+"""
+import os
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock, get_ident
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 锁对象字典，为每个文件维护一个锁
+_locks = {}
+_locks_lock = Lock()
+
+# flock轮询的最大间隔（秒）
+_MAX_POLL_INTERVAL = 0.05
+
+
+class LockTimeoutError(TimeoutError):
+    """在超时时间内未能获取文件锁"""
+
+
+def get_lock(filepath):
+    """
+    获取指定数据文件的锁对象（进程内单例）
+    
+    Args:
+        filepath: 数据文件路径
+        
+    Returns:
+        FileLock: 文件锁对象
+    """
+    with _locks_lock:
+        if filepath not in _locks:
+            _locks[filepath] = FileLock(filepath)
+        return _locks[filepath]
+
+
+def get_lock_stats():
+    """
+    汇总所有文件锁的等待统计
+    
+    Returns:
+        dict: 包含locks（锁数量）、shared/exclusive（加锁次数）、waits（需要等待的次数）、
+              timeouts、waitMs、avgWaitMs、maxWaitMs、readers、waitingReaders、
+              waitingWriters以及busiest（累计等待最长的文件及其统计）的数据
+    """
+    with _locks_lock:
+        locks = list(_locks.values())
+    
+    totals = {
+        'locks': len(locks),
+        'shared': 0,
+        'exclusive': 0,
+        'waits': 0,
+        'timeouts': 0,
+        'waitMs': 0.0,
+        'maxWaitMs': 0.0,
+        'readers': 0,
+        'waitingReaders': 0,
+        'waitingWriters': 0
+    }
+    busiest = None
+    for lock in locks:
+        stats = lock.get_stats()
+        for key in totals:
+            if key == 'locks':
+                continue
+            if key == 'maxWaitMs':
+                totals[key] = max(totals[key], stats[key])
+            else:
+                totals[key] += stats[key]
+        if stats['waitMs'] > 0 and (busiest is None or stats['waitMs'] > busiest[1]['waitMs']):
+            busiest = (lock.filepath, stats)
+    
+    totals['waitMs'] = round(totals['waitMs'], 2)
+    totals['maxWaitMs'] = round(totals['maxWaitMs'], 2)
+    totals['avgWaitMs'] = round(totals['waitMs'] / totals['waits'], 2) if totals['waits'] else 0.0
+    totals['busiest'] = None
+    if busiest is not None:
+        totals['busiest'] = {
+            'file': os.path.basename(busiest[0]),
+            'waits': busiest[1]['waits'],
+            'waitMs': round(busiest[1]['waitMs'], 2)
+        }
+    return totals
+
+
+class FileLock:
+    """
+    数据文件锁：进程内读写锁 + 旁路锁文件上的flock
+    
+    进程内为写优先的读写锁：多个读取方可以同时持有共享锁，写入方独占；
+    有写入方在等待时新的读取方排在其后，写入不会被持续到达的读取饿死。
+    同一进程内的读取方共用一把flock共享锁（第一个读取方加锁，最后一个释放）。
+    
+    锁不可重入：持有锁期间不得再次获取同一文件的锁。
+    
+    Attributes:
+        filepath: 被保护的数据文件路径
+        lock_path: 旁路锁文件路径
+    """
+    
+    def __init__(self, filepath):
+        """
+        初始化文件锁（锁文件在首次加锁时创建）
+        
+        Args:
+            filepath: 数据文件路径
+        """
+        self.filepath = filepath
+        self.lock_path = filepath + '.lock'
+        self._cond = Condition(Lock())
+        self._readers = 0             # 持有共享锁的线程数
+        self._writer = None           # 持有排他锁的线程ident
+        self._flocking = False        # 第一个读取方正在获取flock共享锁
+        self._waiting_readers = 0
+        self._waiting_writers = 0
+        self._fd = None
+        self._fd_pid = None
+        self._stats = {
+            'shared': 0,
+            'exclusive': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'waitMs': 0.0,
+            'maxWaitMs': 0.0
+        }
+    
+    def _get_fd(self):
+        """
+        获取锁文件描述符
+        fork出的子进程会继承父进程的描述符（两者共享同一把flock），因此按pid重新打开
+        
+        Returns:
+            int: 文件描述符
+        """
+        if self._fd is None or self._fd_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd_pid = os.getpid()
+        return self._fd
+    
+    def acquire(self, shared=False, timeout=None):
+        """
+        获取锁
+        
+        Args:
+            shared: True为共享锁（读取），False为排他锁（写入）
+            timeout: 超时时间（秒），不提供则使用config.LOCK_TIMEOUT
+            
+        Raises:
+            LockTimeoutError: 超时未获取到锁
+        """
+        timeout = config.LOCK_TIMEOUT if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        
+        try:
+            if shared:
+                self._acquire_shared(deadline, timeout)
+            else:
+                self._acquire_exclusive(deadline, timeout)
+        except LockTimeoutError:
+            with self._cond:
+                self._stats['timeouts'] += 1
+            raise
+        
+        self._record_wait(shared, time.monotonic() - start)
+    
+    def _wait(self, deadline, timeout):
+        """
+        在条件变量上等待直到被唤醒或超时（调用方需持有self._cond）
+        
+        Args:
+            deadline: 截止时间（time.monotonic()）
+            timeout: 超时时间（用于错误信息）
+            
+        Raises:
+            LockTimeoutError: 已超时
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LockTimeoutError(f"获取文件锁超时（{timeout}秒）: {self.filepath}")
+        self._cond.wait(remaining)
+    
+    def _acquire_shared(self, deadline, timeout):
+        """
+        获取共享锁：没有写入方持有或等待时即可进入
+        
+        Args:
+            deadline: 截止时间
+            timeout: 超时时间（用于错误信息）
+        """
+        with self._cond:
+            self._waiting_readers += 1
+            try:
+                while self._writer is not None or self._waiting_writers or self._flocking:
+                    self._wait(deadline, timeout)
+            finally:
+                self._waiting_readers -= 1
+            
+            if self._readers > 0 or fcntl is None:
+                # 本进程已持有flock共享锁
+                self._readers += 1
+                return
+            self._flocking = True
+        
+        # 第一个读取方在条件变量之外轮询flock，其他线程在此期间等待
+        try:
+            self._flock(fcntl.LOCK_SH, deadline, timeout)
+        except BaseException:
+            with self._cond:
+                self._flocking = False
+                self._cond.notify_all()
+            raise
+        
+        with self._cond:
+            self._flocking = False
+            self._readers += 1
+            self._cond.notify_all()
+    
+    def _acquire_exclusive(self, deadline, timeout):
+        """
+        获取排他锁：登记为等待中的写入方（阻止新的读取方进入），
+        等当前的读取方和写入方全部释放后进入
+        
+        Args:
+            deadline: 截止时间
+            timeout: 超时时间（用于错误信息）
+        """
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers or self._flocking:
+                    self._wait(deadline, timeout)
+            finally:
+                self._waiting_writers -= 1
+                if self._writer is not None or self._readers or self._flocking:
+                    # 超时放弃：可能有读取方因本写入方等待而阻塞
+                    self._cond.notify_all()
+            self._writer = get_ident()
+        
+        if fcntl is None:
+            return
+        
+        try:
+            self._flock(fcntl.LOCK_EX, deadline, timeout)
+        except BaseException:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+            raise
+    
+    def _record_wait(self, shared, seconds):
+        """
+        记录一次加锁的等待时间
+        
+        Args:
+            shared: 是否为共享锁
+            seconds: 等待时间（秒）
+        """
+        wait_ms = seconds * 1000
+        with self._cond:
+            self._stats['shared' if shared else 'exclusive'] += 1
+            # 不足0.1毫秒视为未等待（只是加锁本身的开销）
+            if wait_ms >= 0.1:
+                self._stats['waits'] += 1
+                self._stats['waitMs'] += wait_ms
+                self._stats['maxWaitMs'] = max(self._stats['maxWaitMs'], wait_ms)
+    
+    def _flock(self, operation, deadline, timeout):
+        """
+        以非阻塞方式轮询flock直到成功或超时
+        
+        Args:
+            operation: fcntl.LOCK_SH或fcntl.LOCK_EX
+            deadline: 截止时间（time.monotonic()）
+            timeout: 超时时间（用于错误信息）
+            
+        Raises:
+            LockTimeoutError: 超时未获取到锁
+        """
+        fd = self._get_fd()
+        interval = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LockTimeoutError(f"获取文件锁超时（{timeout}秒）: {self.filepath}")
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, _MAX_POLL_INTERVAL)
+    
+    def release(self):
+        """
+        释放锁（当前线程持有排他锁时释放排他锁，否则释放一个共享锁）
+        """
+        with self._cond:
+            if self._writer == get_ident():
+                self._writer = None
+                self._unlock_file()
+            else:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._unlock_file()
+            self._cond.notify_all()
+    
+    def _unlock_file(self):
+        """
+        释放本进程持有的flock（调用方需持有self._cond）
+        """
+        if fcntl is not None and self._fd is not None and self._fd_pid == os.getpid():
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+    
+    def get_stats(self):
+        """
+        获取本锁的等待统计
+        
+        Returns:
+            dict: 包含shared/exclusive（加锁次数）、waits（需要等待的次数）、
+                  timeouts、waitMs（累计等待毫秒数）、maxWaitMs、readers（当前读取方数）、
+                  waitingReaders和waitingWriters（当前等待中的线程数）的统计数据
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['readers'] = self._readers
+            stats['waitingReaders'] = self._waiting_readers
+            stats['waitingWriters'] = self._waiting_writers
+        return stats
+    
+    @contextmanager
+    def shared(self, timeout=None):
+        """
+        以共享锁（读取）方式持有锁的上下文
+        
+        Args:
+            timeout: 超时时间（秒）
+        """
+        self.acquire(shared=True, timeout=timeout)
+        try:
+            yield self
+        finally:
+            self.release()
+    
+    @contextmanager
+    def exclusive(self, timeout=None):
+        """
+        以排他锁（写入）方式持有锁的上下文
+        
+        Args:
+            timeout: 超时时间（秒）
+        """
+        self.acquire(shared=False, timeout=timeout)
+        try:
+            yield self
+        finally:
+            self.release()
+    
+    def __enter__(self):
+        """兼容 with lock: 的写法，等同于排他锁"""
+        self.acquire(shared=False)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,336 @@
+"""
+数据文件监视模块
+在后台线程中发现绕过API对data目录的修改（迁移脚本、运维脚本、从
+data_backup/ 手工恢复等），并在请求路径之外重新加载数据
+
+- Linux上通过ctypes调用inotify，文件被替换、追加或删除时立即收到通知；
+  短暂合并连续到达的事件后触发一次重新加载
+- 其他平台（或inotify不可用时）按 config.WATCH_INTERVAL 轮询，检查本身只做stat
+
+监视线程启动后，读取方不再在每次请求时检查文件签名（见 utils/dataset.py），
+外部修改在重新加载完成后原子地生效；本进程自身的写入仍在写入完成时立即发布。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+import config
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+# 收到事件后等待后续事件的合并窗口（秒），一次原子替换或批量导入只触发一次重新加载
+SETTLE_DELAY = 0.05
+
+# 不触发重新加载的文件（锁文件和写入过程中的临时文件）
+_IGNORED_SUFFIXES = ('.lock', '.tmp')
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def _load_libc():
+    """
+    加载支持inotify的C标准库
+    
+    Returns:
+        ctypes.CDLL: libc对象，平台不支持inotify时返回None
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def _is_ignored(name):
+    """
+    判断文件变化是否可以忽略
+    
+    Args:
+        name: 文件名
+        
+    Returns:
+        bool: 锁文件或临时文件返回True
+    """
+    return name.startswith('.') or name.endswith(_IGNORED_SUFFIXES)
+
+
+class FileWatcher:
+    """
+    数据目录监视线程
+    
+    Attributes:
+        directory: 被监视的数据目录（包括其下一层子目录，如project_shards）
+        on_change: 发现变化时在监视线程中调用的函数（无参数，失败时抛出异常）
+        mode: 实际使用的监视方式（inotify或poll）
+    """
+    
+    def __init__(self, directory, on_change, mode='auto'):
+        """
+        初始化监视线程（调用start()后开始监视）
+        
+        Args:
+            directory: 数据目录
+            on_change: 重新加载函数
+            mode: auto、inotify或poll
+        """
+        self.directory = directory
+        self.on_change = on_change
+        self.pid = os.getpid()
+        self._libc = _load_libc() if mode in ('auto', 'inotify') else None
+        if mode == 'inotify' and self._libc is None:
+            print("当前平台不支持inotify，改为轮询数据文件")
+        self.mode = 'inotify' if self._libc is not None else 'poll'
+        self._fd = None
+        self._watches = {}  # {监视描述符: 目录路径}
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats = {
+            'events': 0,
+            'reloads': 0,
+            'errors': 0,
+            'lastReloadMs': 0.0
+        }
+    
+    def start(self):
+        """
+        启动监视线程
+        """
+        if self.mode == 'inotify' and not self._init_inotify():
+            self.mode = 'poll'
+        self._thread = threading.Thread(
+            target=self._inotify_loop if self.mode == 'inotify' else self._poll_loop,
+            name='data-file-watcher',
+            daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self):
+        """
+        停止监视线程并释放inotify描述符
+        """
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+    
+    def is_alive(self):
+        """
+        监视线程是否在本进程中运行（fork出的子进程不会继承线程）
+        
+        Returns:
+            bool: 运行中返回True
+        """
+        return self.pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+    
+    def _init_inotify(self):
+        """
+        创建inotify实例并监视数据目录及其子目录
+        
+        Returns:
+            bool: 成功返回True，失败时打印原因并返回False
+        """
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            print(f"inotify初始化失败（{os.strerror(ctypes.get_errno())}），改为轮询数据文件")
+            return False
+        self._fd = fd
+        
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._add_watch(self.directory):
+            os.close(fd)
+            self._fd = None
+            return False
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                self._add_watch(entry.path)
+        return True
+    
+    def _add_watch(self, path):
+        """
+        监视一个目录
+        
+        Args:
+            path: 目录路径
+            
+        Returns:
+            bool: 成功返回True
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            print(f"无法监视目录 {path}: {os.strerror(ctypes.get_errno())}")
+            return False
+        self._watches[wd] = path
+        return True
+    
+    def _read_events(self):
+        """
+        读取并解析当前可读的inotify事件
+        
+        Returns:
+            bool: 有需要重新加载的变化时返回True
+        """
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        
+        changed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + length].split(b'\0', 1)[0].decode('utf-8', 'replace')
+            offset += length
+            
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，可能漏掉了修改，按有变化处理
+                changed = True
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and wd in self._watches:
+                    # 新建的子目录（如首次拆分出的project_shards）
+                    self._add_watch(os.path.join(self._watches[wd], name))
+                    changed = True
+                continue
+            if name and not _is_ignored(name):
+                changed = True
+        return changed
+    
+    def _inotify_loop(self):
+        """
+        inotify监视循环：收到事件后合并一个窗口内的后续事件，再触发重新加载
+        重新加载失败（如文件正在被手工编辑）时按轮询间隔重试
+        """
+        retry_at = None
+        while not self._stopping.is_set():
+            timeout = 0.5
+            if retry_at is not None:
+                timeout = max(0.0, min(timeout, retry_at - time.monotonic()))
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            changed = bool(readable) and self._read_events()
+            
+            if changed:
+                self._stats['events'] += 1
+                # 合并窗口：原子替换、批量导入会连续产生多个事件（持续写入时最多合并10个窗口）
+                settle_until = time.monotonic() + SETTLE_DELAY * 10
+                while (time.monotonic() < settle_until
+                       and select.select([self._fd], [], [], SETTLE_DELAY)[0]):
+                    self._read_events()
+            elif retry_at is None or time.monotonic() < retry_at:
+                continue
+            
+            retry_at = None if self._reload() else time.monotonic() + config.WATCH_INTERVAL
+    
+    def _poll_loop(self):
+        """
+        轮询循环：每个间隔调用一次重新加载函数（由其比较文件签名，未变化时直接返回）
+        """
+        while not self._stopping.wait(config.WATCH_INTERVAL):
+            self._reload()
+    
+    def _reload(self):
+        """
+        调用重新加载函数并记录耗时
+        
+        Returns:
+            bool: 成功返回True
+        """
+        start = time.monotonic()
+        try:
+            reloaded = self.on_change()
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"重新加载外部修改的数据失败，继续使用当前数据: {str(e)}")
+            return False
+        if reloaded:
+            self._stats['reloads'] += 1
+            self._stats['lastReloadMs'] = round((time.monotonic() - start) * 1000, 2)
+        return True
+    
+    def get_stats(self):
+        """
+        获取监视统计信息
+        
+        Returns:
+            dict: 包含mode、events（inotify事件批次数）、reloads（实际重新加载次数）、
+                  errors和lastReloadMs的统计数据
+        """
+        stats = dict(self._stats)
+        stats['mode'] = self.mode
+        return stats
+
+
+def ensure_watching(directory, on_change):
+    """
+    确保本进程的数据目录监视线程正在运行（按config.FILE_WATCHER）
+    
+    Args:
+        directory: 数据目录
+        on_change: 重新加载函数（返回是否实际重新加载了数据）
+        
+    Returns:
+        bool: 监视线程正在运行返回True，配置为off时返回False
+    """
+    global _watcher
+    
+    if config.FILE_WATCHER == 'off':
+        return False
+    watcher = _watcher
+    if watcher is not None and watcher.is_alive():
+        return True
+    
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = FileWatcher(directory, on_change, config.FILE_WATCHER)
+            _watcher.start()
+        return True
+
+
+def stop_watching():
+    """
+    停止监视线程（测试或需要切换为逐次检查时使用）
+    """
+    global _watcher
+    
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.stop()
+            _watcher = None
+
+
+def get_watcher_stats():
+    """
+    获取监视统计信息
+    
+    Returns:
+        dict: 监视统计数据，未启动监视时mode为off
+    """
+    watcher = _watcher
+    if watcher is None or not watcher.is_alive():
+        return {'mode': 'off', 'events': 0, 'reloads': 0, 'errors': 0, 'lastReloadMs': 0.0}
+    return watcher.get_stats()
@@ -0,0 +1,168 @@
+"""
+跨进程写入代数模块
+在所有worker进程之间共享数据文件的写入代数（generation），用于缓存失效检查
+
+代数表保存在 data/.generations 中，各进程通过mmap映射同一份文件：
+- 槽0是全局代数，任何进程对任何数据文件的写入都会使其递增
+- 其余槽按文件路径的哈希分配给各数据文件，写入方在数据对其他进程可见
+  （文件替换完成、日志追加完成、数据库事务提交）后递增
+- 读取方只需从映射内存中读一个8字节整数，与本地缓存记录的代数比较，
+  相同即可信任缓存，不需要stat或读取文件
+
+不同文件的哈希冲突只会造成多余的失效检查，不影响正确性。递增由
+fcntl.flock串行化；不支持fcntl的平台退化为仅进程内串行化。
+绕过API的外部修改不会递增代数，由文件监视线程发现（见 utils/file_watcher.py）。
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 代数表文件名（以点开头，文件监视线程会忽略它的变化）
+GENERATION_FILE = '.generations'
+
+# 代数表槽位数量（每个槽8字节，槽0为全局代数）
+SLOTS = 1024
+
+_SLOT = struct.Struct('<Q')
+
+_table = None
+_table_lock = threading.Lock()
+
+
+class _GenerationTable:
+    """
+    映射到内存的代数表
+    
+    Attributes:
+        path: 代数表文件路径
+        pid: 打开代数表的进程ID（fork后的子进程需要重新打开，flock不能跨进程共享描述符）
+    """
+    
+    def __init__(self, path):
+        """
+        打开（必要时创建）代数表文件并映射到内存
+        
+        Args:
+            path: 代数表文件路径
+        """
+        self.path = path
+        self.pid = os.getpid()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = SLOTS * _SLOT.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+    
+    def read(self, slot):
+        """
+        读取一个槽的代数
+        
+        Args:
+            slot: 槽位
+            
+        Returns:
+            int: 代数
+        """
+        return _SLOT.unpack_from(self._map, slot * _SLOT.size)[0]
+    
+    def bump(self, slot):
+        """
+        递增一个槽和全局槽的代数
+        
+        Args:
+            slot: 槽位
+            
+        Returns:
+            int: 递增后的全局代数
+        """
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                _SLOT.pack_into(self._map, slot * _SLOT.size, self.read(slot) + 1)
+                current = self.read(0) + 1
+                _SLOT.pack_into(self._map, 0, current)
+                return current
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def _slot(filepath):
+    """
+    计算文件对应的槽位（与进程无关的稳定哈希）
+    
+    Args:
+        filepath: 数据文件路径
+        
+    Returns:
+        int: 1到SLOTS-1之间的槽位
+    """
+    digest = hashlib.blake2b(os.path.abspath(filepath).encode('utf-8'), digest_size=8).digest()
+    return 1 + int.from_bytes(digest, 'little') % (SLOTS - 1)
+
+
+def _get_table():
+    """
+    获取本进程的代数表（首次调用时打开）
+    
+    Returns:
+        _GenerationTable: 代数表
+    """
+    global _table
+    
+    table = _table
+    if table is not None and table.pid == os.getpid():
+        return table
+    
+    from utils.file_handler import get_data_file_path
+    
+    with _table_lock:
+        if _table is None or _table.pid != os.getpid():
+            _table = _GenerationTable(get_data_file_path(GENERATION_FILE))
+        return _table
+
+
+def bump(filepath):
+    """
+    记录一次对数据文件的写入（在数据对其他进程可见之后调用）
+    
+    Args:
+        filepath: 数据文件路径
+        
+    Returns:
+        int: 递增后的全局代数
+    """
+    return _get_table().bump(_slot(filepath))
+
+
+def file_generation(filepath):
+    """
+    获取数据文件的写入代数（所有进程累计）
+    
+    Args:
+        filepath: 数据文件路径
+        
+    Returns:
+        int: 代数
+    """
+    return _get_table().read(_slot(filepath))
+
+
+def global_generation():
+    """
+    获取全局写入代数：任何进程写入任何数据文件后都会增大
+    
+    Returns:
+        int: 代数
+    """
+    return _get_table().read(0)
@@ -0,0 +1,936 @@
+"""
+项目变更历史模块
+为每个项目记录逐版本的字段级变更，可以查询单个项目的历史，或还原任意时间点
+全部项目的状态（GET /api/projects?asOf=）
+
+- 每次新增、修改、删除记录为一个版本（按项目ID和版本号索引）：新增保存完整
+  记录，修改只保存变化的字段（set）和被删除的字段（unset），删除只有版本号
+- 每个项目每隔 config.HISTORY_CHECKPOINT_INTERVAL 个版本保存一次完整记录
+  （检查点），还原某个版本时从最近的检查点开始，最多回放 N-1 个增量
+- 首次记录时为当前全部项目（包括归档项目）保存一个基线检查点，早于基线的
+  时间点无法查询
+- 项目数据仓库被包装为记录历史的仓库（见 track_history），修改时把历史回调
+  交给实际的项目存储，历史版本在存储的写锁（或写事务）内计算，与修改在同一
+  次写入中持久化：不需要全局的历史锁，不同分片的写入互不阻塞，也没有额外的
+  fsync
+- 归档和移回热数据只是移动项目（见 utils/archive.py），在 untracked() 中进行，
+  不产生历史版本
+- 超过 config.HISTORY_RETENTION_DAYS 的版本在启动时和 maintenance compact 中
+  合并为截断时间点的检查点（见 truncation），历史不会无限增长
+
+JSON后端的历史版本随修改写在项目追加日志的同一行中，压缩日志时批量移入
+data/project_history.jsonl（每行一个版本）；SQLite后端在修改所在的事务中
+插入 project_history 表；内存后端保存在内存中，随内存仓库快照保存。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+from utils.file_lock import get_lock
+
+# 历史文件名（位于data目录下）
+HISTORY_FILE = 'project_history.jsonl'
+
+_local = threading.local()
+
+
+def _now_ms():
+    """当前时间戳（毫秒）"""
+    return int(time.time() * 1000)
+
+
+def diff(before, after):
+    """
+    计算两个版本之间的字段级增量
+    
+    Args:
+        before: 修改前的记录
+        after: 修改后的记录
+        
+    Returns:
+        dict: 包含set（新值有变化的字段）和unset（被删除的字段）的增量，没有变化时为None
+    """
+    changed = {key: value for key, value in after.items() if key not in before or before[key] != value}
+    removed = sorted(key for key in before if key not in after)
+    if not changed and not removed:
+        return None
+    return {'set': changed, 'unset': removed}
+
+
+def apply_delta(record, entry):
+    """
+    把一个版本应用到记录上
+    
+    Args:
+        record: 上一版本的记录（不修改）
+        entry: 历史版本（包含record的检查点或包含set/unset的增量）
+        
+    Returns:
+        dict: 新版本的记录
+    """
+    if 'record' in entry:
+        return dict(entry['record'])
+    result = {key: value for key, value in record.items() if key not in entry.get('unset', [])}
+    result.update(entry.get('set', {}))
+    return result
+
+
+def parse_timestamp(value):
+    """
+    解析asOf时间点：毫秒时间戳，或ISO格式的日期/时间（本地时间）
+    
+    Args:
+        value: 查询参数
+        
+    Returns:
+        int: 毫秒时间戳
+        
+    Raises:
+        ValueError: 格式不正确
+    """
+    if value.isdigit():
+        return int(value)
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"时间格式错误: {value}（应为毫秒时间戳或YYYY-MM-DD[THH:MM:SS]）")
+    if len(value) == 10:
+        # 只有日期时取当天结束时的状态
+        moment = moment.replace(hour=23, minute=59, second=59, microsecond=999000)
+    return int(moment.timestamp() * 1000)
+
+
+class _HistoryIndex:
+    """
+    按项目ID索引的版本元数据（FileHistoryStore和MemoryHistoryStore共用）
+    
+    每个项目的元数据按版本号升序，同一版本只保留一个（同一版本可能既在追加
+    日志中又已写入历史文件，或因重做跨分片移动被追加两次）。历史被截断后，
+    项目只保留截断时保存的基线检查点及之后的版本，早于截断时间点的版本被忽略。
+    """
+    
+    def _reset(self):
+        """清空索引（调用方持有self._mutex）"""
+        # {项目ID: [(版本号, 时间戳, 操作, 是否检查点, 读取键)]}
+        self._meta = {}
+        self._first_ts = None
+        self._cutoff = None
+    
+    def _add(self, entry, key):
+        """
+        把一个版本加入索引（调用方持有self._mutex）
+        
+        Args:
+            entry: 历史版本
+            key: 读取键
+            
+        Returns:
+            bool: 加入了索引返回True，版本已存在或早于截断时间点返回False
+        """
+        if self._cutoff is not None and entry['ts'] < self._cutoff:
+            return False
+        items = self._meta.setdefault(entry['id'], [])
+        version = entry['v']
+        i = bisect.bisect_left(items, (version,))
+        if i < len(items) and items[i][0] == version:
+            return False
+        if i == 0 and items and items[0][2] == 'baseline':
+            return False
+        if entry['op'] == 'baseline':
+            del items[:i]
+            i = 0
+        items.insert(i, (version, entry['ts'], entry['op'], 'record' in entry, key))
+        if self._first_ts is None or entry['ts'] < self._first_ts:
+            self._first_ts = entry['ts']
+        return True
+    
+    def _stored(self, entry):
+        """
+        获取索引中与版本的项目ID和版本号相同的元数据（调用方持有self._mutex）
+        
+        Args:
+            entry: 历史版本
+            
+        Returns:
+            tuple: 元数据，不存在返回None
+        """
+        items = self._meta.get(entry['id'], [])
+        i = bisect.bisect_left(items, (entry['v'],))
+        if i < len(items) and items[i][0] == entry['v']:
+            return items[i]
+        return None
+
+
+class FileHistoryStore(_HistoryIndex):
+    """
+    以JSONL文件保存的历史（每行一个版本，只追加）
+    
+    项目修改的历史版本随修改写在项目的追加日志中（见 utils/journal.py），
+    压缩日志时批量写入历史文件。内存中的索引包括两部分：历史文件中的版本
+    （读取键为行偏移）和追加日志中尚未写入历史文件的版本（读取键为版本本身，
+    由日志集合回放或追加时交给 observe()）。
+    
+    历史文件第一行可以是截断标记 {"truncated": 时间戳}（见 truncate()）。
+    
+    Attributes:
+        path: 历史文件路径
+        lock_path: 历史锁保护的路径
+        source: 附带历史版本的项目存储（可选，查询前刷新以读到其他进程的修改）
+    """
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: 历史文件路径
+        """
+        self.path = path
+        self.lock_path = path
+        self.source = None
+        self._reset()
+        # 只在追加日志中的版本 {(项目ID, 版本号): 历史版本}
+        self._pending = {}
+        self._state = None
+        self._offset = 0
+        self._mutex = threading.Lock()
+    
+    def _refresh(self):
+        """
+        读取其他进程（或本进程）新追加的版本，更新索引
+        文件被替换或截短时重新建立索引
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        with self._mutex:
+            state = (st.st_ino, st.st_size) if st else None
+            if state == self._state:
+                return
+            rebuild = (state is None or self._state is None
+                       or state[0] != self._state[0] or state[1] < self._offset)
+            if rebuild:
+                self._reset()
+                self._offset = 0
+            if state is not None:
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # 崩溃留下的不完整末行，下次追加时截掉
+                            break
+                        self._index(json.loads(line), self._offset)
+                        self._offset += len(line)
+            if rebuild:
+                self._pending = {
+                    key: entry for key, entry in self._pending.items() if self._add(entry, entry)
+                }
+            self._state = state
+    
+    def _index(self, entry, offset):
+        """
+        把历史文件中的一行加入索引（调用方持有self._mutex）
+        
+        Args:
+            entry: 历史版本或截断标记
+            offset: 行偏移
+        """
+        if 'truncated' in entry:
+            self._cutoff = self._first_ts = entry['truncated']
+            return
+        if self._add(entry, offset):
+            return
+        # 追加日志中的版本已写入历史文件，改为按行偏移读取
+        if self._pending.pop((entry['id'], entry['v']), None) is not None:
+            items = self._meta[entry['id']]
+            i = bisect.bisect_left(items, (entry['v'],))
+            items[i] = items[i][:4] + (offset,)
+    
+    def _in_file(self, entry):
+        """
+        判断版本是否已写入历史文件（调用方持有self._mutex）
+        
+        Args:
+            entry: 历史版本
+            
+        Returns:
+            bool: 已写入返回True
+        """
+        stored = self._stored(entry)
+        return stored is not None and isinstance(stored[4], int)
+    
+    def observe(self, entries):
+        """
+        登记追加日志中的历史版本（由项目的日志集合在追加或回放日志时调用）
+        
+        Args:
+            entries: 历史版本列表
+        """
+        with self._mutex:
+            for entry in entries:
+                if self._add(entry, entry):
+                    self._pending[(entry['id'], entry['v'])] = entry
+    
+    def append(self, entries):
+        """
+        追加版本（调用方持有历史锁），已写入历史文件的版本跳过
+        
+        Args:
+            entries: 历史版本列表
+        """
+        with self._mutex:
+            entries = [entry for entry in entries if not self._in_file(entry)]
+        if not entries:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            size = f.tell()
+            with self._mutex:
+                complete = self._offset if self._state and self._state[1] == size else None
+            if complete is None:
+                self._refresh()
+                complete = self._offset
+            if complete < size:
+                print(f"历史文件 {self.path} 末尾存在不完整记录，已截断")
+                f.truncate(complete)
+            payload = b''.join((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8') for entry in entries)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+    
+    def persist(self, entries):
+        """
+        把追加日志中的历史版本写入历史文件（压缩日志时调用，一次fsync）
+        
+        Args:
+            entries: 历史版本列表
+        """
+        with get_lock(self.lock_path).exclusive():
+            self._refresh()
+            self.append(entries)
+    
+    def sync(self):
+        """
+        刷新关联的项目存储和历史文件，读到其他进程的修改（查询历史前调用）
+        """
+        if self.source is not None:
+            try:
+                self.source.values()
+            except FileNotFoundError:
+                pass
+        self._refresh()
+    
+    def truncate(self, cutoff):
+        """
+        截断早于cutoff的版本（见 truncation），用截断标记加保留的版本原子替换
+        历史文件；追加日志中的版本一并写入
+        
+        Args:
+            cutoff: 毫秒时间戳
+            
+        Returns:
+            int: 删除的版本数量
+        """
+        with get_lock(self.lock_path).exclusive():
+            self._refresh()
+            kept = truncation(self, cutoff)
+            if kept is None:
+                return 0
+            with self._mutex:
+                before = sum(len(items) for items in self._meta.values())
+            lines = [{'truncated': cutoff}] + kept
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for entry in lines:
+                    f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            dir_fd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self._refresh()
+        return before - len(kept)
+    
+    def meta(self, record_id):
+        """
+        获取项目的版本元数据
+        
+        Args:
+            record_id: 项目ID
+            
+        Returns:
+            list: 按版本号升序的 (版本号, 时间戳, 操作, 是否检查点, 读取键)
+        """
+        self._refresh()
+        with self._mutex:
+            return list(self._meta.get(record_id, []))
+    
+    def record_ids(self):
+        """获取有历史的全部项目ID"""
+        self._refresh()
+        with self._mutex:
+            return [record_id for record_id, items in self._meta.items() if items]
+    
+    def first_ts(self):
+        """
+        获取最早版本的时间戳（截断后为截断时间点）
+        
+        Returns:
+            int: 毫秒时间戳，没有历史时返回None
+        """
+        self._refresh()
+        return self._first_ts
+    
+    def read(self, keys):
+        """
+        读取版本内容
+        
+        Args:
+            keys: meta()返回的读取键（行偏移或版本本身）列表
+            
+        Returns:
+            list: 与keys顺序一致的历史版本
+        """
+        offsets = sorted({key for key in keys if isinstance(key, int)})
+        entries = {}
+        if offsets:
+            with open(self.path, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    entries[offset] = json.loads(f.readline())
+        return [entries[key] if isinstance(key, int) else key for key in keys]
+
+
+class MemoryHistoryStore(_HistoryIndex):
+    """
+    内存中的历史（内存后端使用），接口与FileHistoryStore一致，读取键为版本本身
+    随内存仓库快照保存（见 utils/repository.py 的MemoryRepository）
+    
+    Attributes:
+        lock_path: 历史锁保护的路径
+    """
+    
+    def __init__(self, lock_path, on_change):
+        """
+        Args:
+            lock_path: 历史锁保护的路径
+            on_change: 历史变化后调用的函数（无参数）
+        """
+        self.lock_path = lock_path
+        self._on_change = on_change
+        self._reset()
+        self._mutex = threading.RLock()
+    
+    def load(self, entries, cutoff=None):
+        """
+        加载版本（启动时从快照或其他后端导入，不触发快照写入）
+        
+        Args:
+            entries: 历史版本列表
+            cutoff: 截断时间点（可选）
+        """
+        with self._mutex:
+            self._reset()
+            self._cutoff = self._first_ts = cutoff
+            for entry in entries:
+                self._add(entry, entry)
+    
+    def dump(self):
+        """
+        导出全部版本（写入快照）
+        
+        Returns:
+            dict: {'truncated': 截断时间点或None, 'history': 历史版本列表}
+        """
+        with self._mutex:
+            entries = [item[4] for items in self._meta.values() for item in items]
+            return {'truncated': self._cutoff, 'history': entries}
+    
+    def append(self, entries):
+        """
+        追加版本
+        
+        Args:
+            entries: 历史版本列表
+        """
+        with self._mutex:
+            changed = [entry for entry in entries if self._add(entry, entry)]
+        if changed:
+            self._on_change()
+    
+    def sync(self):
+        """与FileHistoryStore接口保持一致（内存中的历史总是最新的）"""
+    
+    def truncate(self, cutoff):
+        """
+        截断早于cutoff的版本（见 truncation）
+        
+        Args:
+            cutoff: 毫秒时间戳
+            
+        Returns:
+            int: 删除的版本数量
+        """
+        with self._mutex:
+            kept = truncation(self, cutoff)
+            if kept is None:
+                return 0
+            before = sum(len(items) for items in self._meta.values())
+            self.load(kept, cutoff)
+        self._on_change()
+        return before - len(kept)
+    
+    def meta(self, record_id):
+        """获取项目的版本元数据：按版本号升序的 (版本号, 时间戳, 操作, 是否检查点, 版本)"""
+        with self._mutex:
+            return list(self._meta.get(record_id, []))
+    
+    def record_ids(self):
+        """获取有历史的全部项目ID"""
+        with self._mutex:
+            return [record_id for record_id, items in self._meta.items() if items]
+    
+    def first_ts(self):
+        """获取最早版本的时间戳（截断后为截断时间点），没有历史时返回None"""
+        return self._first_ts
+    
+    def read(self, keys):
+        """读取版本内容（读取键即版本本身）"""
+        return list(keys)
+
+
+@contextmanager
+def untracked():
+    """
+    不记录历史的上下文（同一线程内有效），用于归档等只移动项目、不改变内容的操作
+    """
+    previous = getattr(_local, 'untracked', False)
+    _local.untracked = True
+    try:
+        yield
+    finally:
+        _local.untracked = previous
+
+
+@contextmanager
+def _recording(history):
+    """
+    历史上下文：持有历史的排他锁（同一线程可嵌套），用于不经过项目存储直接
+    追加历史的操作（基线、归档项目的修改、整体替换）
+    
+    Args:
+        history: 历史存储
+    """
+    depth = getattr(_local, 'depth', 0)
+    if depth > 0:
+        _local.depth = depth + 1
+        try:
+            yield
+        finally:
+            _local.depth -= 1
+        return
+    
+    with get_lock(history.lock_path).exclusive():
+        _local.depth = 1
+        try:
+            yield
+        finally:
+            _local.depth = 0
+
+
+class _Recorder:
+    """
+    计算历史版本
+    """
+    
+    def __init__(self, repository, history, store):
+        """
+        Args:
+            repository: 实际的数据仓库（读取基线）
+            history: 历史存储
+            store: 实际的项目存储
+        """
+        self.repository = repository
+        self.history = history
+        self.store = store
+    
+    def ensure_baseline(self):
+        """
+        历史为空时为当前全部项目（包括归档项目）保存基线检查点
+        """
+        if self.history.first_ts() is not None:
+            return
+        with _recording(self.history):
+            if self.history.first_ts() is not None:
+                return
+            try:
+                records = list(self.store.values())
+            except FileNotFoundError:
+                records = []
+            archive = self.repository.archive_store()
+            for year in archive.years():
+                records.extend(archive.values(year))
+            ts = _now_ms()
+            seen = set()
+            entries = []
+            for record in records:
+                if record['id'] not in seen:
+                    seen.add(record['id'])
+                    entries.append({'id': record['id'], 'v': 1, 'ts': ts, 'op': 'baseline', 'record': record})
+            self.history.append(entries)
+    
+    def entry(self, record_id, before, after):
+        """
+        计算一次修改的历史版本（作为历史回调交给项目存储，在存储的写锁或
+        写事务内调用，同一项目的版本号因此不会重复）
+        
+        Args:
+            record_id: 项目ID
+            before: 修改前的记录（不存在为None）
+            after: 修改后的记录（已删除为None）
+            
+        Returns:
+            dict: 历史版本，没有需要记录的变化时返回None
+        """
+        meta = self.history.meta(record_id)
+        deleted = not meta or meta[-1][2] == 'delete'
+        version = meta[-1][0] + 1 if meta else 1
+        entry = {'id': record_id, 'v': version, 'ts': _now_ms()}
+        
+        if after is None:
+            if deleted:
+                return None
+            entry['op'] = 'delete'
+        elif deleted or before is None:
+            entry.update(op='create', record=after)
+        else:
+            delta = diff(before, after)
+            if delta is None:
+                return None
+            entry['op'] = 'update'
+            last_checkpoint = next(v for v, _, _, checkpoint, _ in reversed(meta) if checkpoint)
+            if version - last_checkpoint >= config.HISTORY_CHECKPOINT_INTERVAL:
+                entry['record'] = after
+            else:
+                entry.update(delta)
+        return entry
+    
+    def callback(self):
+        """
+        获取交给项目存储的历史回调（确保已有基线），untracked()中返回None
+        
+        Returns:
+            callable: 历史回调，不记录历史时为None
+        """
+        if getattr(_local, 'untracked', False):
+            return None
+        self.ensure_baseline()
+        return self.entry
+    
+    def record(self, record_id, before, after):
+        """
+        直接追加一次修改的历史版本（调用方持有历史锁）
+        
+        Args:
+            record_id: 项目ID
+            before: 修改前的记录（不存在为None）
+            after: 修改后的记录（已删除为None）
+        """
+        if getattr(_local, 'untracked', False):
+            return
+        self.ensure_baseline()
+        entry = self.entry(record_id, before, after)
+        if entry is not None:
+            self.history.append([entry])
+
+
+class TrackedProjectStore:
+    """
+    记录历史的项目存储：包装实际存储，修改时把历史回调交给实际存储，由其
+    与修改一起持久化历史版本；读取直接委托
+    """
+    
+    def __init__(self, store, recorder):
+        """
+        Args:
+            store: 实际的项目存储
+            recorder: 历史记录器
+        """
+        self._store = store
+        self._recorder = recorder
+    
+    def __getattr__(self, name):
+        """读取类操作直接委托给实际存储"""
+        return getattr(self._store, name)
+    
+    def put(self, record, op='update'):
+        """写入一条记录并记录历史"""
+        self._store.put(record, op=op, history=self._recorder.callback())
+    
+    def modify(self, record_id, fn):
+        """修改一条记录，记录有变化时记录历史"""
+        return self._store.modify(record_id, fn, history=self._recorder.callback())
+    
+    def remove(self, record_id):
+        """删除一条记录并记录历史"""
+        return self._store.remove(record_id, history=self._recorder.callback())
+    
+    def replace_all(self, records):
+        """替换全部记录，逐条记录历史"""
+        with _recording(self._recorder.history):
+            existing = {record['id']: dict(record) for record in self._store.values()}
+            self._store.replace_all(records)
+            for record in records:
+                self._recorder.record(record['id'], existing.pop(record['id'], None), record)
+            for record_id in existing:
+                self._recorder.record(record_id, None, None)
+
+
+class TrackedRepository:
+    """
+    记录项目历史的数据仓库：项目存储追加历史版本，其余委托
+    """
+    
+    def __init__(self, repository):
+        """
+        Args:
+            repository: 实际的数据仓库
+        """
+        self._repository = repository
+        history = repository.history_store()
+        self._recorder = _Recorder(repository, history, repository.project_store())
+        self._projects = TrackedProjectStore(repository.project_store(), self._recorder)
+    
+    def __getattr__(self, name):
+        """读取类操作直接委托给实际仓库"""
+        return getattr(self._repository, name)
+    
+    def project_store(self):
+        """获取记录历史的项目存储"""
+        return self._projects
+    
+    def record_change(self, record_id, before, after):
+        """
+        记录不经过项目存储的修改（如直接删除归档中的项目）
+        
+        Args:
+            record_id: 项目ID
+            before: 修改前的记录（不存在为None）
+            after: 修改后的记录（已删除为None）
+        """
+        with _recording(self._recorder.history):
+            self._recorder.record(record_id, before, after)
+    
+    def ensure_history(self):
+        """确保历史是最新的且已有基线（查询历史前调用）"""
+        self._recorder.history.sync()
+        self._recorder.ensure_baseline()
+
+
+def track_history(repository):
+    """
+    把数据仓库包装为记录项目历史的仓库
+    
+    Args:
+        repository: 数据仓库
+        
+    Returns:
+        TrackedRepository: 记录历史的数据仓库
+    """
+    return TrackedRepository(repository)
+
+
+def _chain(meta, index):
+    """
+    获取还原指定版本需要读取的版本：该版本之前最近的检查点及其后的增量
+    （检查点间隔保证增量不超过 HISTORY_CHECKPOINT_INTERVAL-1 个）
+    
+    Args:
+        meta: 项目的版本元数据
+        index: 版本在meta中的下标
+        
+    Returns:
+        list: 读取键列表（从检查点到该版本）
+    """
+    start = index
+    while not meta[start][3]:
+        start -= 1
+    return [item[4] for item in meta[start:index + 1]]
+
+
+def truncation(history, cutoff):
+    """
+    计算截断早于cutoff的版本后保留的版本：每个项目在cutoff时刻的状态保存为
+    基线检查点（保留原版本号，时间戳为cutoff），之后的版本原样保留；cutoff时
+    已删除的项目只保留之后的版本
+    
+    Args:
+        history: 历史存储
+        cutoff: 毫秒时间戳
+        
+    Returns:
+        list: 保留的版本，没有早于cutoff的版本时返回None
+    """
+    first_ts = history.first_ts()
+    if first_ts is None or first_ts >= cutoff:
+        return None
+    
+    chains = []
+    later = []
+    for record_id in history.record_ids():
+        meta = history.meta(record_id)
+        index = bisect.bisect_right([item[1] for item in meta], cutoff) - 1
+        if index >= 0 and meta[index][2] != 'delete':
+            chains.append(_chain(meta, index))
+        later.append([item[4] for item in meta[index + 1:]])
+    
+    entries = history.read([key for chain in chains for key in chain])
+    kept = []
+    position = 0
+    for chain in chains:
+        record = {}
+        for entry in entries[position:position + len(chain)]:
+            record = apply_delta(record, entry)
+        position += len(chain)
+        last = entries[position - 1]
+        kept.append({'id': last['id'], 'v': last['v'], 'ts': cutoff, 'op': 'baseline', 'record': record})
+    kept.extend(history.read([key for keys in later for key in keys]))
+    return kept
+
+
+def truncate_history(days):
+    """
+    截断早于指定天数之前的历史版本
+    
+    Args:
+        days: 保留天数
+        
+    Returns:
+        dict: cutoff（截断时间点，毫秒时间戳）和removed（删除的版本数量）
+    """
+    from utils.repository import get_repository
+    
+    repository = get_repository()
+    repository.ensure_history()
+    cutoff = _now_ms() - days * 86400 * 1000
+    return {'cutoff': cutoff, 'removed': repository.history_store().truncate(cutoff)}
+
+
+def run_truncation():
+    """
+    按配置截断历史（应用启动时调用，ROADMAP_HISTORY_RETENTION_DAYS为0时不执行）
+    """
+    if config.HISTORY_RETENTION_DAYS <= 0:
+        return
+    try:
+        result = truncate_history(config.HISTORY_RETENTION_DAYS)
+    except Exception as e:
+        print(f"历史截断失败: {str(e)}")
+        return
+    if result['removed']:
+        start = datetime.fromtimestamp(result['cutoff'] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"已把 {start} 之前的 {result['removed']} 个历史版本合并为检查点")
+
+
+def export_history(history):
+    """
+    读取历史存储中的全部版本（在后端之间迁移历史时使用）
+    
+    Args:
+        history: 历史存储
+        
+    Returns:
+        list: 历史版本列表（按项目分组，组内按版本号升序）
+    """
+    history.sync()
+    return history.read([item[4] for record_id in history.record_ids() for item in history.meta(record_id)])
+
+
+def projects_as_of(timestamp):
+    """
+    还原指定时间点的全部项目（包括当时存在、现在已归档或删除的项目）
+    
+    Args:
+        timestamp: 毫秒时间戳
+        
+    Returns:
+        list: 项目列表
+        
+    Raises:
+        ValueError: 时间点早于历史开始的时间
+    """
+    from utils.repository import get_repository
+    
+    repository = get_repository()
+    repository.ensure_history()
+    history = repository.history_store()
+    first_ts = history.first_ts()
+    if first_ts is None:
+        return []
+    if timestamp < first_ts:
+        start = datetime.fromtimestamp(first_ts / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        raise ValueError(f"历史记录开始于 {start}，无法查询更早的时间点")
+    
+    chains = []
+    for record_id in history.record_ids():
+        meta = history.meta(record_id)
+        index = bisect.bisect_right([item[1] for item in meta], timestamp) - 1
+        if index < 0 or meta[index][2] == 'delete':
+            continue
+        chains.append(_chain(meta, index))
+    
+    entries = history.read([key for chain in chains for key in chain])
+    projects = []
+    position = 0
+    for chain in chains:
+        record = {}
+        for entry in entries[position:position + len(chain)]:
+            record = apply_delta(record, entry)
+        position += len(chain)
+        projects.append(record)
+    return projects
+
+
+def project_history(record_id):
+    """
+    获取项目的全部历史版本（按版本号升序）
+    
+    Args:
+        record_id: 项目ID
+        
+    Returns:
+        list: 每个版本的version、timestamp、op和changes（{字段: {'from': 旧值, 'to': 新值}}），
+              项目没有历史时为空列表
+    """
+    from utils.repository import get_repository
+    
+    repository = get_repository()
+    repository.ensure_history()
+    history = repository.history_store()
+    meta = history.meta(record_id)
+    versions = []
+    record = None
+    for entry in history.read([item[4] for item in meta]):
+        after = None if entry['op'] == 'delete' else apply_delta(record or {}, entry)
+        before = record or {}
+        changes = {
+            key: {'from': before.get(key), 'to': (after or {}).get(key)}
+            for key in sorted(set(before) | set(after or {}))
+            if before.get(key) != (after or {}).get(key)
+        }
+        versions.append({
+            'version': entry['v'],
+            'timestamp': entry['ts'],
+            'op': entry['op'],
+            'changes': changes
+        })
+        record = after
+    return versions
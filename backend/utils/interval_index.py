@@ -0,0 +1,263 @@
+"""
+项目日期区间索引模块
+以中心区间树（centered interval tree）索引项目的 [startDate, endDate]，
+查询与日期范围重叠、或在某一天进行中的项目只需 O(log n + k)
+
+- 每个节点有一个中心日期：包含中心日期的区间保存在节点上（分别按开始日期
+  和结束日期排序），完全在中心之前的区间在左子树，完全在中心之后的在右子树
+- 查询时在每个节点上只扫描确实重叠的区间，并且只进入可能重叠的子树
+- 索引不可变，修改时复制从根到目标节点的路径，返回新的索引，未修改的子树在
+  新旧索引间共享（数据集的每个版本各自持有一个索引，见 utils/dataset.py）；
+  增量修改使树的深度超过上限时返回None，由调用方重新构建
+
+日期为YYYY-MM-DD字符串，可直接比较。
+"""
+from bisect import bisect_left, bisect_right, insort
+
+# 深度上限 = 2 * log2(区间数量) + DEPTH_SLACK
+DEPTH_SLACK = 8
+
+# 查询范围缺省时使用的边界（早于/晚于任何YYYY-MM-DD日期）
+_MIN_DATE = ''
+_MAX_DATE = '\uffff'
+
+
+def _interval(record):
+    """
+    获取项目的区间
+    
+    Args:
+        record: 项目字典
+        
+    Returns:
+        tuple: (开始日期, 结束日期, 项目ID)，结束日期早于开始日期的无效数据按开始日期结束
+    """
+    start = record.get('startDate', '')
+    return start, max(start, record.get('endDate', '')), record['id']
+
+
+def _build(items):
+    """
+    从按开始日期排序的区间构建子树
+    
+    Args:
+        items: 区间列表 [(开始日期, 结束日期, ID), ...]，按开始日期升序
+        
+    Returns:
+        tuple: 节点 (中心日期, [(开始日期, ID)], [(结束日期, ID)], 左子树, 右子树)，
+               没有区间时为None
+    """
+    if not items:
+        return None
+    # 以开始日期的中位数为中心：之后开始的区间进入右子树，其余按是否在中心前结束划分
+    center = items[len(items) // 2][0]
+    split = bisect_right(items, (center, _MAX_DATE))
+    left = []
+    here = []
+    for item in items[:split]:
+        if item[1] < center:
+            left.append(item)
+        else:
+            here.append(item)
+    starts = sorted((start, record_id) for start, _, record_id in here)
+    ends = sorted((end, record_id) for _, end, record_id in here)
+    return center, starts, ends, _build(left), _build(items[split:])
+
+
+def _depth(node):
+    """
+    计算子树深度
+    
+    Args:
+        node: 节点
+        
+    Returns:
+        int: 深度（空树为0）
+    """
+    if node is None:
+        return 0
+    return 1 + max(_depth(node[3]), _depth(node[4]))
+
+
+def _insert(node, item, depth):
+    """
+    插入区间，复制经过的路径
+    
+    Args:
+        node: 子树根节点
+        item: 区间 (开始日期, 结束日期, ID)
+        depth: 当前节点的深度
+        
+    Returns:
+        tuple: (新的子树根节点, 区间所在节点的深度)
+    """
+    start, end, record_id = item
+    if node is None:
+        return (start, [(start, record_id)], [(end, record_id)], None, None), depth
+    center, starts, ends, left, right = node
+    if end < center:
+        left, placed = _insert(left, item, depth + 1)
+        return (center, starts, ends, left, right), placed
+    if start > center:
+        right, placed = _insert(right, item, depth + 1)
+        return (center, starts, ends, left, right), placed
+    starts = list(starts)
+    insort(starts, (start, record_id))
+    ends = list(ends)
+    insort(ends, (end, record_id))
+    return (center, starts, ends, left, right), depth
+
+
+def _remove(node, item):
+    """
+    删除区间，复制经过的路径
+    
+    Args:
+        node: 子树根节点
+        item: 区间 (开始日期, 结束日期, ID)
+        
+    Returns:
+        tuple: 新的子树根节点，区间不存在时返回原节点
+    """
+    if node is None:
+        return None
+    start, end, record_id = item
+    center, starts, ends, left, right = node
+    if end < center:
+        new_left = _remove(left, item)
+        return node if new_left is left else (center, starts, ends, new_left, right)
+    if start > center:
+        new_right = _remove(right, item)
+        return node if new_right is right else (center, starts, ends, left, new_right)
+    i = bisect_left(starts, (start, record_id))
+    j = bisect_left(ends, (end, record_id))
+    if i == len(starts) or starts[i] != (start, record_id) or j == len(ends) or ends[j] != (end, record_id):
+        return node
+    starts = starts[:i] + starts[i + 1:]
+    ends = ends[:j] + ends[j + 1:]
+    if not starts and left is None and right is None:
+        return None
+    return center, starts, ends, left, right
+
+
+class IntervalIndex:
+    """
+    项目日期区间索引（不可变）
+    
+    Attributes:
+        size: 索引中的区间数量
+        depth: 树的深度
+    """
+    
+    __slots__ = ('size', 'depth', '_root')
+    
+    def __init__(self, root, size, depth):
+        self._root = root
+        self.size = size
+        self.depth = depth
+    
+    @classmethod
+    def build(cls, records):
+        """
+        从项目列表构建索引
+        
+        Args:
+            records: 项目字典列表
+            
+        Returns:
+            IntervalIndex: 区间索引
+        """
+        items = sorted(map(_interval, records))
+        root = _build(items)
+        return cls(root, len(items), _depth(root))
+    
+    def _max_depth(self, size):
+        """
+        获取允许的最大深度
+        
+        Args:
+            size: 区间数量
+            
+        Returns:
+            int: 最大深度
+        """
+        return 2 * size.bit_length() + DEPTH_SLACK
+    
+    def with_changes(self, removed, added):
+        """
+        返回应用修改后的新索引（本索引不变）
+        
+        Args:
+            removed: 删除或被修改前的项目字典列表
+            added: 新增或修改后的项目字典列表
+            
+        Returns:
+            IntervalIndex: 新索引，树的深度超过上限时返回None（需要重新构建）
+        """
+        root = self._root
+        size = self.size
+        depth = self.depth
+        for record in removed:
+            new_root = _remove(root, _interval(record))
+            if new_root is not root:
+                size -= 1
+            root = new_root
+        for record in added:
+            root, placed = _insert(root, _interval(record), 1)
+            size += 1
+            depth = max(depth, placed)
+        if depth > self._max_depth(size):
+            return None
+        return IntervalIndex(root, size, depth)
+    
+    def overlapping(self, date_from=None, date_to=None):
+        """
+        查询与日期范围重叠的项目（startDate <= date_to 且 endDate >= date_from）
+        
+        Args:
+            date_from: 范围开始日期（YYYY-MM-DD，可选）
+            date_to: 范围结束日期（YYYY-MM-DD，可选）
+            
+        Returns:
+            list: 项目ID列表（无序）
+        """
+        date_from = date_from or _MIN_DATE
+        date_to = date_to or _MAX_DATE
+        result = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, starts, ends, left, right = node
+            if date_to < center:
+                # 节点上的区间都在中心之后结束，在范围结束前开始即重叠
+                for start, record_id in starts:
+                    if start > date_to:
+                        break
+                    result.append(record_id)
+                stack.append(left)
+            elif date_from > center:
+                # 节点上的区间都在中心之前开始，在范围开始后结束即重叠
+                for k in range(len(ends) - 1, -1, -1):
+                    if ends[k][0] < date_from:
+                        break
+                    result.append(ends[k][1])
+                stack.append(right)
+            else:
+                result.extend(record_id for _, record_id in starts)
+                stack.append(left)
+                stack.append(right)
+        return result
+    
+    def active_on(self, day):
+        """
+        查询在某一天进行中的项目（startDate <= day <= endDate）
+        
+        Args:
+            day: 日期（YYYY-MM-DD）
+            
+        Returns:
+            list: 项目ID列表（无序）
+        """
+        return self.overlapping(day, day)
@@ -0,0 +1,524 @@
+"""
+追加日志（预写日志）工具模块
+为记录集合提供"快照文件 + 追加日志"的持久化方式
+
+每次增删改只向日志文件追加一行JSON并fsync，不再重写整个快照文件，
+单条写入的I/O开销与数据总量无关。内存中的状态由最近一次快照加上日志
+回放得到；日志超过阈值后在后台线程中压缩（写入新快照并清空日志）。
+
+日志行格式：
+    {"op": "create|update|delete", "id": "记录ID", "record": {...}, "h": {...}}
+
+create/update 行保存完整记录，delete 行只有ID，因此回放是幂等的：
+压缩中途崩溃时重复回放旧日志也不会产生错误结果。
+
+集合关联了历史存储（见 utils/history.py）时，修改的历史版本写在同一行的
+h 字段中，与修改一起追加、一起fsync；回放时交给历史存储索引，压缩日志时
+先批量写入历史文件，再删除旧日志。
+
+每次追加默认立即fsync；日志所属快照文件配置为延迟写入（见 utils/write_behind.py）
+时，追加后不等待fsync，由后台刷盘线程统一同步。
+
+追加和轮换日志持排他文件锁，读取持共享锁，多个worker进程可共用同一份
+日志：每次访问先检查日志长度，只回放其他进程新追加的部分。同一进程内
+多个读取方可以同时持有共享锁，回放日志更新内存状态时另用一把进程内互斥锁。
+"""
+import json
+import os
+import shutil
+import threading
+
+from utils import generation
+from utils.file_handler import read_json_file, staged_write
+from utils.file_lock import get_lock
+from utils.write_behind import get_durability, mark_dirty
+
+# 日志超过该字节数后触发后台压缩
+COMPACT_THRESHOLD_BYTES = 1024 * 1024
+
+# 集合注册表，同一快照文件在进程内只加载一份
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_collection(snapshot_file, key):
+    """
+    获取指定快照文件对应的日志集合（进程内单例）
+    
+    Args:
+        snapshot_file: 快照JSON文件路径（如data/projects.json）
+        key: 快照中记录列表所在的键（如'projects'）
+        
+    Returns:
+        JournaledCollection: 日志集合对象
+    """
+    with _collections_lock:
+        if snapshot_file not in _collections:
+            _collections[snapshot_file] = JournaledCollection(snapshot_file, key)
+        return _collections[snapshot_file]
+
+
+def _stat_key(path):
+    """
+    获取文件的身份和长度
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        tuple: (inode, size)，文件不存在时返回None
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size)
+
+
+def history_entries(path):
+    """
+    读取日志文件中附带的历史版本
+    
+    Args:
+        path: 日志文件路径
+        
+    Returns:
+        list: 历史版本列表（按追加顺序）
+    """
+    entries = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            entry = json.loads(line)
+            if 'h' in entry:
+                entries.append(entry['h'])
+    return entries
+
+
+class JournaledCollection:
+    """
+    快照 + 追加日志的记录集合
+    
+    Attributes:
+        snapshot_file: 快照文件路径
+        journal_file: 当前日志文件路径
+        compacting_file: 压缩期间被轮换出去的旧日志路径
+        key: 快照中记录列表所在的键
+        history: 关联的历史存储（FileHistoryStore，可选）
+    """
+    
+    def __init__(self, snapshot_file, key):
+        """
+        初始化集合（数据在首次访问时加载）
+        
+        Args:
+            snapshot_file: 快照文件路径
+            key: 快照中记录列表所在的键
+        """
+        base = os.path.splitext(snapshot_file)[0]
+        self.snapshot_file = snapshot_file
+        self.journal_file = base + '.journal'
+        self.compacting_file = base + '.journal.compacting'
+        self.key = key
+        self.history = None
+        
+        # 进程内 + 跨进程锁（旁路锁文件 projects.journal.lock）
+        self._lock = get_lock(self.journal_file)
+        # 持共享锁的读取方之间互斥地刷新内存状态
+        self._state_lock = threading.Lock()
+        self._records = None  # {id: record}，按插入顺序
+        self._values = None   # 记录列表缓存，写入后失效
+        self._extra = {}      # 快照中除记录列表外的其他字段
+        self._journal_fd = None
+        self._journal_fd_inode = None
+        self._journal_state = None  # 已回放到的日志 (inode, size)
+        self._snapshot_state = None
+        self._compactor = None
+    
+    def _load(self):
+        """
+        从快照和日志重建内存状态（调用方需持有self._lock）
+        
+        Raises:
+            FileNotFoundError: 快照和日志都不存在
+        """
+        snapshot_state = _stat_key(self.snapshot_file)
+        records = {}
+        extra = {}
+        
+        if snapshot_state is not None:
+            data = read_json_file(self.snapshot_file, copy=False)
+            extra = {k: v for k, v in data.items() if k != self.key}
+            for record in data.get(self.key, []):
+                records[record['id']] = record
+        elif not os.path.exists(self.journal_file):
+            raise FileNotFoundError(f"文件不存在: {self.snapshot_file}")
+        
+        # 先回放压缩未完成时遗留的旧日志，再回放当前日志
+        if os.path.exists(self.compacting_file):
+            self._replay(self.compacting_file, records, 0)
+        offset = self._replay(self.journal_file, records, 0)
+        
+        self._records = records
+        self._values = None
+        self._extra = extra
+        self._snapshot_state = snapshot_state
+        journal_state = _stat_key(self.journal_file)
+        self._journal_state = (journal_state[0], offset) if journal_state else None
+    
+    def _replay(self, path, records, offset):
+        """
+        从指定偏移量开始回放日志文件
+        
+        末尾不完整的行（追加过程中崩溃）会被忽略并截断。
+        
+        Args:
+            path: 日志文件路径
+            records: 要应用日志的记录字典
+            offset: 开始回放的字节偏移量
+            
+        Returns:
+            int: 已成功回放到的字节偏移量
+        """
+        if not os.path.exists(path):
+            return 0
+        
+        good_offset = offset
+        history = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(records, entry)
+                if 'h' in entry:
+                    history.append(entry['h'])
+                good_offset += len(line)
+            truncated = f.seek(0, os.SEEK_END) != good_offset
+        
+        if truncated:
+            print(f"日志文件 {path} 末尾存在不完整记录，已截断到 {good_offset} 字节")
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+        if history and self.history is not None:
+            self.history.observe(history)
+        return good_offset
+    
+    @staticmethod
+    def _apply(records, entry):
+        """
+        将一条日志应用到记录字典
+        
+        Args:
+            records: 记录字典
+            entry: 日志条目
+        """
+        if entry['op'] == 'delete':
+            records.pop(entry['id'], None)
+        else:
+            records[entry['id']] = entry['record']
+    
+    def _refresh(self):
+        """
+        确保内存状态与磁盘一致（调用方需持有self._lock的排他锁，
+        或共享锁加self._state_lock）
+        
+        快照被外部替换或日志被轮换时完整重载；日志被其他进程追加时只回放新增部分。
+        """
+        if self._records is None:
+            self._load()
+            return
+        
+        if _stat_key(self.snapshot_file) != self._snapshot_state and self._compactor is None:
+            self._load()
+            return
+        
+        journal_state = _stat_key(self.journal_file)
+        if journal_state == self._journal_state:
+            return
+        if (journal_state is None or self._journal_state is None
+                or journal_state[0] != self._journal_state[0]
+                or journal_state[1] < self._journal_state[1]):
+            self._load()
+            return
+        
+        offset = self._replay(self.journal_file, self._records, self._journal_state[1])
+        self._journal_state = (journal_state[0], offset)
+        self._values = None
+    
+    def values(self):
+        """
+        获取全部记录
+        返回的列表和记录都是只读的，调用方不得修改
+        
+        Returns:
+            list: 记录列表（按创建顺序）
+        """
+        with self._lock.shared(), self._state_lock:
+            self._refresh()
+            if self._values is None:
+                self._values = list(self._records.values())
+            return self._values
+    
+    def get(self, record_id):
+        """
+        根据ID获取记录
+        
+        Args:
+            record_id: 记录ID
+            
+        Returns:
+            dict: 记录（只读），不存在返回None
+        """
+        with self._lock.shared(), self._state_lock:
+            self._refresh()
+            return self._records.get(record_id)
+    
+    def source_files(self):
+        """
+        获取集合持久化所用的文件（用于检测数据变化）
+        
+        Returns:
+            list: 快照、日志和压缩中旧日志的路径
+        """
+        return [self.snapshot_file, self.journal_file, self.compacting_file]
+    
+    def count_by(self, field, value):
+        """
+        统计指定字段等于指定值的记录数量
+        
+        Args:
+            field: 字段名
+            value: 字段值
+            
+        Returns:
+            int: 记录数量
+        """
+        return sum(1 for record in self.values() if record.get(field) == value)
+    
+    def _append(self, entry):
+        """
+        追加一条日志并应用到内存状态（调用方需持有self._lock）
+        
+        Args:
+            entry: 日志条目
+        """
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        
+        # 日志可能已被其他进程轮换，此时需要重新打开
+        journal_state = _stat_key(self.journal_file)
+        if journal_state is None or journal_state[0] != self._journal_fd_inode:
+            self._open_journal()
+        os.write(self._journal_fd, line)
+        generation.bump(self.journal_file)
+        mode = get_durability(self.snapshot_file)
+        if mode == 'sync':
+            os.fsync(self._journal_fd)
+        else:
+            mark_dirty(self.journal_file, self._sync_journal, mode)
+        
+        self._apply(self._records, entry)
+        if 'h' in entry and self.history is not None:
+            self.history.observe([entry['h']])
+        self._values = None
+        self._journal_state = (self._journal_state[0], self._journal_state[1] + len(line))
+        
+        if self._journal_state[1] >= COMPACT_THRESHOLD_BYTES and self._compactor is None:
+            self._start_compaction()
+    
+    def _sync_journal(self):
+        """
+        由后台刷盘线程调用：同步延迟写入的日志
+        """
+        with self._lock.exclusive():
+            if self._journal_fd is not None:
+                os.fsync(self._journal_fd)
+    
+    def _open_journal(self):
+        """
+        打开（必要时创建）当前日志文件用于追加（调用方需持有self._lock）
+        """
+        if self._journal_fd is not None:
+            # 延迟写入模式下旧日志可能尚未同步
+            os.fsync(self._journal_fd)
+            os.close(self._journal_fd)
+        os.makedirs(os.path.dirname(self.journal_file) or '.', exist_ok=True)
+        self._journal_fd = os.open(self.journal_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        st = os.fstat(self._journal_fd)
+        self._journal_fd_inode = st.st_ino
+        if self._journal_state is None or self._journal_state[0] != st.st_ino:
+            self._journal_state = (st.st_ino, st.st_size)
+    
+    def _entry(self, op, record_id, current, record, history):
+        """
+        构造日志条目，提供历史回调时附带历史版本（调用方需持有self._lock）
+        
+        Args:
+            op: 日志操作类型
+            record_id: 记录ID
+            current: 修改前的记录（不存在为None）
+            record: 修改后的记录（删除为None）
+            history: 历史回调 (记录ID, 修改前, 修改后) -> 历史版本或None（可选）
+            
+        Returns:
+            dict: 日志条目
+        """
+        entry = {'op': op, 'id': record_id}
+        if record is not None:
+            entry['record'] = record
+        version = history(record_id, current, record) if history else None
+        if version is not None:
+            entry['h'] = version
+        return entry
+    
+    def put(self, record, op='update', history=None):
+        """
+        写入（新增或替换）一条记录
+        
+        Args:
+            record: 完整记录字典，必须包含id
+            op: 日志操作类型（create或update）
+            history: 历史回调（可选，见 _entry）
+        """
+        with self._lock.exclusive():
+            try:
+                self._refresh()
+            except FileNotFoundError:
+                # 首次写入时快照和日志都不存在，从空集合开始
+                self._records = {}
+                self._values = None
+            current = self._records.get(record['id'])
+            self._append(self._entry(op, record['id'], current, record, history))
+    
+    def modify(self, record_id, fn, history=None):
+        """
+        在同一次排他锁内读取、修改并写回一条记录，数据没有变化时不追加日志
+        
+        Args:
+            record_id: 记录ID
+            fn: 修改函数，接收当前记录的副本，返回修改后的完整记录字典
+            history: 历史回调（可选，见 _entry）
+            
+        Returns:
+            dict: 修改后的记录，记录不存在返回None
+        """
+        with self._lock.exclusive():
+            self._refresh()
+            current = self._records.get(record_id)
+            if current is None:
+                return None
+            record = fn(dict(current))
+            if record != current:
+                self._append(self._entry('update', record_id, current, record, history))
+            return record
+    
+    def remove(self, record_id, history=None):
+        """
+        删除一条记录
+        
+        Args:
+            record_id: 记录ID
+            history: 历史回调（可选，见 _entry）
+            
+        Returns:
+            bool: 删除成功返回True，记录不存在返回False
+        """
+        with self._lock.exclusive():
+            self._refresh()
+            current = self._records.get(record_id)
+            if current is None:
+                return False
+            self._append(self._entry('delete', record_id, current, None, history))
+            return True
+    
+    def _start_compaction(self):
+        """
+        轮换当前日志并启动后台压缩线程（调用方需持有self._lock）
+        """
+        if os.path.exists(self.compacting_file):
+            # 上一次压缩未完成，把当前日志并入旧日志，直到新快照写入成功才删除
+            with open(self.compacting_file, 'ab') as dst, open(self.journal_file, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, self.compacting_file)
+        rotated = _stat_key(self.compacting_file)
+        self._open_journal()
+        generation.bump(self.journal_file)
+        
+        snapshot = dict(self._extra)
+        snapshot[self.key] = list(self._records.values())
+        
+        self._compactor = threading.Thread(
+            target=self._compact,
+            args=(snapshot, rotated),
+            name=f'journal-compactor-{os.path.basename(self.snapshot_file)}',
+            daemon=True
+        )
+        self._compactor.start()
+    
+    def _compact(self, snapshot, rotated):
+        """
+        后台线程：写入新快照并删除已轮换的旧日志
+        
+        快照文件即使配置为延迟写入，这里也同步写入并fsync：旧日志删除后，
+        其中的记录只存在于新快照中。
+        
+        旧日志中的历史版本先批量写入历史文件（一次fsync），再提交新快照。
+        
+        新快照在日志锁内提交：压缩期间其他进程可能把它的日志并入了旧日志
+        （见 _start_compaction），此时旧日志与轮换时不同，新快照不包含并入的
+        记录，放弃本次提交并保留旧日志，下次访问时重新加载回放。
+        
+        Args:
+            snapshot: 轮换时刻的完整快照数据
+            rotated: 轮换后旧日志的 (inode, size)
+        """
+        try:
+            history = history_entries(self.compacting_file)
+            if history:
+                if self.history is None:
+                    raise RuntimeError("旧日志中有历史版本，但集合未关联历史存储")
+                self.history.persist(history)
+            with staged_write(self.snapshot_file, snapshot) as commit:
+                with self._lock.exclusive():
+                    if _stat_key(self.compacting_file) != rotated:
+                        print(f"日志压缩期间旧日志被其他进程修改，放弃本次压缩: {self.compacting_file}")
+                        self._records = None
+                        return
+                    commit()
+                    os.remove(self.compacting_file)
+        except Exception as e:
+            # 保留旧日志，下次加载时会重新回放
+            print(f"日志压缩失败: {str(e)}")
+        finally:
+            with self._lock.exclusive():
+                self._snapshot_state = _stat_key(self.snapshot_file)
+                self._compactor = None
+    
+    def compact(self):
+        """
+        立即压缩日志并等待完成（用于数据迁移、停机前等场景）
+        """
+        with self._lock.exclusive():
+            compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        
+        with self._lock.exclusive():
+            self._refresh()
+            journal_empty = self._journal_state is None or self._journal_state[1] == 0
+            if journal_empty and not os.path.exists(self.compacting_file):
+                return
+            if self._journal_fd is None:
+                self._open_journal()
+            self._start_compaction()
+            compactor = self._compactor
+        compactor.join()
@@ -0,0 +1,564 @@
+"""
+数据维护命令行工具
+在backend目录下执行（建议在服务停止时运行）：
+    python -m utils.maintenance verify                 校验全部数据
+    python -m utils.maintenance compact [--format F]   压缩日志并重写数据文件
+    python -m utils.maintenance reindex                重建派生索引
+    python -m utils.maintenance stats                  统计数据集
+
+- verify：用模型的验证逻辑（Project、Owner、ProductLine、Settings）逐条校验
+  热数据、归档分区和文档，并检查引用完整性（项目的产品线、负责人必须存在，
+  设置中的可见产品线应当存在）和项目ID重复；发现错误时退出码为1
+- compact：按 ROADMAP_HISTORY_RETENTION_DAYS 截断变更历史，把项目追加日志压缩
+  回快照，按 --format（默认 ROADMAP_SNAPSHOT_FORMAT，可选 json、compact、
+  compact-gzip）重写项目、文档和归档分区文件；SQLite后端执行WAL检查点和
+  VACUUM，内存后端重写快照目录
+- reindex：SQLite后端重建索引并更新查询规划统计（REINDEX、ANALYZE），
+  重新解析变更历史并校验其版本索引
+- stats：项目（按状态、产品线、负责人、归档年份）、人员、产品线、变更历史的
+  数量和数据文件大小
+
+项目逐条流式处理，终端中显示处理进度，10万以上项目的数据集同样只需数秒。
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+if __name__ == '__main__':
+    # 作为脚本运行时添加项目根目录到Python路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from models.owner import Owner
+from models.productline import ProductLine
+from models.project import Project
+from models.settings import Settings
+from utils.file_handler import get_data_file_path
+from utils.history import HISTORY_FILE, FileHistoryStore, truncate_history
+from utils.journal import history_entries
+from utils.repository import get_repository
+from utils.snapshot_format import FORMATS, convert_file
+
+# 每类问题最多输出的条数
+MAX_REPORTED = 20
+
+# 进度刷新间隔（秒）
+PROGRESS_INTERVAL = 0.2
+
+
+class _Progress:
+    """
+    终端进度显示（输出到stderr，不是终端时不显示）
+    
+    Attributes:
+        label: 当前阶段名称
+        total: 当前阶段的总数
+        done: 已处理数量
+    """
+    
+    def __init__(self, stream=None):
+        """
+        Args:
+            stream: 输出流（可选，默认sys.stderr）
+        """
+        self.stream = stream or sys.stderr
+        self.enabled = self.stream.isatty()
+        self.label = ''
+        self.total = 0
+        self.done = 0
+        self._shown = 0.0
+    
+    def start(self, label, total):
+        """
+        开始新的阶段
+        
+        Args:
+            label: 阶段名称
+            total: 总数
+        """
+        self.label = label
+        self.total = total
+        self.done = 0
+        self._show()
+    
+    def step(self, count=1):
+        """
+        记录处理进度（每1000条检查一次是否需要刷新显示）
+        
+        Args:
+            count: 本次处理的数量
+        """
+        before = self.done
+        self.done += count
+        if self.enabled and (self.done // 1000 != before // 1000 or self.done == self.total):
+            if self.done == self.total or time.monotonic() - self._shown >= PROGRESS_INTERVAL:
+                self._show()
+    
+    def _show(self):
+        """刷新进度行"""
+        if not self.enabled:
+            return
+        self._shown = time.monotonic()
+        percent = self.done * 100 // self.total if self.total else 100
+        self.stream.write(f"\r{self.label}: {self.done}/{self.total} ({percent}%)\033[K")
+        self.stream.flush()
+    
+    def finish(self):
+        """清除进度行"""
+        if self.enabled:
+            self.stream.write('\r\033[K')
+            self.stream.flush()
+
+
+def _read_items(repository, name):
+    """
+    读取文档中的记录列表
+    
+    Args:
+        repository: 数据仓库
+        name: 文档名（owners或productlines）
+        
+    Returns:
+        list: 记录列表，文档不存在时为None
+    """
+    try:
+        return repository.read_document(name).get(name, [])
+    except FileNotFoundError:
+        return None
+
+
+def _project_sources(repository):
+    """
+    按顺序产出项目数据源（热数据和各年份归档分区）
+    
+    Args:
+        repository: 数据仓库
+        
+    Yields:
+        tuple: (数据源名称, 项目列表)
+    """
+    try:
+        yield '热数据', repository.project_store().values()
+    except FileNotFoundError:
+        yield '热数据', []
+    archive = repository.archive_store()
+    for year in archive.years():
+        yield f'归档{year}', archive.values(year)
+
+
+def _describe(record):
+    """
+    获取记录在报告中的标识
+    
+    Args:
+        record: 记录字典
+        
+    Returns:
+        str: 记录ID（没有ID时为记录名称）
+    """
+    if not isinstance(record, dict):
+        return repr(record)
+    return record.get('id') or f"名称={record.get('name')!r}"
+
+
+def _validation_error(model, record):
+    """
+    用模型的验证逻辑校验一条记录
+    
+    Args:
+        model: 模型类（Project、Owner或ProductLine）
+        record: 记录字典
+        
+    Returns:
+        str: 错误信息，校验通过返回None
+    """
+    if not isinstance(record, dict):
+        return '记录不是对象'
+    try:
+        # from_dict创建对象时会调用validate()
+        model.from_dict(record)
+    except KeyError as e:
+        return f"缺少字段: {e.args[0]}"
+    except (ValueError, TypeError) as e:
+        return str(e)
+    return None
+
+
+def verify(progress):
+    """
+    校验全部数据
+    
+    Args:
+        progress: 进度显示
+        
+    Returns:
+        tuple: (错误列表, 警告列表, 已校验的项目数量)
+    """
+    repository = get_repository()
+    errors = []
+    warnings = []
+    
+    ids = {}
+    for name, model in (('owners', Owner), ('productlines', ProductLine)):
+        items = _read_items(repository, name)
+        ids[name] = set()
+        if items is None:
+            errors.append(f"{name}: 数据不存在")
+            continue
+        for item in items:
+            error = _validation_error(model, item)
+            if error:
+                errors.append(f"{name} {_describe(item)}: {error}")
+            if isinstance(item, dict) and item.get('id'):
+                if item['id'] in ids[name]:
+                    errors.append(f"{name} {item['id']}: ID重复")
+                ids[name].add(item['id'])
+    owner_ids = ids['owners']
+    productline_ids = ids['productlines']
+    
+    try:
+        settings = Settings.from_dict(repository.read_document('settings'))
+        settings.validate()
+        for pl_id in settings.visibleProductLines:
+            if pl_id not in productline_ids:
+                warnings.append(f"settings: 可见产品线不存在: {pl_id}")
+    except FileNotFoundError:
+        pass
+    except (ValueError, TypeError, AttributeError) as e:
+        errors.append(f"settings: {e}")
+    
+    seen = {}
+    checked = 0
+    for source, records in _project_sources(repository):
+        progress.start(f"校验项目（{source}）", len(records))
+        for record in records:
+            error = _validation_error(Project, record)
+            if error:
+                errors.append(f"{source} {_describe(record)}: {error}")
+            if isinstance(record, dict):
+                record_id = record.get('id')
+                if record_id in seen:
+                    message = f"{source} {record_id}: ID与{seen[record_id]}中的项目重复"
+                    if seen[record_id] == '热数据':
+                        # 归档中断时项目可能同时存在于热数据和归档中（读取时以热数据为准）
+                        warnings.append(message)
+                    else:
+                        errors.append(message)
+                elif record_id:
+                    seen[record_id] = source
+                if record.get('productLineId') not in productline_ids:
+                    errors.append(f"{source} {_describe(record)}: 产品线不存在: {record.get('productLineId')}")
+                if record.get('ownerId') not in owner_ids:
+                    errors.append(f"{source} {_describe(record)}: 负责人不存在: {record.get('ownerId')}")
+            checked += 1
+            progress.step()
+    progress.finish()
+    return errors, warnings, checked
+
+
+def _file_size(path):
+    """
+    获取文件大小
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        int: 字节数，文件不存在时为0
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _snapshot_files(repository, store):
+    """
+    获取需要重写的JSON数据文件（项目快照、文档和归档分区）
+    
+    Args:
+        repository: 数据仓库
+        store: 项目存储
+        
+    Returns:
+        list: 文件路径
+    """
+    if config.STORAGE_BACKEND == 'memory':
+        directory = repository.snapshot_dir
+        files = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+    else:
+        files = [
+            path for path in store.source_files()
+            if path.endswith('.json') and os.path.basename(path).startswith(('projects', 'shard-'))
+        ]
+        files += [repository.document_file(name) for name in ('owners', 'productlines', 'settings')]
+    archive = repository.archive_store()
+    files += [os.path.join(archive.directory, f'projects-{year}.json') for year in archive.years()]
+    return [path for path in files if path.endswith('.json') and os.path.exists(path)]
+
+
+def compact(fmt, progress):
+    """
+    压缩日志并重写数据文件
+    
+    Args:
+        fmt: 目标格式（json、compact或compact-gzip）
+        progress: 进度显示
+        
+    Returns:
+        list: [(文件路径, 重写前字节数, 重写后字节数), ...]
+    """
+    repository = get_repository()
+    store = repository.project_store()
+    results = []
+    
+    history_file = get_data_file_path(HISTORY_FILE)
+    history_before = _file_size(history_file)
+    if config.HISTORY_RETENTION_DAYS > 0:
+        truncate_history(config.HISTORY_RETENTION_DAYS)
+    
+    if config.STORAGE_BACKEND == 'sqlite':
+        from utils.sqlite_store import get_connection, get_db_path
+        
+        db_path = get_db_path()
+        before = _file_size(db_path) + _file_size(db_path + '-wal')
+        conn = get_connection()
+        conn.execute('VACUUM')
+        # WAL模式下VACUUM的结果写在WAL中，检查点后才写回数据库文件
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        results.append((db_path, before, _file_size(db_path) + _file_size(db_path + '-wal')))
+        return results
+    
+    journals = [path for path in store.source_files() if path.endswith('.journal')]
+    before = sum(_file_size(path) for path in journals)
+    store.compact()
+    if config.STORAGE_BACKEND == 'memory':
+        repository.snapshot()
+    else:
+        if before:
+            results.append(('项目追加日志', before, sum(_file_size(path) for path in journals)))
+        results.append((history_file, history_before, _file_size(history_file)))
+    
+    files = _snapshot_files(repository, store)
+    progress.start('重写数据文件', len(files))
+    for path in files:
+        results.append((path,) + convert_file(path, fmt))
+        progress.step()
+    progress.finish()
+    return results
+
+
+def reindex(progress):
+    """
+    重建派生索引
+    
+    Args:
+        progress: 进度显示
+        
+    Returns:
+        list: 已完成的操作说明
+    """
+    repository = get_repository()
+    done = []
+    
+    if config.STORAGE_BACKEND == 'sqlite':
+        from utils.sqlite_store import get_connection
+        
+        conn = get_connection()
+        conn.execute('REINDEX')
+        conn.execute('ANALYZE')
+        done.append('SQLite: 已重建全部索引并更新统计信息（REINDEX、ANALYZE）')
+    
+    if config.STORAGE_BACKEND != 'json':
+        history = repository.history_store()
+    else:
+        # 新建历史存储对象，从头解析历史文件和项目追加日志中的版本并建立索引
+        history = FileHistoryStore(get_data_file_path(HISTORY_FILE))
+        for path in repository.project_store().source_files():
+            if path.endswith(('.journal', '.journal.compacting')) and os.path.exists(path):
+                history.observe(history_entries(path))
+    record_ids = history.record_ids()
+    progress.start('校验历史版本索引', len(record_ids))
+    versions = 0
+    broken = []
+    for record_id in record_ids:
+        meta = history.meta(record_id)
+        versions += len(meta)
+        # 截断后的历史从截断时保存的检查点开始，版本号不一定从1开始
+        if [v for v, *_ in meta] != list(range(meta[0][0], meta[0][0] + len(meta))) or not meta[0][3]:
+            broken.append(record_id)
+        progress.step()
+    progress.finish()
+    done.append(f"变更历史: {len(record_ids)} 个项目、{versions} 个版本")
+    for record_id in broken[:MAX_REPORTED]:
+        done.append(f"  版本不连续或缺少起始完整记录: {record_id}")
+    return done
+
+
+def stats(progress):
+    """
+    统计数据集
+    
+    Args:
+        progress: 进度显示
+        
+    Returns:
+        dict: 统计结果
+    """
+    repository = get_repository()
+    owners = _read_items(repository, 'owners') or []
+    productlines = _read_items(repository, 'productlines') or []
+    
+    result = {
+        'projects': 0,
+        'archived': {},
+        'pending': 0,
+        'status': Counter(),
+        'productLine': Counter(),
+        'owner': Counter(),
+        'startDate': None,
+        'endDate': None,
+        'owners': len(owners),
+        'productlines': len(productlines),
+    }
+    names = {item.get('id'): item.get('name') for item in owners + productlines}
+    
+    for source, records in _project_sources(repository):
+        progress.start(f"统计项目（{source}）", len(records))
+        for record in records:
+            result['status'][record.get('status')] += 1
+            result['productLine'][names.get(record.get('productLineId'), record.get('productLineId'))] += 1
+            result['owner'][names.get(record.get('ownerId'), record.get('ownerId'))] += 1
+            if record.get('isPending'):
+                result['pending'] += 1
+            start, end = record.get('startDate'), record.get('endDate')
+            if start and (result['startDate'] is None or start < result['startDate']):
+                result['startDate'] = start
+            if end and (result['endDate'] is None or end > result['endDate']):
+                result['endDate'] = end
+            progress.step()
+        if source == '热数据':
+            result['projects'] = len(records)
+        else:
+            result['archived'][source[2:]] = len(records)
+    progress.finish()
+    
+    if config.STORAGE_BACKEND == 'sqlite':
+        from utils.sqlite_store import get_connection
+        
+        row = get_connection().execute(
+            'SELECT COUNT(DISTINCT record_id), COUNT(*) FROM project_history'
+        ).fetchone()
+        result['history'] = {'projects': row[0], 'versions': row[1]}
+    else:
+        history = repository.history_store()
+        history.sync()
+        record_ids = history.record_ids()
+        result['history'] = {
+            'projects': len(record_ids),
+            'versions': sum(len(history.meta(record_id)) for record_id in record_ids)
+        }
+    
+    data_dir = os.path.dirname(get_data_file_path('projects.json'))
+    total = 0
+    for root, _, files in os.walk(data_dir):
+        total += sum(_file_size(os.path.join(root, name)) for name in files)
+    result['diskBytes'] = total
+    return result
+
+
+def _print_report(title, items):
+    """
+    输出问题列表（每类最多MAX_REPORTED条）
+    
+    Args:
+        title: 标题
+        items: 问题列表
+    """
+    if not items:
+        return
+    print(f"{title}（{len(items)}）:")
+    for item in items[:MAX_REPORTED]:
+        print(f"  {item}")
+    if len(items) > MAX_REPORTED:
+        print(f"  ... 另有 {len(items) - MAX_REPORTED} 条")
+
+
+def _print_counter(title, counter, limit=None):
+    """
+    输出计数（按数量降序）
+    
+    Args:
+        title: 标题
+        counter: Counter对象
+        limit: 最多输出的条数（可选）
+    """
+    print(f"{title}:")
+    items = counter.most_common(limit)
+    for key, count in items:
+        print(f"  {key}: {count}")
+    if limit and len(counter) > limit:
+        print(f"  ... 另有 {len(counter) - limit} 项")
+
+
+def main(argv):
+    """
+    命令行入口
+    
+    Args:
+        argv: 命令行参数（不含程序名）
+        
+    Returns:
+        int: 退出码
+    """
+    command = argv[0] if argv else None
+    progress = _Progress()
+    started = time.perf_counter()
+    
+    if command == 'verify' and len(argv) == 1:
+        errors, warnings, checked = verify(progress)
+        _print_report('错误', errors)
+        _print_report('警告', warnings)
+        elapsed = time.perf_counter() - started
+        print(f"已校验 {checked} 个项目: {len(errors)} 个错误, {len(warnings)} 个警告（{elapsed:.1f}秒）")
+        return 1 if errors else 0
+    
+    if command == 'compact' and len(argv) in (1, 3) and argv[1:2] in ([], ['--format']):
+        fmt = argv[2] if len(argv) == 3 else config.SNAPSHOT_FORMAT
+        if fmt not in FORMATS:
+            print(f"不支持的格式: {fmt}（可选值: {', '.join(FORMATS)}）")
+            return 1
+        for path, before, after in compact(fmt, progress):
+            print(f"{path}: {before} -> {after} 字节")
+        print(f"压缩完成（{time.perf_counter() - started:.1f}秒）")
+        return 0
+    
+    if command == 'reindex' and len(argv) == 1:
+        for line in reindex(progress):
+            print(line)
+        print(f"重建完成（{time.perf_counter() - started:.1f}秒）")
+        return 0
+    
+    if command == 'stats' and len(argv) == 1:
+        result = stats(progress)
+        archived = sum(result['archived'].values())
+        print(f"项目: {result['projects']}（归档 {archived}，暂定 {result['pending']}）")
+        for year, count in sorted(result['archived'].items()):
+            print(f"  归档{year}: {count}")
+        print(f"日期范围: {result['startDate']} ~ {result['endDate']}")
+        print(f"人员: {result['owners']}，产品线: {result['productlines']}")
+        _print_counter('按状态', result['status'])
+        _print_counter('按产品线', result['productLine'])
+        _print_counter('按负责人（前10）', result['owner'], limit=10)
+        print(f"变更历史: {result['history']['projects']} 个项目、{result['history']['versions']} 个版本")
+        print(f"数据目录: {result['diskBytes'] / 1024:.1f} KB")
+        print(f"统计完成（{time.perf_counter() - started:.1f}秒）")
+        return 0
+    
+    print(__doc__)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
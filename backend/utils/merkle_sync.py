@@ -0,0 +1,459 @@
+"""
+数据集差异比较与同步模块
+用Merkle树比较两个实例（如本机与云主机）的项目、人员和产品线，只传输哈希和
+有差异的记录，代替整体拷贝JSON文件
+
+Merkle树结构（每个数据源一棵，见 utils/merkle_tree.py）：
+- 记录按ID的哈希组织成16叉树，节点下的记录不超过 LEAF_SIZE 条时为叶子桶，
+  保存 {记录ID: 记录哈希}，记录哈希基于按键排序的JSON；树的深度随数据量
+  自适应，一个有差异的叶子桶最多传输 LEAF_SIZE 条记录哈希
+- 比较时从根开始逐层只展开哈希不同的节点，请求轮数为树的深度（10万条记录
+  约五轮），传输的数据量取决于有差异的记录数，而不是数据集大小
+- 两端树的深度不同时（如一端在某处的记录远多于另一端），记录较少的一端
+  在叶子桶之下按前缀筛选记录继续比较
+
+同步规则：只在源端存在的记录新建到目标端；两端都存在但内容不同的记录以
+源端为准，目标端的updatedAt更新时保留目标端（记为冲突）；只在目标端存在的
+记录默认保留，指定 --delete 时删除。写入前用模型的验证逻辑校验记录，人员
+和产品线的名称与服务层一样不允许重复，仍有项目（包括归档项目）引用的人员
+和产品线与服务层一样不允许删除；同步多个数据源时，人员和产品线的删除在
+项目同步完成后进行。每棵树随数据集版本保存，一次写入只重新计算变化记录
+所在路径上的节点（见 utils/dataset.py）。
+
+命令行用法（在backend目录下执行，实例为 local 或 http://主机:端口）：
+    python utils/merkle_sync.py diff local http://cloud-host:5000
+    python utils/merkle_sync.py sync http://cloud-host:5000 local --dry-run
+    python utils/merkle_sync.py sync local http://cloud-host:5000 projects owners --delete
+"""
+import json
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+if __name__ == '__main__':
+    # 添加项目根目录到Python路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.merkle_tree import key_of
+
+# 参与比较的数据源，按同步顺序排列（项目引用产品线和人员，最后同步）
+PARTS = ('productlines', 'owners', 'projects')
+
+# 单次按ID拉取的最大记录数
+FETCH_BATCH = 100
+
+# 名称唯一的数据源及名称重复时的错误信息（与对应服务的校验一致）
+NAME_TAKEN = {
+    'owners': "人员姓名 '{name}' 已存在",
+    'productlines': "产品线名称已存在: {name}"
+}
+
+# 被项目引用的数据源：(项目中的引用字段, 仍有关联项目时的错误信息)（与对应服务的校验一致）
+REFERENCED_BY = {
+    'owners': ('ownerId', "该人员有 {count} 个关联项目，无法删除"),
+    'productlines': ('productLineId', "该产品线有{count}个关联项目，请先删除或迁移这些项目")
+}
+
+
+def _check_part(part):
+    """
+    校验数据源名称
+    
+    Args:
+        part: 数据源名称
+        
+    Raises:
+        ValueError: 不支持的数据源
+    """
+    if part not in PARTS:
+        raise ValueError(f"不支持的数据源: {part}（可选值: {', '.join(PARTS)}）")
+
+
+def get_tree(part):
+    """
+    获取数据源当前版本的Merkle树
+    
+    Args:
+        part: 数据源名称
+        
+    Returns:
+        MerkleTree: Merkle树
+    """
+    from utils import dataset
+    
+    _check_part(part)
+    return dataset.current().merkle_tree(part)
+
+
+def get_records(part, ids):
+    """
+    按ID获取记录（查当前数据集版本的主键索引）
+    
+    Args:
+        part: 数据源名称
+        ids: 记录ID列表
+        
+    Returns:
+        list: 存在的记录列表
+    """
+    from utils import dataset
+    
+    _check_part(part)
+    version = dataset.current()
+    lookup = {
+        'projects': version.get_project,
+        'owners': version.get_owner,
+        'productlines': version.get_productline
+    }[part]
+    return [dict(record) for record in map(lookup, dict.fromkeys(ids)) if record is not None]
+
+
+def _validate(part, record):
+    """
+    用对应的模型校验一条记录
+    
+    Args:
+        part: 数据源名称
+        record: 记录字典
+        
+    Raises:
+        ValueError: 记录无效
+    """
+    from models.owner import Owner
+    from models.productline import ProductLine
+    from models.project import Project
+    
+    model = {'projects': Project, 'owners': Owner, 'productlines': ProductLine}[part]
+    if not isinstance(record, dict) or not record.get('id'):
+        raise ValueError(f"{part} 记录缺少id")
+    try:
+        model.from_dict(record).validate()
+    except KeyError as e:
+        raise ValueError(f"{part} 记录 {record['id']} 缺少字段: {str(e)}")
+
+
+def _check_references(part, delete):
+    """
+    检查要删除的人员或产品线是否仍被项目引用（热数据查数据集的二级索引，
+    归档查各分区的计数）
+    
+    Args:
+        part: 数据源名称
+        delete: 要删除的记录ID集合
+        
+    Raises:
+        ValueError: 仍有项目引用其中的记录
+    """
+    from utils import dataset
+    from utils.repository import get_repository
+    
+    field, message = REFERENCED_BY[part]
+    version = dataset.current()
+    archive = get_repository().archive_store()
+    for record_id in sorted(delete):
+        count = version.count_projects(field, record_id) + archive.count_by(field, record_id)
+        if count > 0:
+            raise ValueError(f"{record_id}: {message.format(count=count)}")
+
+
+def apply_changes(part, upsert, delete):
+    """
+    在本实例上写入同步的记录
+    
+    Args:
+        part: 数据源名称
+        upsert: 要新建或替换的记录列表
+        delete: 要删除的记录ID列表
+        
+    Returns:
+        dict: 包含upserted和deleted数量的数据
+        
+    Raises:
+        ValueError: 数据源不支持、记录无效、名称重复，或要删除的人员、产品线仍被项目引用
+    """
+    from utils import dataset
+    from utils.repository import get_repository
+    
+    _check_part(part)
+    for record in upsert:
+        _validate(part, record)
+    delete = set(delete)
+    if part in REFERENCED_BY and delete:
+        _check_references(part, delete)
+    
+    with dataset.mutation():
+        repository = get_repository()
+        if part == 'projects':
+            store = repository.project_store()
+            for record in upsert:
+                store.put(record)
+            deleted = sum(1 for record_id in delete if store.remove(record_id))
+        else:
+            with repository.document_transaction(part, default={part: []}) as data:
+                items = data.setdefault(part, [])
+                positions = {item['id']: i for i, item in enumerate(items)}
+                for record in upsert:
+                    if record['id'] in positions:
+                        items[positions[record['id']]] = record
+                    else:
+                        items.append(record)
+                before = len(items)
+                items[:] = [item for item in items if item['id'] not in delete]
+                deleted = before - len(items)
+                # 按写入后的完整列表检查，同一批中互换名称不算重复
+                names = Counter(item.get('name') for item in items)
+                for record in upsert:
+                    if names[record.get('name')] > 1:
+                        raise ValueError(NAME_TAKEN[part].format(name=record.get('name')))
+    return {'upserted': len(upsert), 'deleted': deleted}
+
+
+class LocalInstance:
+    """
+    本实例（直接访问本进程的数据仓库）
+    """
+    
+    name = 'local'
+    
+    def nodes(self, part, prefixes):
+        """获取Merkle树节点 {前缀: 节点}"""
+        tree = get_tree(part)
+        return {prefix: tree.node(prefix) for prefix in prefixes}
+    
+    def records(self, part, ids):
+        """按ID获取记录"""
+        return get_records(part, ids)
+    
+    def apply(self, part, upsert, delete):
+        """写入同步的记录"""
+        return apply_changes(part, upsert, delete)
+
+
+class RemoteInstance:
+    """
+    远程实例（通过 /api/sync 接口访问）
+    """
+    
+    def __init__(self, base_url):
+        """
+        Args:
+            base_url: 实例地址，如 http://cloud-host:5000
+        """
+        self.name = base_url.rstrip('/')
+    
+    def _call(self, path, params=None, body=None):
+        """
+        调用远程同步接口
+        
+        Args:
+            path: /api/sync 之后的路径
+            params: 查询参数（可选，值可以是列表）
+            body: POST请求体（可选）
+            
+        Returns:
+            dict: 响应中的data字段
+        """
+        url = f"{self.name}/api/sync/{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params, doseq=True)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                result = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            result = json.loads(e.read().decode('utf-8') or '{}')
+        if not result.get('success'):
+            raise ValueError(f"{self.name}: {result.get('error') or '请求失败'}")
+        return result['data']
+    
+    def nodes(self, part, prefixes):
+        """获取Merkle树节点 {前缀: 节点}"""
+        return self._call(f'{part}/tree', {'prefix': prefixes})['nodes']
+    
+    def records(self, part, ids):
+        """按ID获取记录（分批请求）"""
+        records = []
+        for i in range(0, len(ids), FETCH_BATCH):
+            records.extend(self._call(f'{part}/records', {'ids': ','.join(ids[i:i + FETCH_BATCH])})['records'])
+        return records
+    
+    def apply(self, part, upsert, delete):
+        """写入同步的记录"""
+        return self._call(f'{part}/apply', body={'upsert': upsert, 'delete': delete})
+
+
+def open_instance(spec):
+    """
+    根据命令行参数打开实例
+    
+    Args:
+        spec: local 或实例地址
+        
+    Returns:
+        LocalInstance或RemoteInstance
+    """
+    if spec == 'local':
+        return LocalInstance()
+    return RemoteInstance(spec)
+
+
+def _children(prefix, node):
+    """
+    获取节点的子节点哈希
+    
+    Args:
+        prefix: 节点前缀
+        node: 节点
+        
+    Returns:
+        dict: {子节点前缀: 哈希}，叶子桶按记录所在的子节点返回，哈希为None
+    """
+    if 'children' in node:
+        return node['children']
+    return {key_of(record_id)[:len(prefix) + 1]: None for record_id in node['records']}
+
+
+def diff(source, target, part):
+    """
+    比较两个实例的一个数据源
+    
+    Args:
+        source: 源实例
+        target: 目标实例
+        part: 数据源名称
+        
+    Returns:
+        dict: 包含onlySource、onlyTarget、changed（记录ID列表）和
+              requests（两端节点请求轮数）的数据
+    """
+    result = {'onlySource': [], 'onlyTarget': [], 'changed': [], 'requests': 0}
+    level = ['']
+    while level:
+        source_nodes = source.nodes(part, level)
+        target_nodes = target.nodes(part, level)
+        result['requests'] += 1
+        next_level = []
+        for prefix in level:
+            source_node, target_node = source_nodes[prefix], target_nodes[prefix]
+            if source_node['hash'] == target_node['hash']:
+                continue
+            if 'records' in source_node and 'records' in target_node:
+                source_records, target_records = source_node['records'], target_node['records']
+                for record_id, digest in source_records.items():
+                    if record_id not in target_records:
+                        result['onlySource'].append(record_id)
+                    elif target_records[record_id] != digest:
+                        result['changed'].append(record_id)
+                result['onlyTarget'].extend(i for i in target_records if i not in source_records)
+            else:
+                source_children = _children(prefix, source_node)
+                target_children = _children(prefix, target_node)
+                for child in sorted(set(source_children) | set(target_children)):
+                    # 叶子桶一端的子节点哈希未知（None），需要到下一轮比较
+                    source_hash, target_hash = source_children.get(child, ''), target_children.get(child, '')
+                    if source_hash is None or target_hash is None or source_hash != target_hash:
+                        next_level.append(child)
+        level = next_level
+    return result
+
+
+def sync(source, target, part, delete=False, dry_run=False, upsert=True):
+    """
+    把源实例的一个数据源同步到目标实例（只传输有差异的记录）
+    
+    Args:
+        source: 源实例
+        target: 目标实例
+        part: 数据源名称
+        delete: 是否删除只在目标端存在的记录
+        dry_run: 只比较不写入
+        upsert: 是否写入新建和内容不同的记录（False时只删除）
+        
+    Returns:
+        dict: diff()的结果，另含upserted、deleted和conflicts（目标端更新而保留的记录ID）
+    """
+    result = diff(source, target, part)
+    wanted = result['onlySource'] + result['changed'] if upsert else []
+    source_records = {r['id']: r for r in source.records(part, wanted)} if wanted else {}
+    target_records = {r['id']: r for r in target.records(part, result['changed'])} if upsert and result['changed'] else {}
+    
+    changes, conflicts = [], []
+    for record_id in wanted:
+        record = source_records.get(record_id)
+        if record is None:
+            # 比较之后源端记录被删除
+            continue
+        current = target_records.get(record_id)
+        if current is not None and (current.get('updatedAt') or 0) > (record.get('updatedAt') or 0):
+            conflicts.append(record_id)
+            continue
+        changes.append(record)
+    
+    removing = result['onlyTarget'] if delete else []
+    result.update({'upserted': 0, 'deleted': 0, 'conflicts': conflicts})
+    if not dry_run and (changes or removing):
+        result.update(target.apply(part, changes, removing))
+    elif dry_run:
+        result.update({'upserted': len(changes), 'deleted': len(removing)})
+    return result
+
+
+def main(argv):
+    """
+    命令行入口
+    
+    Args:
+        argv: 命令行参数（不含程序名）
+        
+    Returns:
+        int: 退出码
+    """
+    options = {arg for arg in argv if arg.startswith('--')}
+    args = [arg for arg in argv if not arg.startswith('--')]
+    if len(args) < 3 or args[0] not in ('diff', 'sync'):
+        print(__doc__)
+        return 1
+    
+    command, source, target = args[0], open_instance(args[1]), open_instance(args[2])
+    parts = args[3:] or list(PARTS)
+    for part in parts:
+        if part not in PARTS:
+            print(f"不支持的数据源: {part}（可选值: {', '.join(PARTS)}）")
+            return 1
+    
+    delete = '--delete' in options
+    prefix = '[演练] ' if '--dry-run' in options else ''
+    for part in sorted(parts, key=PARTS.index):
+        if command == 'diff':
+            result = diff(source, target, part)
+            print(f"{part}: 仅{source.name} {len(result['onlySource'])}，仅{target.name} "
+                  f"{len(result['onlyTarget'])}，内容不同 {len(result['changed'])}（{result['requests']}轮比较）")
+            for label, key in (('+', 'onlySource'), ('-', 'onlyTarget'), ('~', 'changed')):
+                for record_id in result[key]:
+                    print(f"  {label} {record_id}")
+        else:
+            # 被项目引用的人员和产品线在项目同步之后再删除
+            result = sync(source, target, part, delete=delete and part not in REFERENCED_BY,
+                          dry_run='--dry-run' in options)
+            print(f"{prefix}{part}: 写入 {result['upserted']}，删除 {result['deleted']}，"
+                  f"冲突保留 {len(result['conflicts'])}（{result['requests']}轮比较）")
+            for record_id in result['conflicts']:
+                print(f"  目标端较新，未覆盖: {record_id}")
+    
+    if command == 'sync' and delete:
+        for part in sorted(set(parts) & set(REFERENCED_BY), key=PARTS.index):
+            result = sync(source, target, part, delete=True, dry_run='--dry-run' in options, upsert=False)
+            print(f"{prefix}{part}: 删除 {result['deleted']}（{result['requests']}轮比较）")
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except ValueError as e:
+        print(f"同步失败: {str(e)}")
+        sys.exit(1)
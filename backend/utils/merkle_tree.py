@@ -0,0 +1,256 @@
+"""
+Merkle树模块
+按记录ID的哈希把记录组织成16叉树，用于比较两个实例的数据集（见 utils/merkle_sync.py）
+
+- 节点由ID哈希（32位十六进制）的前缀标识，根节点前缀为空字符串
+- 节点下的记录数不超过 LEAF_SIZE 时为叶子桶，保存 {记录ID: 记录哈希}；
+  否则按下一位十六进制分为16个子节点，树的深度随数据量自适应，比较时
+  一个有差异的叶子桶最多只需传输 LEAF_SIZE 条记录哈希
+- 树的结构只由记录集合决定：两个实例中内容相同的节点哈希相同，与记录
+  写入的先后无关
+- 树不可变，修改时返回新的树（数据集的每个版本各自持有一棵树，见
+  utils/dataset.py），一次写入只重新计算变化记录所在路径上的节点
+"""
+import hashlib
+import json
+
+# 叶子桶最多保存的记录数
+LEAF_SIZE = 16
+
+# ID哈希的长度（十六进制位数），也是树的最大深度
+KEY_LENGTH = 32
+
+_HEX = '0123456789abcdef'
+
+
+def _digest(value):
+    """
+    计算字符串的摘要
+    
+    Args:
+        value: 字符串
+        
+    Returns:
+        str: 32位十六进制摘要
+    """
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def record_hash(record):
+    """
+    计算记录内容的哈希（与键顺序无关）
+    
+    Args:
+        record: 记录字典
+        
+    Returns:
+        str: 哈希值
+    """
+    return _digest(json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':')))
+
+
+def key_of(record_id):
+    """
+    计算记录在树中的位置：记录属于前缀为该值前缀的各个节点
+    
+    Args:
+        record_id: 记录ID
+        
+    Returns:
+        str: ID哈希（KEY_LENGTH位十六进制）
+    """
+    return _digest(record_id)
+
+
+def _leaf_hash(items):
+    """
+    计算叶子桶的哈希
+    
+    Args:
+        items: {记录ID: 记录哈希}
+        
+    Returns:
+        str: 哈希值
+    """
+    return _digest(json.dumps(sorted(items.items())))
+
+
+class MerkleTree:
+    """
+    一个数据源的Merkle树（不可变）
+    """
+    
+    __slots__ = ('_hashes', '_counts', '_leaves')
+    
+    def __init__(self, hashes, counts, leaves):
+        # {节点前缀: 节点哈希}、{节点前缀: 记录数}，空节点不保存
+        self._hashes = hashes
+        self._counts = counts
+        # {叶子桶前缀: {记录ID: 记录哈希}}
+        self._leaves = leaves
+    
+    @classmethod
+    def build(cls, records):
+        """
+        从记录列表构建树
+        
+        Args:
+            records: 记录列表
+            
+        Returns:
+            MerkleTree: Merkle树
+        """
+        tree = cls({}, {}, {})
+        tree._build('', sorted((key_of(r['id']), r['id'], record_hash(r)) for r in records))
+        return tree
+    
+    def _build(self, prefix, items):
+        """
+        构建一个节点及其子树（只在构建或修改新树时调用）
+        
+        Args:
+            prefix: 节点前缀
+            items: 节点下的 (ID哈希, 记录ID, 记录哈希)，按ID哈希排序
+            
+        Returns:
+            str: 节点哈希，空节点为空字符串
+        """
+        if not items:
+            return ''
+        self._counts[prefix] = len(items)
+        if len(items) <= LEAF_SIZE or len(prefix) >= KEY_LENGTH:
+            leaf = {record_id: digest for _, record_id, digest in items}
+            self._leaves[prefix] = leaf
+            self._hashes[prefix] = _leaf_hash(leaf)
+            return self._hashes[prefix]
+        
+        depth = len(prefix)
+        groups = {}
+        for item in items:
+            groups.setdefault(item[0][depth], []).append(item)
+        children = [self._build(prefix + c, groups.get(c, [])) for c in _HEX]
+        self._hashes[prefix] = _digest(','.join(children))
+        return self._hashes[prefix]
+    
+    def with_changes(self, removed, added):
+        """
+        返回应用修改后的新树（本树不变），只重新计算变化记录所在路径上的节点
+        
+        Args:
+            removed: 删除或被修改前的记录列表
+            added: 新增或修改后的记录列表
+            
+        Returns:
+            MerkleTree: 新树
+        """
+        tree = MerkleTree(dict(self._hashes), dict(self._counts), dict(self._leaves))
+        added_ids = {record['id'] for record in added}
+        for record in removed:
+            if record['id'] not in added_ids:
+                tree._update(record['id'], None)
+        for record in added:
+            tree._update(record['id'], record_hash(record))
+        return tree
+    
+    def _update(self, record_id, digest):
+        """
+        在新树上写入或删除一条记录，并维护所在路径上的节点（叶子桶超过
+        LEAF_SIZE 时拆分，内部节点的记录数降到 LEAF_SIZE 时合并为叶子桶）
+        
+        Args:
+            record_id: 记录ID
+            digest: 记录哈希，删除时为None
+        """
+        key = key_of(record_id)
+        path = ['']
+        while path[-1] in self._counts and path[-1] not in self._leaves:
+            path.append(key[:len(path)])
+        prefix = path.pop()
+        
+        leaf = dict(self._leaves.get(prefix, {}))
+        existed = record_id in leaf
+        if digest is None:
+            if not existed:
+                return
+            del leaf[record_id]
+        else:
+            if leaf.get(record_id) == digest:
+                return
+            leaf[record_id] = digest
+        delta = -1 if digest is None else (0 if existed else 1)
+        
+        self._set_leaf(prefix, leaf)
+        for parent in reversed(path):
+            self._counts[parent] += delta
+            if self._counts[parent] <= LEAF_SIZE:
+                self._set_leaf(parent, self._collect(parent))
+            else:
+                children = [self._hashes.get(parent + c, '') for c in _HEX]
+                self._hashes[parent] = _digest(','.join(children))
+    
+    def _set_leaf(self, prefix, items):
+        """
+        用给定记录替换一个节点（记录过多时拆分为子树）
+        
+        Args:
+            prefix: 节点前缀
+            items: 节点下的 {记录ID: 记录哈希}
+        """
+        self._leaves.pop(prefix, None)
+        if not items:
+            self._counts.pop(prefix, None)
+            self._hashes.pop(prefix, None)
+            return
+        self._build(prefix, sorted((key_of(record_id), record_id, digest) for record_id, digest in items.items()))
+    
+    def _collect(self, prefix):
+        """
+        取出一个节点子树中的全部记录，并删除该子树的全部节点
+        
+        Args:
+            prefix: 节点前缀
+            
+        Returns:
+            dict: {记录ID: 记录哈希}
+        """
+        items = {}
+        stack = [prefix]
+        while stack:
+            node = stack.pop()
+            if node not in self._counts:
+                continue
+            if node in self._leaves:
+                items.update(self._leaves.pop(node))
+            else:
+                stack.extend(node + c for c in _HEX)
+            del self._counts[node]
+            del self._hashes[node]
+        return items
+    
+    def node(self, prefix):
+        """
+        获取一个节点
+        
+        前缀位于叶子桶之下时（对端在该处记录较多、树更深），返回叶子桶中属于
+        该前缀的记录组成的叶子节点。
+        
+        Args:
+            prefix: 节点前缀（空字符串为根节点）
+            
+        Returns:
+            dict: 内部节点为 {'hash', 'children': {子节点前缀: 哈希}}，
+                  叶子桶为 {'hash', 'records': {记录ID: 记录哈希}}
+        """
+        if prefix in self._counts and prefix not in self._leaves:
+            return {
+                'hash': self._hashes[prefix],
+                'children': {prefix + c: self._hashes[prefix + c] for c in _HEX if prefix + c in self._hashes}
+            }
+        
+        items = {}
+        for length in range(len(prefix), -1, -1):
+            leaf = self._leaves.get(prefix[:length])
+            if leaf is not None:
+                items = {i: d for i, d in leaf.items() if key_of(i).startswith(prefix)}
+                break
+        return {'hash': _leaf_hash(items) if items else '', 'records': items}
@@ -9,7 +9,6 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services import owner_service, project_service
-from utils.file_handler import read_json_file, write_json_file
 
 
 def migrate_owner_data():
@@ -40,7 +39,7 @@ def migrate_owner_data():
     try:
         # 步骤1：确保owners.json存在
         print("\n[步骤1] 检查owners.json文件...")
-        if not os.path.exists('data/owners.json'):
+        if not owner_service.owners_data_exists():
             print("  - owners.json不存在，正在创建...")
             owner_service.initialize_owners_file()
             result['owners_file_created'] = True
@@ -62,36 +61,35 @@ def migrate_owner_data():
         # 步骤3：迁移项目数据
         print("\n[步骤3] 迁移项目数据...")
         
-        # 读取项目数据文件
-        projects_file = 'data/projects.json'
-        if not os.path.exists(projects_file):
+        # 读取项目数据（快照 + 追加日志）
+        service = project_service.ProjectService()
+        try:
+            projects_list = service.get_all()
+        except FileNotFoundError:
             print("  - 项目文件不存在，跳过迁移")
             result['success'] = True
             return result
         
-        # 读取原始数据
-        projects_data = read_json_file(projects_file)
-        projects_list = projects_data.get('projects', [])
         result['total_projects'] = len(projects_list)
         
         print(f"  - 找到 {result['total_projects']} 个项目")
         
-        # 检查并更新每个项目
+        # 检查并更新每个项目（列表为只读数据，需复制后再写回）
         migrated_count = 0
-        for project_dict in projects_list:
+        for project_dict in list(projects_list):
             project_id = project_dict.get('id', 'unknown')
             project_name = project_dict.get('name', 'unknown')
             
             # 检查是否已有ownerId
             if 'ownerId' not in project_dict or not project_dict['ownerId']:
-                # 添加默认人员ID
-                project_dict['ownerId'] = default_owner.id
+                # 添加默认人员ID，直接写入日志，不修改updatedAt
+                service.store.put(dict(project_dict, ownerId=default_owner.id))
                 migrated_count += 1
                 print(f"  - 迁移项目: {project_name} ({project_id})")
         
-        # 保存更新后的数据
+        # 迁移后压缩日志，使projects.json包含完整数据
         if migrated_count > 0:
-            write_json_file(projects_file, projects_data)
+            service.store.compact()
             result['projects_migrated'] = migrated_count
             print(f"\n  ✓ 成功迁移 {migrated_count} 个项目")
         else:
@@ -134,18 +132,16 @@ def check_migration_needed():
         bool: 需要迁移返回True，否则返回False
     """
     # 检查owners.json是否存在
-    if not os.path.exists('data/owners.json'):
+    if not owner_service.owners_data_exists():
         return True
     
     # 检查是否有项目缺少ownerId
     try:
-        projects_file = 'data/projects.json'
-        if not os.path.exists(projects_file):
+        try:
+            projects_list = project_service.ProjectService().get_all()
+        except FileNotFoundError:
             return False
         
-        projects_data = read_json_file(projects_file)
-        projects_list = projects_data.get('projects', [])
-        
         for project_dict in projects_list:
             if 'ownerId' not in project_dict or not project_dict['ownerId']:
                 return True
@@ -0,0 +1,94 @@
+"""
+数据迁移工具
+将 projects.json（含追加日志）按产品线拆分为分片文件
+
+用法（在backend目录下执行）：
+    python utils/migrate_shards.py
+
+拆分完成后设置环境变量 ROADMAP_PROJECT_LAYOUT=sharded 启动应用即可切换到分片存储。
+原 projects.json 保持不变，可作为备份；已存在分片清单时不会重复拆分。
+"""
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.file_handler import get_data_file_path
+from utils.history import HISTORY_FILE, FileHistoryStore
+from utils.journal import JournaledCollection, history_entries
+from utils.sharded_store import ShardedProjectStore
+
+
+def split_projects_into_shards(shard_dir=None):
+    """
+    将单文件项目数据按产品线拆分为分片
+    
+    Args:
+        shard_dir: 分片目录（可选，默认data/project_shards）
+        
+    Returns:
+        dict: 拆分结果统计
+    """
+    shard_dir = shard_dir or get_data_file_path('project_shards')
+    print("=" * 60)
+    print(f"开始拆分项目数据: {shard_dir}")
+    print("=" * 60)
+    
+    result = {
+        'success': False,
+        'projects': 0,
+        'shards': 0,
+        'errors': []
+    }
+    
+    try:
+        store = ShardedProjectStore(shard_dir)
+        if os.path.exists(store.manifest_file):
+            print("  ✓ 分片清单已存在，无需拆分")
+            result['success'] = True
+            return result
+        
+        # 快照 + 追加日志中尚未压缩的修改
+        projects_file = get_data_file_path('projects.json')
+        collection = JournaledCollection(projects_file, 'projects')
+        try:
+            projects = collection.values()
+        except FileNotFoundError:
+            print("  - projects.json不存在，创建空的分片清单")
+            projects = []
+        
+        # 追加日志中的历史版本写入历史文件（拆分后不再读取这份日志）
+        history = FileHistoryStore(get_data_file_path(HISTORY_FILE))
+        for path in (collection.compacting_file, collection.journal_file):
+            if os.path.exists(path):
+                history.persist(history_entries(path))
+        
+        store.replace_all(projects)
+        result['projects'] = len(projects)
+        result['shards'] = len({p.get('productLineId') for p in projects})
+        print(f"  ✓ 拆分项目 {result['projects']} 个，共 {result['shards']} 个分片")
+        
+        result['success'] = True
+    except Exception as e:
+        error_msg = f"拆分失败: {str(e)}"
+        result['errors'].append(error_msg)
+        print(f"\n  ✗ {error_msg}")
+        import traceback
+        traceback.print_exc()
+    
+    print("=" * 60)
+    print(f"状态: {'成功' if result['success'] else '失败'}")
+    print("=" * 60)
+    
+    return result
+
+
+if __name__ == '__main__':
+    """
+    直接运行此脚本进行数据拆分
+    """
+    result = split_projects_into_shards(sys.argv[1] if len(sys.argv) > 1 else None)
+    
+    # 返回退出码
+    sys.exit(0 if result['success'] else 1)
@@ -0,0 +1,125 @@
+"""
+数据迁移工具
+将现有JSON数据文件一次性导入SQLite数据库
+
+用法（在backend目录下执行）：
+    python utils/migrate_sqlite.py
+
+导入完成后设置环境变量 ROADMAP_STORAGE_BACKEND=sqlite 启动应用即可切换到SQLite后端。
+项目（含追加日志中尚未压缩的修改）、归档分区 data/archive/projects-<年份>.json、
+变更历史 data/project_history.jsonl（含追加日志中的历史版本）、人员、产品线和
+设置都会导入；重复执行会用JSON文件中的数据覆盖数据库中的同类数据。
+"""
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from services.owner_service import OWNERS_FILE
+from utils import sqlite_store
+from utils.archive import ARCHIVE_DIR, FileArchiveStore
+from utils.file_handler import read_json_file, get_data_file_path
+from utils.history import HISTORY_FILE, FileHistoryStore, export_history
+from utils.journal import JournaledCollection
+from utils.sharded_store import ShardedProjectStore
+
+
+def import_json_to_sqlite(db_path=None):
+    """
+    将项目、归档分区、变更历史、人员、产品线和设置导入SQLite
+    
+    Args:
+        db_path: 目标数据库文件路径（可选，默认data目录下的配置文件名）
+        
+    Returns:
+        dict: 导入结果统计
+    """
+    db_path = db_path or sqlite_store.get_db_path()
+    print("=" * 60)
+    print(f"开始导入JSON数据到SQLite: {db_path}")
+    print("=" * 60)
+    
+    result = {
+        'success': False,
+        'projects': 0,
+        'archived': 0,
+        'history': 0,
+        'owners': 0,
+        'productlines': 0,
+        'settings': False,
+        'errors': []
+    }
+    
+    try:
+        # 项目：快照 + 追加日志中尚未压缩的修改（分片布局时合并全部分片）
+        if config.PROJECT_LAYOUT == 'sharded':
+            source = ShardedProjectStore(get_data_file_path('project_shards'))
+        else:
+            source = JournaledCollection(get_data_file_path('projects.json'), 'projects')
+        # 回放追加日志时登记其中的历史版本
+        history = FileHistoryStore(get_data_file_path(HISTORY_FILE))
+        source.history = history
+        history.source = source
+        try:
+            projects = source.values()
+        except FileNotFoundError:
+            projects = []
+        sqlite_store.SqliteProjectStore(db_path).replace_all(projects)
+        result['projects'] = len(projects)
+        print(f"  ✓ 导入项目 {len(projects)} 个")
+        
+        # 归档分区
+        archive = FileArchiveStore(get_data_file_path(ARCHIVE_DIR))
+        partitions = {year: archive.values(year) for year in archive.years()}
+        sqlite_store.SqliteArchiveStore(db_path).replace_all(partitions)
+        result['archived'] = sum(len(records) for records in partitions.values())
+        print(f"  ✓ 导入归档项目 {result['archived']} 个（{len(partitions)} 个年份）")
+        
+        # 变更历史
+        entries = export_history(history)
+        sqlite_store.SqliteHistoryStore(db_path).replace_all(entries)
+        result['history'] = len(entries)
+        print(f"  ✓ 导入变更历史 {len(entries)} 个版本")
+        
+        # 人员、产品线
+        for name, path in (('owners', OWNERS_FILE), ('productlines', get_data_file_path('productlines.json'))):
+            if not os.path.exists(path):
+                print(f"  - {os.path.basename(path)}不存在，跳过")
+                continue
+            data = read_json_file(path)
+            sqlite_store.write_document(name, data, db_path)
+            result[name] = len(data.get(name, []))
+            print(f"  ✓ 导入{name} {result[name]} 条")
+        
+        # 设置
+        settings_file = get_data_file_path('settings.json')
+        if os.path.exists(settings_file):
+            sqlite_store.write_document('settings', read_json_file(settings_file), db_path)
+            result['settings'] = True
+            print("  ✓ 导入设置")
+        
+        result['success'] = True
+    except Exception as e:
+        error_msg = f"导入失败: {str(e)}"
+        result['errors'].append(error_msg)
+        print(f"\n  ✗ {error_msg}")
+        import traceback
+        traceback.print_exc()
+    
+    print("=" * 60)
+    print(f"状态: {'成功' if result['success'] else '失败'}")
+    print("=" * 60)
+    
+    return result
+
+
+if __name__ == '__main__':
+    """
+    直接运行此脚本进行数据导入
+    """
+    result = import_json_to_sqlite(sys.argv[1] if len(sys.argv) > 1 else None)
+    
+    # 返回退出码
+    sys.exit(0 if result['success'] else 1)
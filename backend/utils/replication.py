@@ -0,0 +1,850 @@
+"""
+主从复制模块
+主节点（leader）把所有修改按顺序记录到复制日志，只读副本（follower）通过HTTP
+拉取日志并应用到自己的数据目录，供报表等只读访问分担主节点的读取压力
+
+- 主节点：数据仓库被包装为记录修改的仓库（见 wrap_repository），项目的新增、
+  修改、删除记录为整条记录，人员、产品线和设置的修改记录为整个文档。修改与
+  日志追加在同一把复制日志锁内完成，日志顺序与修改的实际顺序一致
+- 日志保存在 data/replication.log（每行一条JSON，seq连续递增），超过
+  MAX_LOG_BYTES 后丢弃较早的一半；副本落后太多（所需日志已被丢弃）时从快照追赶
+- 主节点为日志维护稀疏的 {序号: 字节偏移} 索引，拉取时从不超过所需序号的
+  最近位置开始读取，不必每次从文件开头扫描
+- 副本：后台线程长轮询 /api/replication/log，批量应用后把已应用的序号保存到
+  data/replication_state.json；首次启动、日志断档或主节点数据被重置时先拉取
+  /api/replication/snapshot 整体追赶。日志条目都是完整状态，重复应用不影响结果
+- 副本以多个worker进程运行时，只有对 data/replication_follower.lock 取得
+  非阻塞排他锁（flock）的进程运行复制线程，其他进程直接读取它写入的数据；
+  该进程退出后锁自动释放，下一个请求到来的进程接替
+
+副本只提供GET接口（见 app.py），复制延迟见 get_replication_stats()。
+"""
+import copy
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+from contextlib import contextmanager
+
+import config
+from utils import generation
+from utils.file_handler import get_data_file_path, read_json_file, write_json_file
+from utils.file_lock import get_lock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 复制日志文件名（主节点）、已应用位置文件名和复制线程选举锁文件名（副本），均位于data目录下
+LOG_FILE = 'replication.log'
+STATE_FILE = 'replication_state.json'
+FOLLOWER_LOCK_FILE = 'replication_follower.lock'
+
+# 复制日志超过该大小后丢弃较早的一半
+MAX_LOG_BYTES = 4 * 1024 * 1024
+
+# 单次拉取的最大日志条数
+PULL_LIMIT = 500
+
+# 日志偏移索引的间隔（每隔多少条日志记录一个位置）
+OFFSET_INTERVAL = 64
+
+# 副本连接主节点失败后的最长重试间隔（秒）
+MAX_RETRY_INTERVAL = 30
+
+_log = None
+_follower = None
+# 本进程持有的选举锁：(进程ID, 文件描述符)
+_follower_lock = None
+_singleton_lock = threading.Lock()
+
+
+def _now_ms():
+    """当前时间戳（毫秒）"""
+    return int(time.time() * 1000)
+
+
+class ReplicationLog:
+    """
+    主节点的复制日志
+    
+    Attributes:
+        path: 日志文件路径
+    """
+    
+    def __init__(self, path):
+        """
+        初始化复制日志
+        
+        Args:
+            path: 日志文件路径
+        """
+        self.path = path
+        self._lock = get_lock(path)
+        self._local = threading.local()
+        # 日志边界缓存：(文件签名, 首条序号, 末条序号, 末条时间戳)
+        self._bounds_cache = None
+        self._bounds_lock = threading.Lock()
+        # 日志偏移索引：(文件inode, 升序的序号列表, 对应行首的字节偏移列表)，
+        # 丢弃较早日志时文件被整体替换（inode变化），索引随之失效
+        self._offsets = (None, [], [])
+        self._offsets_lock = threading.Lock()
+    
+    @contextmanager
+    def recording(self):
+        """
+        修改上下文：持有复制日志的排他锁（同一线程可嵌套），
+        在其中完成修改并调用append()，保证日志顺序与修改顺序一致
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth > 0:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        
+        with self._lock.exclusive():
+            self._local.depth = 1
+            try:
+                yield
+            finally:
+                self._local.depth = 0
+    
+    def append(self, entry):
+        """
+        追加一条日志（调用方需在recording()中）
+        
+        Args:
+            entry: 日志内容（type、op等字段）
+            
+        Returns:
+            int: 日志序号
+        """
+        _, _, last_seq, _ = self._bounds(repair=True)
+        seq = last_seq + 1
+        ts = _now_ms()
+        # seq固定为第一个字段，读取时无需解析整行即可跳过
+        line = json.dumps({'seq': seq, 'ts': ts, **entry}, ensure_ascii=False) + '\n'
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        generation.bump(self.path)
+        
+        size = os.path.getsize(self.path)
+        if size > MAX_LOG_BYTES:
+            self._trim()
+        return seq
+    
+    def _trim(self):
+        """
+        丢弃较早的一半日志（调用方需持有排他锁）
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        kept = lines[len(lines) // 2:]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        generation.bump(self.path)
+    
+    def _bounds(self, repair=False):
+        """
+        获取日志的首末序号（按文件签名缓存，其他进程追加后重新读取首尾两行）
+        
+        Args:
+            repair: 是否截掉崩溃留下的不完整末行（需持有排他锁）
+            
+        Returns:
+            tuple: (文件签名, 首条序号, 末条序号, 末条时间戳)，日志为空时首条序号为末条序号+1
+        """
+        try:
+            st = os.stat(self.path)
+            stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            return (None, 1, 0, 0)
+        
+        with self._bounds_lock:
+            cached = self._bounds_cache
+            if cached is not None and cached[0] == stat_key:
+                return cached
+        
+        with open(self.path, 'rb') as f:
+            head = f.readline()
+            f.seek(max(0, st.st_size - 64 * 1024))
+            tail = f.read()
+        
+        if tail and not tail.endswith(b'\n'):
+            complete = tail.rfind(b'\n') + 1
+            if repair:
+                print(f"复制日志 {self.path} 末尾存在不完整记录，已截断")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(st.st_size - len(tail) + complete)
+                return self._bounds()
+            tail = tail[:complete]
+        
+        lines = tail.splitlines()
+        if not lines or not head.endswith(b'\n'):
+            bounds = (stat_key, 1, 0, 0)
+        else:
+            first = json.loads(head)
+            last = json.loads(lines[-1])
+            bounds = (stat_key, first['seq'], last['seq'], last['ts'])
+        
+        with self._bounds_lock:
+            self._bounds_cache = bounds
+        return bounds
+    
+    def last_seq(self):
+        """
+        获取最后一条日志的序号
+        
+        Returns:
+            int: 序号，日志为空时返回0
+        """
+        return self._bounds()[2]
+    
+    def read(self, after, limit=PULL_LIMIT, wait=0):
+        """
+        读取指定序号之后的日志，没有新日志时最多等待wait秒（长轮询）
+        
+        Args:
+            after: 副本已应用的序号
+            limit: 最多返回的条数
+            wait: 等待新日志的最长时间（秒）
+            
+        Returns:
+            dict: 包含entries、firstSeq、lastSeq、lastTs和gap（所需日志已丢弃或
+                  主节点日志被重置，副本需要从快照追赶）的数据
+        """
+        deadline = time.monotonic() + wait
+        observed = generation.file_generation(self.path)
+        while True:
+            with self._lock.shared():
+                _, first_seq, last_seq, last_ts = self._bounds()
+                result = {
+                    'entries': [],
+                    'firstSeq': first_seq,
+                    'lastSeq': last_seq,
+                    'lastTs': last_ts,
+                    'gap': after > last_seq or after < first_seq - 1
+                }
+                if result['gap'] or after < last_seq:
+                    if not result['gap']:
+                        result['entries'] = self._read_entries(after, limit)
+                    return result
+            if time.monotonic() >= deadline:
+                return result
+            # 等待本机任何进程追加日志（只读取共享代数）
+            while time.monotonic() < deadline and generation.file_generation(self.path) == observed:
+                time.sleep(0.05)
+            observed = generation.file_generation(self.path)
+    
+    def _read_entries(self, after, limit):
+        """
+        读取指定序号之后的日志条目（调用方需持有共享锁）
+        
+        Args:
+            after: 起始序号（不包含）
+            limit: 最多返回的条数
+            
+        Returns:
+            list: 日志条目列表
+        """
+        entries = []
+        with open(self.path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            with self._offsets_lock:
+                if self._offsets[0] != inode:
+                    self._offsets = (inode, [], [])
+                _, seqs, offsets = self._offsets
+                # 从不超过 after+1 的最近索引位置开始读取
+                i = bisect_right(seqs, after + 1) - 1
+                expected, position = (seqs[i], offsets[i]) if i >= 0 else (None, 0)
+            
+            f.seek(position)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if expected is not None:
+                    if not line.startswith(b'{"seq": %d,' % expected):
+                        # 索引与文件内容不符（日志被重置），丢弃索引从头读取
+                        with self._offsets_lock:
+                            self._offsets = (None, [], [])
+                        return self._read_entries(after, limit)
+                    expected = None
+                # 行首固定为 {"seq": N,
+                seq = int(line[8:line.index(b',')])
+                if seq % OFFSET_INTERVAL == 0:
+                    self._index_offset(inode, seq, position)
+                position += len(line)
+                if seq <= after:
+                    continue
+                entries.append(json.loads(line))
+                if len(entries) >= limit:
+                    break
+        return entries
+    
+    def _index_offset(self, inode, seq, position):
+        """
+        在偏移索引中记录一条日志的位置（按序号追加，已记录过的位置忽略）
+        
+        Args:
+            inode: 读取时日志文件的inode
+            seq: 日志序号
+            position: 该行行首的字节偏移
+        """
+        with self._offsets_lock:
+            current, seqs, offsets = self._offsets
+            if current == inode and (not seqs or seq > seqs[-1]):
+                seqs.append(seq)
+                offsets.append(position)
+
+
+class LoggedProjectStore:
+    """
+    记录修改的项目存储：包装实际存储，修改后追加复制日志，读取直接委托
+    """
+    
+    def __init__(self, store, log):
+        """
+        Args:
+            store: 实际的项目存储
+            log: 复制日志
+        """
+        self._store = store
+        self._log = log
+    
+    def __getattr__(self, name):
+        """读取类操作直接委托给实际存储"""
+        return getattr(self._store, name)
+    
+    def put(self, record, op='update'):
+        """写入一条记录并记录日志"""
+        with self._log.recording():
+            self._store.put(record, op=op)
+            self._log.append({'type': 'project', 'op': op, 'id': record['id'], 'record': record})
+    
+    def modify(self, record_id, fn):
+        """修改一条记录，记录确有变化时记录日志"""
+        changed = []
+        
+        def apply(current):
+            original = dict(current)
+            record = fn(current)
+            changed[:] = [record != original]
+            return record
+        
+        with self._log.recording():
+            record = self._store.modify(record_id, apply)
+            if record is not None and changed and changed[0]:
+                self._log.append({'type': 'project', 'op': 'update', 'id': record_id, 'record': record})
+            return record
+    
+    def remove(self, record_id):
+        """删除一条记录并记录日志"""
+        with self._log.recording():
+            removed = self._store.remove(record_id)
+            if removed:
+                self._log.append({'type': 'project', 'op': 'delete', 'id': record_id})
+            return removed
+    
+    def replace_all(self, records):
+        """替换全部记录，逐条记录日志"""
+        with self._log.recording():
+            existing = {record['id'] for record in self._store.values()}
+            self._store.replace_all(records)
+            for record in records:
+                existing.discard(record['id'])
+                self._log.append({'type': 'project', 'op': 'update', 'id': record['id'], 'record': record})
+            for record_id in existing:
+                self._log.append({'type': 'project', 'op': 'delete', 'id': record_id})
+
+
+class LoggedArchiveStore:
+    """
+    记录修改的归档分区存储：包装实际存储，修改后追加复制日志，读取直接委托
+    """
+    
+    def __init__(self, archive, log):
+        """
+        Args:
+            archive: 实际的归档存储
+            log: 复制日志
+        """
+        self._archive = archive
+        self._log = log
+    
+    def __getattr__(self, name):
+        """读取类操作直接委托给实际存储"""
+        return getattr(self._archive, name)
+    
+    def put(self, year, records):
+        """写入归档并记录日志"""
+        with self._log.recording():
+            self._archive.put(year, records)
+            self._log.append({'type': 'archive', 'op': 'put', 'year': year, 'records': records})
+    
+    def remove(self, year, ids):
+        """从归档删除并记录日志"""
+        with self._log.recording():
+            removed = self._archive.remove(year, ids)
+            if removed:
+                self._log.append({'type': 'archive', 'op': 'delete', 'year': year, 'ids': list(ids)})
+            return removed
+
+
+class LoggedRepository:
+    """
+    记录修改的数据仓库（主节点使用）：项目存储和文档事务追加复制日志，其余委托
+    """
+    
+    def __init__(self, repository, log):
+        """
+        Args:
+            repository: 实际的数据仓库
+            log: 复制日志
+        """
+        self._repository = repository
+        self._log = log
+        self._projects = LoggedProjectStore(repository.project_store(), log)
+        self._archive = LoggedArchiveStore(repository.archive_store(), log)
+    
+    def __getattr__(self, name):
+        """读取类操作直接委托给实际仓库"""
+        return getattr(self._repository, name)
+    
+    def project_store(self):
+        """获取记录修改的项目存储"""
+        return self._projects
+    
+    def archive_store(self):
+        """获取记录修改的归档存储"""
+        return self._archive
+    
+    @contextmanager
+    def document_transaction(self, name, default=None):
+        """文档事务，提交后文档有变化（或新建）时记录整个文档"""
+        with self._log.recording():
+            existed = self._repository.document_exists(name)
+            with self._repository.document_transaction(name, default=default) as data:
+                before = copy.deepcopy(data)
+                yield data
+                after = copy.deepcopy(data)
+            if after != before or not existed:
+                self._log.append({'type': 'document', 'name': name, 'data': after})
+    
+    def replication_snapshot(self):
+        """
+        获取与复制日志位置一致的完整数据快照（持有复制日志锁，期间修改等待）
+        
+        Returns:
+            dict: 包含seq、projects、documents（{文档名: 数据或None}）和
+                  archive（{年份: 归档项目列表}）的数据
+        """
+        from utils.repository import DOCUMENTS
+        
+        with self._log.recording():
+            documents = {}
+            for name in DOCUMENTS:
+                try:
+                    documents[name] = copy.deepcopy(self._repository.read_document(name))
+                except FileNotFoundError:
+                    documents[name] = None
+            archive = self._repository.archive_store()
+            return {
+                'seq': self._log.last_seq(),
+                'projects': [dict(record) for record in self._repository.project_store().values()],
+                'documents': documents,
+                'archive': {year: list(archive.values(year)) for year in archive.years()}
+            }
+
+
+def get_log():
+    """
+    获取本进程的复制日志对象（单例）
+    
+    Returns:
+        ReplicationLog: 复制日志
+    """
+    global _log
+    
+    with _singleton_lock:
+        if _log is None:
+            _log = ReplicationLog(get_data_file_path(LOG_FILE))
+        return _log
+
+
+def wrap_repository(repository):
+    """
+    按复制角色包装数据仓库（主节点记录修改，其他角色原样返回）
+    
+    Args:
+        repository: 数据仓库
+        
+    Returns:
+        数据仓库对象
+    """
+    if config.REPLICATION_ROLE != 'leader':
+        return repository
+    return LoggedRepository(repository, get_log())
+
+
+def _apply_entry(repository, entry):
+    """
+    在副本上应用一条日志
+    
+    Args:
+        repository: 副本的数据仓库
+        entry: 日志条目
+    """
+    if entry['type'] == 'project':
+        store = repository.project_store()
+        if entry['op'] == 'delete':
+            store.remove(entry['id'])
+        else:
+            store.put(entry['record'])
+    elif entry['type'] == 'document':
+        with repository.document_transaction(entry['name'], default={}) as data:
+            data.clear()
+            data.update(entry['data'])
+    elif entry['type'] == 'archive':
+        archive = repository.archive_store()
+        if entry['op'] == 'delete':
+            archive.remove(entry['year'], entry['ids'])
+        else:
+            archive.put(entry['year'], entry['records'])
+
+
+def apply_snapshot(repository, snapshot):
+    """
+    整体应用完整数据快照（只写入有差异的记录），用于副本追赶和备份恢复
+    
+    Args:
+        repository: 要写入的数据仓库
+        snapshot: 包含projects、documents和archive的快照
+    """
+    store = repository.project_store()
+    try:
+        existing = {record['id']: record for record in store.values()}
+    except FileNotFoundError:
+        existing = {}
+    
+    for record in snapshot['projects']:
+        if existing.pop(record['id'], None) != record:
+            store.put(record)
+    for record_id in existing:
+        store.remove(record_id)
+    
+    for name, data in snapshot['documents'].items():
+        if data is not None:
+            _apply_entry(repository, {'type': 'document', 'name': name, 'data': data})
+    
+    archive = repository.archive_store()
+    # JSON序列化后年份键为字符串
+    partitions = {int(year): records for year, records in snapshot.get('archive', {}).items()}
+    for year in set(archive.years()) | set(partitions):
+        records = partitions.get(year, [])
+        if records:
+            archive.put(year, records)
+        stale = {r['id'] for r in archive.values(year)} - {r['id'] for r in records}
+        if stale:
+            archive.remove(year, stale)
+
+
+class Follower:
+    """
+    副本的复制线程
+    
+    Attributes:
+        leader: 主节点地址
+        state_file: 已应用位置文件路径
+    """
+    
+    def __init__(self, leader):
+        """
+        初始化复制线程（调用start()后开始复制）
+        
+        Args:
+            leader: 主节点地址
+        """
+        self.leader = leader
+        self.state_file = get_data_file_path(STATE_FILE)
+        self.pid = os.getpid()
+        self._stopping = threading.Event()
+        self._thread = None
+        try:
+            state = read_json_file(self.state_file)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        if state.get('leader') != leader:
+            # 首次复制或更换了主节点，从快照开始
+            state = {}
+        self._applied_seq = state.get('seq')
+        self._applied_ts = state.get('ts', 0)
+        self._stats = {
+            'state': 'starting',
+            'leaderSeq': 0,
+            'leaderTs': 0,
+            'applied': 0,
+            'snapshots': 0,
+            'errors': 0,
+            'lastError': None,
+            'lastContact': 0
+        }
+    
+    def start(self):
+        """启动复制线程"""
+        self._thread = threading.Thread(target=self._run, name='replication-follower', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止复制线程"""
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+    
+    def is_alive(self):
+        """
+        复制线程是否在本进程中运行
+        
+        Returns:
+            bool: 运行中返回True
+        """
+        return self.pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+    
+    def _request(self, path, params=None, timeout=30):
+        """
+        请求主节点的复制接口
+        
+        Args:
+            path: 接口路径
+            params: 查询参数
+            timeout: 超时时间（秒）
+            
+        Returns:
+            dict: 响应中的data字段
+        """
+        url = f"{self.leader}/api/replication/{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = json.loads(response.read().decode('utf-8'))
+        if not body.get('success'):
+            raise ValueError(body.get('error') or '主节点返回失败')
+        return body['data']
+    
+    def _run(self):
+        """复制循环：需要时从快照追赶，之后持续拉取日志；失败时按指数退避重试"""
+        retry = 1
+        while not self._stopping.is_set():
+            try:
+                if self._applied_seq is None:
+                    self._catch_up()
+                else:
+                    self._pull()
+                retry = 1
+            except Exception as e:
+                self._stats['state'] = 'disconnected'
+                self._stats['errors'] += 1
+                self._stats['lastError'] = str(e)
+                print(f"从主节点复制失败，{retry}秒后重试: {str(e)}")
+                self._stopping.wait(retry)
+                retry = min(retry * 2, MAX_RETRY_INTERVAL)
+    
+    def _catch_up(self):
+        """拉取主节点快照并整体应用"""
+        from utils import dataset
+        from utils.repository import get_repository
+        
+        self._stats['state'] = 'snapshot'
+        snapshot = self._request('snapshot', timeout=120)
+        with dataset.mutation():
+            apply_snapshot(get_repository(), snapshot)
+        self._stats['state'] = 'streaming'
+        self._stats['snapshots'] += 1
+        self._stats['lastContact'] = _now_ms()
+        self._save_state(snapshot['seq'], _now_ms())
+        print(f"已从主节点快照追赶到日志位置 {snapshot['seq']}")
+    
+    def _pull(self):
+        """长轮询拉取一批日志并应用"""
+        from utils import dataset
+        from utils.repository import get_repository
+        
+        wait = config.REPLICATION_POLL_TIMEOUT
+        data = self._request(
+            'log',
+            {'after': self._applied_seq, 'limit': PULL_LIMIT, 'wait': wait},
+            timeout=wait + 30
+        )
+        self._stats['lastContact'] = _now_ms()
+        self._stats['leaderSeq'] = data['lastSeq']
+        self._stats['leaderTs'] = data['lastTs']
+        
+        if data['gap']:
+            # 所需日志已被主节点丢弃，或主节点数据被重置
+            print(f"复制日志断档（已应用 {self._applied_seq}，主节点 {data['firstSeq']}-{data['lastSeq']}），从快照追赶")
+            self._applied_seq = None
+            return
+        
+        self._stats['state'] = 'streaming'
+        entries = data['entries']
+        if not entries:
+            return
+        with dataset.mutation():
+            repository = get_repository()
+            for entry in entries:
+                _apply_entry(repository, entry)
+        self._stats['applied'] += len(entries)
+        self._save_state(entries[-1]['seq'], entries[-1]['ts'])
+    
+    def _save_state(self, seq, ts):
+        """
+        保存已应用的日志位置
+        
+        Args:
+            seq: 已应用的序号
+            ts: 该日志在主节点上的时间戳（毫秒）
+        """
+        write_json_file(self.state_file, {'leader': self.leader, 'seq': seq, 'ts': ts})
+        self._applied_seq = seq
+        self._applied_ts = ts
+    
+    def get_stats(self):
+        """
+        获取复制状态
+        
+        Returns:
+            dict: 包含state、appliedSeq、leaderSeq、lagEntries（落后条数）、
+                  lagMs（已应用日志与主节点最新日志的时间差）、sinceContactMs等的数据
+        """
+        applied = self._applied_seq or 0
+        lag_entries = max(0, self._stats['leaderSeq'] - applied)
+        contact = self._stats['lastContact']
+        return {
+            'role': 'follower',
+            'leader': self.leader,
+            'state': self._stats['state'],
+            'appliedSeq': applied,
+            'leaderSeq': self._stats['leaderSeq'],
+            'lagEntries': lag_entries,
+            'lagMs': max(0, self._stats['leaderTs'] - self._applied_ts) if lag_entries else 0,
+            'sinceContactMs': _now_ms() - contact if contact else None,
+            'applied': self._stats['applied'],
+            'snapshots': self._stats['snapshots'],
+            'errors': self._stats['errors'],
+            'lastError': self._stats['lastError']
+        }
+
+
+def _elect_follower():
+    """
+    尝试成为运行复制线程的进程：对选举锁文件加非阻塞排他锁，成功后在进程
+    存活期间一直持有（调用方需持有 _singleton_lock）
+    
+    Returns:
+        bool: 本进程持有选举锁返回True，不支持fcntl的平台总是返回True
+    """
+    global _follower_lock
+    
+    if fcntl is None:
+        return True
+    if _follower_lock is not None and _follower_lock[0] == os.getpid():
+        return True
+    
+    path = get_data_file_path(FOLLOWER_LOCK_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    # 记录持有者的进程ID，便于排查
+    os.ftruncate(fd, 0)
+    os.write(fd, f'{os.getpid()}\n'.encode())
+    _follower_lock = (os.getpid(), fd)
+    return True
+
+
+def ensure_following():
+    """
+    确保本机有一个进程在运行复制线程（只读副本使用）
+    多个worker进程中只有取得选举锁的进程启动复制线程，其他进程每次调用时
+    重新尝试，持有者退出后由下一个调用的进程接替
+    
+    Returns:
+        bool: 本进程的复制线程正在运行返回True，不是副本或由其他进程负责复制时返回False
+    """
+    global _follower
+    
+    if not config.is_follower():
+        return False
+    follower = _follower
+    if follower is not None and follower.is_alive():
+        return True
+    
+    with _singleton_lock:
+        if _follower is not None and _follower.is_alive():
+            return True
+        if not _elect_follower():
+            return False
+        _follower = Follower(config.REPLICATION_LEADER)
+        _follower.start()
+        return True
+
+
+def get_replication_stats():
+    """
+    获取复制状态
+    
+    Returns:
+        dict: 主节点返回日志位置，副本返回复制延迟，未启用复制时role为off
+    """
+    if config.REPLICATION_ROLE == 'leader':
+        _, first_seq, last_seq, last_ts = get_log()._bounds()
+        return {'role': 'leader', 'firstSeq': first_seq, 'lastSeq': last_seq, 'lastTs': last_ts}
+    if config.is_follower():
+        follower = _follower
+        if follower is not None and follower.is_alive():
+            return follower.get_stats()
+        return _standby_stats()
+    return {'role': 'off'}
+
+
+def _standby_stats():
+    """
+    获取未运行复制线程的进程看到的复制状态（复制线程在其他worker进程中运行）
+    
+    Returns:
+        dict: 包含state、appliedSeq和followerPid（运行复制线程的进程ID）的数据
+    """
+    try:
+        state = read_json_file(get_data_file_path(STATE_FILE))
+    except (FileNotFoundError, ValueError):
+        state = {}
+    try:
+        with open(get_data_file_path(FOLLOWER_LOCK_FILE), 'r', encoding='utf-8') as f:
+            pid = int(f.read().strip() or 0) or None
+    except (FileNotFoundError, ValueError):
+        pid = None
+    applied = state.get('seq') if state.get('leader') == config.REPLICATION_LEADER else None
+    return {
+        'role': 'follower',
+        'leader': config.REPLICATION_LEADER,
+        'state': 'standby' if pid is not None else 'starting',
+        'appliedSeq': applied or 0,
+        'followerPid': pid
+    }
@@ -0,0 +1,608 @@
+"""
+数据仓库模块
+为服务层提供统一的数据访问接口，具体存储由 config.STORAGE_BACKEND 决定：
+
+- json：JSON文件 + 追加日志，项目可按产品线分片（JsonRepository）
+- sqlite：SQLite数据库（SqliteRepository）
+- memory：全部数据保存在进程内存中，按 config.MEMORY_SNAPSHOT 快照到
+  data/memory_snapshot/ 目录（MemoryRepository）
+
+人员、产品线和设置称为文档，以与对应JSON文件相同的结构整体读取，
+通过 document_transaction() 读取-修改-写回；项目通过 project_store()
+返回的记录存储按条读写（values/get/put/modify/remove/count_by）。
+项目的每次修改都会追加到变更历史（见 utils/history.py）。
+
+服务层只通过 get_repository() 访问数据，不再直接读写文件。
+"""
+import copy
+import os
+import threading
+from contextlib import contextmanager
+
+import config
+from utils import generation, sqlite_store, write_behind
+from utils.archive import ARCHIVE_DIR, FileArchiveStore
+from utils.file_handler import (
+    get_data_file_path, get_write_generation, read_json_file, transaction, write_json_file
+)
+from utils.history import HISTORY_FILE, FileHistoryStore, MemoryHistoryStore, export_history, track_history
+from utils.journal import get_collection
+from utils.replication import wrap_repository
+from utils.sharded_store import get_sharded_store
+
+# 文档名称（与JSON文件名及其中的列表键一致）
+DOCUMENTS = ('owners', 'productlines', 'settings')
+
+# 内存仓库的快照目录名（位于data目录下）
+MEMORY_SNAPSHOT_DIR = 'memory_snapshot'
+
+# 内存仓库快照中项目变更历史的数据源名称
+HISTORY_PART = 'project_history'
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """
+    获取当前配置的数据仓库（进程内单例）
+    以主节点角色运行时，返回的仓库会记录修改供只读副本复制（见 utils/replication.py）
+    
+    Returns:
+        Repository: 数据仓库对象
+    """
+    global _repository
+    
+    with _repository_lock:
+        if _repository is None:
+            if config.STORAGE_BACKEND == 'sqlite':
+                repository = SqliteRepository()
+            elif config.STORAGE_BACKEND == 'memory':
+                repository = MemoryRepository()
+            else:
+                repository = JsonRepository()
+            _repository = wrap_repository(track_history(repository))
+        return _repository
+
+
+def file_token(paths):
+    """
+    计算一组文件的变化签名（不加锁，每个文件只做一次stat）
+    包含本进程的写入次数（延迟写入尚未落盘时同样能检测到变化）和所有进程的
+    共享写入代数（mtime精度内的连续写入同样能检测到变化）
+    
+    Args:
+        paths: 文件路径列表
+        
+    Returns:
+        tuple: 每个文件的 ((mtime_ns, size, inode), 写入次数, 共享代数)，文件不存在时第一项为None
+    """
+    token = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            stat_key = None
+        token.append((stat_key, get_write_generation(path), generation.file_generation(path)))
+    return tuple(token)
+
+
+class Repository:
+    """
+    数据仓库接口
+    """
+    
+    def project_store(self):
+        """
+        获取项目记录存储
+        
+        Returns:
+            项目存储对象（JournaledCollection、ShardedProjectStore、SqliteProjectStore或MemoryProjectStore）
+        """
+        raise NotImplementedError
+    
+    def archive_store(self):
+        """
+        获取项目归档分区存储（见 utils/archive.py）
+        
+        Returns:
+            归档存储对象（FileArchiveStore或SqliteArchiveStore）
+        """
+        raise NotImplementedError
+    
+    def history_store(self):
+        """
+        获取项目变更历史存储（见 utils/history.py）
+        
+        Returns:
+            历史存储对象（FileHistoryStore或SqliteHistoryStore）
+        """
+        raise NotImplementedError
+    
+    def read_document(self, name):
+        """
+        读取文档（只读，调用方不得修改返回值）
+        
+        Args:
+            name: 文档名（owners、productlines或settings）
+            
+        Returns:
+            dict: 与对应JSON文件结构相同的数据
+            
+        Raises:
+            FileNotFoundError: 文档不存在
+        """
+        raise NotImplementedError
+    
+    def document_transaction(self, name, default=None):
+        """
+        文档的读取-修改-写回事务，数据没有变化时不写入
+        
+        Args:
+            name: 文档名
+            default: 文档不存在时使用的初始数据（可选，不提供则抛出FileNotFoundError）
+            
+        Returns:
+            上下文管理器，产出可修改的文档数据
+        """
+        raise NotImplementedError
+    
+    def document_exists(self, name):
+        """
+        文档是否存在
+        
+        Args:
+            name: 文档名
+            
+        Returns:
+            bool: 存在返回True
+        """
+        try:
+            self.read_document(name)
+        except FileNotFoundError:
+            return False
+        return True
+    
+    def change_token(self, part):
+        """
+        获取数据源的变化签名，数据变化后签名随之变化（用于数据集快照的失效检查）
+        
+        Args:
+            part: 数据源名称（projects或文档名）
+            
+        Returns:
+            tuple: 可比较的签名
+        """
+        raise NotImplementedError
+
+
+class JsonRepository(Repository):
+    """
+    JSON文件仓库：文档保存为 data/<文档名>.json，项目为快照 + 追加日志
+    （按配置分片，见 utils/sharded_store.py）
+    """
+    
+    def __init__(self):
+        """初始化仓库，按配置选择项目存储"""
+        if config.use_shards():
+            self._projects = get_sharded_store(get_data_file_path('project_shards'))
+        else:
+            self._projects = get_collection(get_data_file_path('projects.json'), 'projects')
+        self._archive = FileArchiveStore(get_data_file_path(ARCHIVE_DIR))
+        self._history = FileHistoryStore(get_data_file_path(HISTORY_FILE))
+        # 历史版本写在项目追加日志中，压缩日志时移入历史文件
+        self._projects.history = self._history
+        self._history.source = self._projects
+    
+    def document_file(self, name):
+        """
+        获取文档对应的JSON文件路径
+        
+        Args:
+            name: 文档名
+            
+        Returns:
+            str: 文件路径
+        """
+        return get_data_file_path(f'{name}.json')
+    
+    def project_store(self):
+        """获取项目记录存储（JournaledCollection或ShardedProjectStore）"""
+        return self._projects
+    
+    def archive_store(self):
+        """获取归档分区（data/archive/下每年一个JSON文件）"""
+        return self._archive
+    
+    def history_store(self):
+        """获取变更历史（data/project_history.jsonl）"""
+        return self._history
+    
+    def read_document(self, name):
+        """读取文档对应的JSON文件（返回缓存对象，不得修改）"""
+        return read_json_file(self.document_file(name), copy=False)
+    
+    def document_transaction(self, name, default=None):
+        """文档事务（见 file_handler.transaction）"""
+        return transaction(self.document_file(name), default=default)
+    
+    def change_token(self, part):
+        """数据源相关文件的签名"""
+        if part == 'projects':
+            return file_token(self._projects.source_files())
+        return file_token([self.document_file(part)])
+
+
+class SqliteRepository(Repository):
+    """
+    SQLite仓库（见 utils/sqlite_store.py）
+    """
+    
+    def __init__(self):
+        """初始化仓库"""
+        self._projects = sqlite_store.SqliteProjectStore()
+        self._archive = sqlite_store.SqliteArchiveStore()
+        self._history = sqlite_store.SqliteHistoryStore()
+    
+    def project_store(self):
+        """获取项目记录存储（SqliteProjectStore）"""
+        return self._projects
+    
+    def archive_store(self):
+        """获取归档分区（archived_projects表）"""
+        return self._archive
+    
+    def history_store(self):
+        """获取变更历史（project_history表）"""
+        return self._history
+    
+    def read_document(self, name):
+        """从数据库读取文档，settings尚未保存过时视为不存在"""
+        data = sqlite_store.read_document(name)
+        if data is None:
+            raise FileNotFoundError(f"数据不存在: {name}")
+        return data
+    
+    def document_transaction(self, name, default=None):
+        """文档事务（见 sqlite_store.document_transaction）"""
+        return sqlite_store.document_transaction(name, default=default)
+    
+    def change_token(self, part):
+        """数据库文件的签名"""
+        # WAL模式下提交只修改-wal文件，所有数据源共用数据库文件的签名
+        return file_token(self._projects.source_files())
+
+
+class MemoryProjectStore:
+    """
+    内存中的项目存储
+    接口与JournaledCollection一致，保存的记录只读，修改时整条替换
+    """
+    
+    def __init__(self, on_change, history):
+        """
+        初始化项目存储
+        
+        Args:
+            on_change: 数据变化后调用的函数（无参数）
+            history: 历史存储（MemoryHistoryStore）
+        """
+        self.history = history
+        self._lock = threading.Lock()
+        self._records = {}   # {id: record}，按插入顺序
+        self._values = None  # 记录列表缓存，写入后失效
+        self._on_change = on_change
+        self.version = 0
+    
+    def _changed(self, record_id, current, record, history):
+        """
+        记录一次数据变化并追加历史版本（调用方需持有self._lock）
+        
+        Args:
+            record_id: 项目ID
+            current: 修改前的项目（不存在为None）
+            record: 修改后的项目（删除为None）
+            history: 历史回调（可选，见 JournaledCollection.put）
+        """
+        self._values = None
+        self.version += 1
+        entry = history(record_id, current, record) if history else None
+        if entry is not None:
+            self.history.append([entry])
+    
+    def values(self):
+        """
+        获取全部项目
+        返回的列表和记录都是只读的，调用方不得修改
+        
+        Returns:
+            list: 项目列表（按创建顺序）
+        """
+        with self._lock:
+            if self._values is None:
+                self._values = list(self._records.values())
+            return self._values
+    
+    def get(self, record_id):
+        """
+        根据ID获取项目
+        
+        Args:
+            record_id: 项目ID
+            
+        Returns:
+            dict: 项目（只读），不存在返回None
+        """
+        return self._records.get(record_id)
+    
+    def put(self, record, op='update', history=None):
+        """
+        写入（新增或替换）一个项目
+        
+        Args:
+            record: 完整项目字典
+            op: 操作类型（与JournaledCollection接口保持一致，此处不区分）
+            history: 历史回调（可选）
+        """
+        with self._lock:
+            current = self._records.get(record['id'])
+            self._records[record['id']] = dict(record)
+            self._changed(record['id'], current, record, history)
+        self._on_change()
+    
+    def modify(self, record_id, fn, history=None):
+        """
+        读取、修改并写回一个项目，数据没有变化时不写入
+        
+        Args:
+            record_id: 项目ID
+            fn: 修改函数，接收当前项目的副本，返回修改后的完整项目字典
+            history: 历史回调（可选）
+            
+        Returns:
+            dict: 修改后的项目，项目不存在返回None
+        """
+        with self._lock:
+            current = self._records.get(record_id)
+            if current is None:
+                return None
+            record = fn(dict(current))
+            if record == current:
+                return record
+            self._records[record_id] = dict(record)
+            self._changed(record_id, current, record, history)
+        self._on_change()
+        return record
+    
+    def remove(self, record_id, history=None):
+        """
+        删除一个项目
+        
+        Args:
+            record_id: 项目ID
+            history: 历史回调（可选）
+            
+        Returns:
+            bool: 删除成功返回True，项目不存在返回False
+        """
+        with self._lock:
+            current = self._records.pop(record_id, None)
+            if current is None:
+                return False
+            self._changed(record_id, current, None, history)
+        self._on_change()
+        return True
+    
+    def count_by(self, field, value):
+        """
+        统计指定字段等于指定值的项目数量
+        
+        Args:
+            field: 字段名
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+        """
+        return sum(1 for record in self.values() if record.get(field) == value)
+    
+    def source_files(self):
+        """
+        与JournaledCollection接口保持一致（内存存储没有数据文件）
+        
+        Returns:
+            list: 空列表
+        """
+        return []
+    
+    def compact(self):
+        """
+        与JournaledCollection接口保持一致（内存存储无需压缩）
+        """
+    
+    def replace_all(self, records):
+        """
+        用给定列表替换全部项目
+        
+        Args:
+            records: 项目字典列表
+        """
+        with self._lock:
+            self._records = {record['id']: dict(record) for record in records}
+            self._changed(None, None, None, None)
+        self._on_change()
+
+
+class MemoryRepository(Repository):
+    """
+    内存仓库：全部数据保存在进程内存中，读写不涉及磁盘
+    
+    启动时从快照目录 data/memory_snapshot/ 加载；快照不存在时从JSON文件
+    仓库导入现有数据。数据变化后按 config.MEMORY_SNAPSHOT 写回快照目录：
+    interval（后台线程按刷盘间隔写入）、on-shutdown（进程退出时写入）
+    或 off（不写入，只能通过 snapshot() 显式保存，适合基准测试）。
+    快照目录中的文件与JSON文件结构相同；项目变更历史保存在内存中，快照为
+    project_history.json。
+    
+    数据只在本进程内可见，不支持多worker进程部署。
+    """
+    
+    def __init__(self, snapshot_dir=None):
+        """
+        初始化仓库并加载数据
+        
+        Args:
+            snapshot_dir: 快照目录（可选，默认data/memory_snapshot）
+        """
+        self.snapshot_dir = snapshot_dir or get_data_file_path(MEMORY_SNAPSHOT_DIR)
+        self._documents = {}
+        self._versions = {name: 0 for name in DOCUMENTS}
+        self._locks = {name: threading.Lock() for name in DOCUMENTS}
+        self._history = MemoryHistoryStore(self.snapshot_dir + '.history', lambda: self._mark_dirty(HISTORY_PART))
+        self._projects = MemoryProjectStore(lambda: self._mark_dirty('projects'), self._history)
+        self._archive = FileArchiveStore(get_data_file_path(ARCHIVE_DIR))
+        self._loading = True
+        self._load()
+        self._loading = False
+    
+    def _snapshot_file(self, part):
+        """
+        获取数据源在快照目录中的文件路径
+        
+        Args:
+            part: 数据源名称
+            
+        Returns:
+            str: 文件路径
+        """
+        return os.path.join(self.snapshot_dir, f'{part}.json')
+    
+    def _load(self):
+        """
+        从快照目录加载数据，快照不存在时从JSON文件仓库导入
+        """
+        if os.path.isdir(self.snapshot_dir):
+            source = None
+            print(f"从内存仓库快照加载数据: {self.snapshot_dir}")
+        else:
+            source = JsonRepository()
+            print("内存仓库快照不存在，从JSON数据文件导入")
+        
+        for name in DOCUMENTS:
+            try:
+                if source is None:
+                    self._documents[name] = read_json_file(self._snapshot_file(name))
+                else:
+                    self._documents[name] = copy.deepcopy(source.read_document(name))
+            except FileNotFoundError:
+                pass
+        
+        history_file = self._snapshot_file(HISTORY_PART)
+        if source is None and os.path.exists(history_file):
+            data = read_json_file(history_file, copy=False)
+            self._history.load(data.get('history', []), data.get('truncated'))
+        else:
+            # 从JSON文件仓库导入（之前版本的内存仓库也把历史保存在 data/project_history.jsonl）
+            history = source.history_store() if source else FileHistoryStore(get_data_file_path(HISTORY_FILE))
+            if source is not None:
+                history.source = source.project_store()
+            self._history.load(export_history(history), history.first_ts())
+        
+        try:
+            if source is None:
+                projects = read_json_file(self._snapshot_file('projects'), copy=False).get('projects', [])
+            else:
+                projects = source.project_store().values()
+        except FileNotFoundError:
+            return
+        self._projects.replace_all(projects)
+    
+    def _mark_dirty(self, part):
+        """
+        登记数据源的快照写入（按config.MEMORY_SNAPSHOT）
+        
+        Args:
+            part: 数据源名称
+        """
+        if self._loading or config.MEMORY_SNAPSHOT == 'off':
+            return
+        write_behind.mark_dirty(
+            self._snapshot_file(part),
+            lambda: self._write_snapshot(part),
+            config.MEMORY_SNAPSHOT
+        )
+    
+    def _write_snapshot(self, part):
+        """
+        把一个数据源写入快照目录
+        快照目录尚不存在时写入全部数据源，保证快照目录中的数据是完整的
+        
+        Args:
+            part: 数据源名称
+        """
+        if not os.path.isdir(self.snapshot_dir):
+            self.snapshot()
+            return
+        
+        # 文档和项目记录都是整体替换的，直接写入当前引用即可，无需加锁
+        if part == 'projects':
+            write_json_file(self._snapshot_file(part), {'projects': self._projects.values()})
+            return
+        if part == HISTORY_PART:
+            write_json_file(self._snapshot_file(part), self._history.dump())
+            return
+        data = self._documents.get(part)
+        if data is not None:
+            write_json_file(self._snapshot_file(part), data)
+    
+    def snapshot(self):
+        """
+        立即把全部数据写入快照目录
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for part in ('projects', HISTORY_PART) + DOCUMENTS:
+            self._write_snapshot(part)
+    
+    def project_store(self):
+        """获取项目记录存储（MemoryProjectStore）"""
+        return self._projects
+    
+    def archive_store(self):
+        """获取归档分区（冷数据不常驻内存，与JSON后端相同保存在data/archive/下）"""
+        return self._archive
+    
+    def history_store(self):
+        """获取变更历史（MemoryHistoryStore）"""
+        return self._history
+    
+    def read_document(self, name):
+        """读取内存中的文档（只读）"""
+        data = self._documents.get(name)
+        if data is None:
+            raise FileNotFoundError(f"数据不存在: {name}")
+        return data
+    
+    @contextmanager
+    def document_transaction(self, name, default=None):
+        """文档事务：持有文档的进程内锁，提交时整体替换文档"""
+        with self._locks[name]:
+            original = self._documents.get(name)
+            if original is None and default is None:
+                raise FileNotFoundError(f"数据不存在: {name}")
+            
+            data = copy.deepcopy(default if original is None else original)
+            yield data
+            
+            if original is not None and data == original:
+                return
+            # 替换整个文档，读取方持有的旧引用保持不变
+            self._documents[name] = copy.deepcopy(data)
+            self._versions[name] += 1
+        self._mark_dirty(name)
+    
+    def change_token(self, part):
+        """数据源的内存版本号"""
+        if part == 'projects':
+            return ('memory', self._projects.version)
+        return ('memory', self._versions[part])
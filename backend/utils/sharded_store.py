@@ -0,0 +1,460 @@
+"""
+项目分片存储模块
+按产品线（productLineId）把项目拆分到多个分片文件中保存
+
+目录结构（data/project_shards/）：
+    manifest.json           分片清单 {"version": 1, "shards": {产品线ID: 分片文件名}}
+    shard-<产品线ID>.json    分片快照，每个分片各自带追加日志和锁（见 utils/journal.py）
+    move.pending.json       跨分片移动项目时的意图记录（移动完成后删除）
+
+不同产品线的项目写入各自的分片文件、持各自的锁，互不阻塞。
+分片集合锁（shards.lock）用于协调整个分片集合：普通读写持共享锁；新建
+分片和跨分片移动项目持排他锁，因此读取方不会看到移动到一半的状态。
+
+跨分片移动先写意图记录，再写入目标分片、从源分片删除，最后删除意图记录。
+中途崩溃时，下一次访问会按意图记录重做移动（两步都是幂等的）。移动的历史
+版本在写意图记录前计算并保存在意图记录中，随写入目标分片的日志行一起追加，
+重做时版本号不变（历史存储按项目ID和版本号去重）。
+
+通过环境变量 ROADMAP_PROJECT_LAYOUT=sharded 启用，
+启用前使用 utils/migrate_shards.py 把现有 projects.json 拆分为分片。
+"""
+import hashlib
+import os
+import re
+import threading
+
+from utils.file_handler import read_json_file, write_json_file
+from utils.file_lock import get_lock
+from utils.journal import get_collection
+
+MANIFEST_VERSION = 1
+
+# 分片存储注册表，同一分片目录在进程内只有一个实例
+_stores = {}
+_stores_lock = threading.Lock()
+
+# 分片文件中记录列表所在的键（与projects.json一致）
+RECORDS_KEY = 'projects'
+
+
+def shard_file_name(product_line_id):
+    """
+    根据产品线ID生成分片文件名
+    ID中含有文件名不允许的字符时替换掉，并追加哈希避免冲突
+    
+    Args:
+        product_line_id: 产品线ID
+        
+    Returns:
+        str: 分片文件名（如 shard-pl-xxx.json）
+    """
+    value = str(product_line_id or '')
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', value) or '_'
+    if safe != value:
+        safe = f"{safe}-{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+    return f'shard-{safe}.json'
+
+
+def get_sharded_store(shard_dir):
+    """
+    获取指定分片目录对应的存储对象（进程内单例）
+    
+    Args:
+        shard_dir: 分片目录路径
+        
+    Returns:
+        ShardedProjectStore: 分片存储对象
+    """
+    with _stores_lock:
+        if shard_dir not in _stores:
+            _stores[shard_dir] = ShardedProjectStore(shard_dir)
+        return _stores[shard_dir]
+
+
+def _fixed(entry):
+    """
+    返回固定历史版本的历史回调（跨分片移动时使用）
+    
+    Args:
+        entry: 预先计算的历史版本（可以为None）
+        
+    Returns:
+        callable: 历史回调
+    """
+    return lambda record_id, before, after: entry
+
+
+class _ShardChanged(Exception):
+    """修改改变了项目的产品线，需要放弃分片内的修改改为跨分片移动"""
+
+
+class ShardedProjectStore:
+    """
+    按产品线分片的项目存储
+    接口与JournaledCollection一致，供ProjectService使用
+    
+    Attributes:
+        shard_dir: 分片目录
+        manifest_file: 分片清单文件路径
+        move_file: 跨分片移动意图记录路径
+        history: 关联到各分片的历史存储（可选，见 JournaledCollection.history）
+    """
+    
+    def __init__(self, shard_dir):
+        """
+        初始化分片存储（清单在首次访问时加载）
+        
+        Args:
+            shard_dir: 分片目录路径
+        """
+        self.shard_dir = shard_dir
+        self.manifest_file = os.path.join(shard_dir, 'manifest.json')
+        self.move_file = os.path.join(shard_dir, 'move.pending.json')
+        self.history = None
+        
+        # 分片集合锁（旁路锁文件 shards.lock，不能与清单文件自身的读写锁共用）：
+        # 普通读写持共享锁，新建分片和跨分片移动持排他锁
+        self._lock = get_lock(os.path.join(shard_dir, 'shards'))
+        self._merge_lock = threading.Lock()
+        self._merged_sources = None  # 上次合并时各分片返回的列表
+        self._merged = None          # 合并后的项目列表缓存
+    
+    def _read_manifest(self):
+        """
+        读取分片清单（调用方需持有self._lock）
+        
+        Returns:
+            dict: {产品线ID: 分片文件名}
+            
+        Raises:
+            FileNotFoundError: 清单文件不存在
+        """
+        return read_json_file(self.manifest_file, copy=False).get('shards', {})
+    
+    def _shard(self, file_name):
+        """
+        获取分片对应的日志集合
+        
+        Args:
+            file_name: 分片文件名
+            
+        Returns:
+            JournaledCollection: 分片集合
+        """
+        collection = get_collection(os.path.join(self.shard_dir, file_name), RECORDS_KEY)
+        collection.history = self.history
+        return collection
+    
+    def _shards(self):
+        """
+        获取全部分片（调用方需持有self._lock）
+        
+        Returns:
+            dict: {产品线ID: JournaledCollection}
+        """
+        return {pl_id: self._shard(name) for pl_id, name in self._read_manifest().items()}
+    
+    def _find(self, shards, record_id):
+        """
+        查找记录所在的分片
+        
+        Args:
+            shards: {产品线ID: JournaledCollection}
+            record_id: 记录ID
+            
+        Returns:
+            tuple: (产品线ID, 分片集合, 记录)，找不到时返回 (None, None, None)
+        """
+        for pl_id, shard in shards.items():
+            record = shard.get(record_id)
+            if record is not None:
+                return pl_id, shard, record
+        return None, None, None
+    
+    def _ensure_shard(self, product_line_id):
+        """
+        获取产品线对应的分片，不存在时创建空分片并登记到清单（调用方需持有排他锁）
+        
+        Args:
+            product_line_id: 产品线ID
+            
+        Returns:
+            JournaledCollection: 分片集合
+        """
+        try:
+            manifest = dict(self._read_manifest())
+        except FileNotFoundError:
+            manifest = {}
+        
+        if product_line_id in manifest:
+            return self._shard(manifest[product_line_id])
+        
+        # 先写分片文件，再登记清单：清单中的分片一定存在
+        file_name = shard_file_name(product_line_id)
+        shard_path = os.path.join(self.shard_dir, file_name)
+        if not os.path.exists(shard_path):
+            write_json_file(shard_path, {RECORDS_KEY: []})
+        manifest[product_line_id] = file_name
+        write_json_file(self.manifest_file, {'version': MANIFEST_VERSION, 'shards': manifest})
+        return self._shard(file_name)
+    
+    def _recover(self):
+        """
+        检查是否有未完成的跨分片移动，有则重做
+        """
+        if not os.path.exists(self.move_file):
+            return
+        
+        with self._lock.exclusive():
+            # 加锁后再确认一次：移动可能刚刚由其他线程完成
+            if not os.path.exists(self.move_file):
+                return
+            intent = read_json_file(self.move_file)
+            print(f"检测到未完成的项目移动，正在重做: {intent['id']}")
+            self._apply_move(intent)
+    
+    def _apply_move(self, intent):
+        """
+        执行跨分片移动（调用方需持有排他锁）
+        
+        Args:
+            intent: 意图记录 {'id', 'from', 'to', 'record', 'h'（历史版本，可选）}
+        """
+        target = self._ensure_shard(intent['to'])
+        target.put(intent['record'], op='update', history=_fixed(intent.get('h')))
+        
+        source_name = self._read_manifest().get(intent['from'])
+        if source_name is not None:
+            self._shard(source_name).remove(intent['id'])
+        
+        os.remove(self.move_file)
+    
+    def values(self):
+        """
+        获取全部项目（按创建时间排序）
+        返回的列表和记录都是只读的，调用方不得修改
+        
+        Returns:
+            list: 项目列表
+            
+        Raises:
+            FileNotFoundError: 分片清单不存在（尚未迁移）
+        """
+        self._recover()
+        with self._lock.shared():
+            sources = [shard.values() for shard in self._shards().values()]
+        
+        with self._merge_lock:
+            # 各分片未变化时直接复用上次的合并结果（分片未变化时返回同一个列表对象）
+            previous = self._merged_sources
+            if (previous is not None and len(previous) == len(sources)
+                    and all(a is b for a, b in zip(previous, sources))):
+                return self._merged
+            
+            merged = [record for values in sources for record in values]
+            merged.sort(key=lambda record: record.get('createdAt') or 0)
+            self._merged_sources = sources
+            self._merged = merged
+            return merged
+    
+    def get(self, record_id):
+        """
+        根据ID获取项目
+        
+        Args:
+            record_id: 项目ID
+            
+        Returns:
+            dict: 项目（只读），不存在返回None
+        """
+        self._recover()
+        with self._lock.shared():
+            return self._find(self._shards(), record_id)[2]
+    
+    def put(self, record, op='update', history=None):
+        """
+        写入（新增或替换）一个项目，产品线变化时在分片之间原子移动
+        
+        Args:
+            record: 完整项目字典
+            op: 日志操作类型（create或update）
+            history: 历史回调（可选，见 JournaledCollection.put）
+        """
+        self._recover()
+        product_line_id = record.get('productLineId')
+        
+        # 快速路径：目标分片已存在，且项目是新建的或本来就在目标分片中
+        with self._lock.shared():
+            try:
+                shards = self._shards()
+            except FileNotFoundError:
+                shards = {}
+            target = shards.get(product_line_id)
+            if target is not None:
+                if op == 'create' or target.get(record['id']) is not None:
+                    target.put(record, op=op, history=history)
+                    return
+                if self._find(shards, record['id'])[1] is None:
+                    target.put(record, op=op, history=history)
+                    return
+        
+        # 慢速路径：需要新建分片或跨分片移动
+        with self._lock.exclusive():
+            try:
+                shards = self._shards()
+            except FileNotFoundError:
+                shards = {}
+            source_id, source, current = (None, None, None) if op == 'create' else self._find(shards, record['id'])
+            
+            if source is None or source_id == product_line_id:
+                self._ensure_shard(product_line_id).put(record, op=op, history=history)
+                return
+            
+            intent = {'id': record['id'], 'from': source_id, 'to': product_line_id, 'record': record}
+            entry = history(record['id'], current, record) if history else None
+            if entry is not None:
+                intent['h'] = entry
+            write_json_file(self.move_file, intent)
+            self._apply_move(intent)
+    
+    def modify(self, record_id, fn, history=None):
+        """
+        读取、修改并写回一个项目，产品线变化时在分片之间原子移动
+        
+        产品线不变时在所在分片的排他锁内完成；产品线变化时放弃本次修改，
+        改为持有分片集合排他锁重新读取并修改，因此fn可能被调用两次，不得有副作用。
+        
+        Args:
+            record_id: 项目ID
+            fn: 修改函数，接收当前项目的副本，返回修改后的完整项目字典
+            history: 历史回调（可选，见 JournaledCollection.put）
+            
+        Returns:
+            dict: 修改后的项目，项目不存在返回None
+        """
+        self._recover()
+        
+        def apply_in_shard(current):
+            record = fn(current)
+            if record.get('productLineId') != current.get('productLineId'):
+                raise _ShardChanged()
+            return record
+        
+        # 快速路径：产品线不变
+        with self._lock.shared():
+            shard = self._find(self._shards(), record_id)[1]
+            if shard is None:
+                return None
+            try:
+                return shard.modify(record_id, apply_in_shard, history=history)
+            except _ShardChanged:
+                pass
+        
+        # 慢速路径：跨分片移动
+        with self._lock.exclusive():
+            source_id, source, current = self._find(self._shards(), record_id)
+            if source is None:
+                return None
+            record = fn(dict(current))
+            if record == current:
+                return record
+            if record.get('productLineId') == source_id:
+                source.put(record, op='update', history=history)
+                return record
+            
+            intent = {'id': record_id, 'from': source_id, 'to': record.get('productLineId'), 'record': record}
+            entry = history(record_id, current, record) if history else None
+            if entry is not None:
+                intent['h'] = entry
+            write_json_file(self.move_file, intent)
+            self._apply_move(intent)
+            return record
+    
+    def remove(self, record_id, history=None):
+        """
+        删除一个项目
+        
+        Args:
+            record_id: 项目ID
+            history: 历史回调（可选，见 JournaledCollection.put）
+            
+        Returns:
+            bool: 删除成功返回True，项目不存在返回False
+        """
+        self._recover()
+        with self._lock.shared():
+            shard = self._find(self._shards(), record_id)[1]
+            if shard is None:
+                return False
+            return shard.remove(record_id, history=history)
+    
+    def source_files(self):
+        """
+        获取分片目录下的全部数据文件（用于检测数据变化，不加锁）
+        
+        Returns:
+            list: 清单、分片快照和日志的路径
+        """
+        try:
+            names = sorted(os.listdir(self.shard_dir))
+        except FileNotFoundError:
+            names = []
+        return [os.path.join(self.shard_dir, n) for n in names if not n.endswith('.lock')]
+    
+    def count_by(self, field, value):
+        """
+        统计指定字段等于指定值的项目数量
+        按产品线统计时只需查看对应分片
+        
+        Args:
+            field: 字段名
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+        """
+        self._recover()
+        with self._lock.shared():
+            try:
+                shards = self._shards()
+            except FileNotFoundError:
+                return 0
+            if field == 'productLineId':
+                shard = shards.get(value)
+                return len(shard.values()) if shard is not None else 0
+            return sum(shard.count_by(field, value) for shard in shards.values())
+    
+    def compact(self):
+        """
+        立即压缩所有分片的日志并等待完成
+        """
+        self._recover()
+        with self._lock.shared():
+            try:
+                shards = self._shards()
+            except FileNotFoundError:
+                return
+            for shard in shards.values():
+                shard.compact()
+    
+    def replace_all(self, records):
+        """
+        用给定列表替换全部项目（拆分迁移时使用）
+        
+        Args:
+            records: 项目字典列表
+        """
+        groups = {}
+        for record in records:
+            groups.setdefault(record.get('productLineId'), []).append(record)
+        
+        with self._lock.exclusive():
+            os.makedirs(self.shard_dir, exist_ok=True)
+            manifest = {}
+            for product_line_id, group in groups.items():
+                file_name = shard_file_name(product_line_id)
+                write_json_file(os.path.join(self.shard_dir, file_name), {RECORDS_KEY: group})
+                manifest[product_line_id] = file_name
+            # 清单最后写入，写入前中断不会留下不完整的分片集合
+            write_json_file(self.manifest_file, {'version': MANIFEST_VERSION, 'shards': manifest})
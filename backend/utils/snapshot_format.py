@@ -0,0 +1,335 @@
+"""
+数据文件格式工具模块
+提供紧凑快照格式的编码、解码，以及与普通JSON之间的转换和基准测试
+
+普通JSON格式（默认）每条记录都重复保存全部键名，并带缩进，文件体积大、
+冷启动解析慢。紧凑格式：
+- 字段名（schema）只保存一次，每条记录保存为按字段顺序排列的数组
+- status、productLineId、ownerId 等重复值做字典编码，记录中只保存序号
+- 可选gzip压缩
+
+紧凑格式文件结构：
+    {
+        "__format__": "roadmap-compact",
+        "version": 1,
+        "key": "projects",
+        "extra": {...},                  # 快照中除记录列表外的其他字段
+        "fields": ["id", "name", ...],
+        "dictionaries": {"status": ["开发", ...], ...},
+        "rows": [[...], ...]             # 字段不齐全的旧记录原样保存为对象
+    }
+
+读取由 file_handler.read_json_file 透明完成（自动识别gzip和紧凑格式），
+写入格式由环境变量 ROADMAP_SNAPSHOT_FORMAT（json / compact / compact-gzip）决定。
+
+命令行用法（在backend目录下执行）：
+    python utils/snapshot_format.py convert compact-gzip ../data/projects.json
+    python utils/snapshot_format.py convert json ../data/projects.json
+    python utils/snapshot_format.py bench 10000 100000
+"""
+import gzip
+import json
+import os
+import sys
+
+# 支持的写入格式
+FORMATS = ('json', 'compact', 'compact-gzip')
+
+FORMAT_MARKER = 'roadmap-compact'
+FORMAT_VERSION = 1
+
+# 做字典编码的字段（值重复度高）
+DICTIONARY_FIELDS = ('status', 'productLineId', 'ownerId')
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_GZIP_LEVEL = 5
+
+
+def _find_records_key(data):
+    """
+    找到快照中记录列表所在的键（值为对象列表的第一个顶层键）
+    
+    Args:
+        data: 快照数据
+        
+    Returns:
+        str: 键名，找不到时返回None
+    """
+    if not isinstance(data, dict):
+        return None
+    for key, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(r, dict) for r in value):
+            return key
+    return None
+
+
+def encode(data):
+    """
+    将普通JSON结构编码为紧凑格式结构
+    
+    Args:
+        data: 快照数据（如 {'projects': [...]}）
+        
+    Returns:
+        dict: 紧凑格式数据；数据中没有记录列表时原样返回
+    """
+    key = _find_records_key(data)
+    if key is None:
+        return data
+    
+    records = data[key]
+    
+    # 字段顺序取所有记录键的并集（按首次出现顺序）
+    fields = []
+    seen = set()
+    for record in records:
+        for field in record:
+            if field not in seen:
+                seen.add(field)
+                fields.append(field)
+    
+    dict_fields = [f for f in DICTIONARY_FIELDS if f in seen]
+    dictionaries = {f: [] for f in dict_fields}
+    lookups = {f: {} for f in dict_fields}
+    dict_positions = [(fields.index(f), dictionaries[f], lookups[f]) for f in dict_fields]
+    field_count = len(fields)
+    
+    rows = []
+    for record in records:
+        if len(record) != field_count:
+            # 字段不齐全的旧记录原样保存，保证读回后与原数据完全一致
+            rows.append(record)
+            continue
+        row = [record[f] for f in fields]
+        for position, values, lookup in dict_positions:
+            value = row[position]
+            index = lookup.get(value)
+            if index is None:
+                index = lookup[value] = len(values)
+                values.append(value)
+            row[position] = index
+        rows.append(row)
+    
+    return {
+        '__format__': FORMAT_MARKER,
+        'version': FORMAT_VERSION,
+        'key': key,
+        'extra': {k: v for k, v in data.items() if k != key},
+        'fields': fields,
+        'dictionaries': dictionaries,
+        'rows': rows
+    }
+
+
+def decode(data):
+    """
+    将紧凑格式结构解码为普通JSON结构
+    
+    Args:
+        data: 解析后的文件内容
+        
+    Returns:
+        dict: 普通JSON结构；非紧凑格式的数据原样返回
+        
+    Raises:
+        ValueError: 紧凑格式版本不受支持
+    """
+    if not isinstance(data, dict) or data.get('__format__') != FORMAT_MARKER:
+        return data
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError(f"不支持的紧凑格式版本: {data.get('version')}")
+    
+    fields = data['fields']
+    dict_positions = [
+        (fields.index(f), values) for f, values in data['dictionaries'].items()
+    ]
+    
+    records = []
+    append = records.append
+    for row in data['rows']:
+        if type(row) is dict:
+            append(row)
+            continue
+        for position, values in dict_positions:
+            row[position] = values[row[position]]
+        append(dict(zip(fields, row)))
+    
+    result = dict(data.get('extra', {}))
+    result[data['key']] = records
+    return result
+
+
+def dumps(data, fmt='json'):
+    """
+    按指定格式序列化数据
+    
+    Args:
+        data: 要写入的数据
+        fmt: 格式（json / compact / compact-gzip）
+        
+    Returns:
+        bytes: 序列化后的文件内容
+        
+    Raises:
+        ValueError: 格式不受支持
+    """
+    if fmt == 'json':
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的数据文件格式: {fmt}（可选值: {', '.join(FORMATS)}）")
+    
+    payload = json.dumps(encode(data), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if fmt == 'compact-gzip':
+        # mtime固定为0，内容相同的快照字节也相同
+        payload = gzip.compress(payload, compresslevel=_GZIP_LEVEL, mtime=0)
+    return payload
+
+
+def loads(raw):
+    """
+    解析文件内容，自动识别gzip压缩和紧凑格式
+    
+    Args:
+        raw: 文件内容（bytes）
+        
+    Returns:
+        普通JSON结构的数据
+        
+    Raises:
+        json.JSONDecodeError: JSON格式错误
+    """
+    if raw[:2] == _GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return decode(json.loads(raw))
+
+
+def detect_format(raw):
+    """
+    识别文件内容的格式
+    
+    Args:
+        raw: 文件内容（bytes）
+        
+    Returns:
+        str: json / compact / compact-gzip
+    """
+    if raw[:2] == _GZIP_MAGIC:
+        return 'compact-gzip'
+    head = raw[:64].lstrip()
+    if head.startswith(b'{"__format__":"' + FORMAT_MARKER.encode()):
+        return 'compact'
+    return 'json'
+
+
+def convert_file(filepath, fmt):
+    """
+    将数据文件转换为指定格式（通过file_handler写入，持锁并原子替换）
+    
+    Args:
+        filepath: 数据文件路径
+        fmt: 目标格式
+        
+    Returns:
+        tuple: (转换前字节数, 转换后字节数)
+    """
+    from utils.file_handler import read_json_file, write_json_file
+    
+    before = os.path.getsize(filepath)
+    data = read_json_file(filepath)
+    write_json_file(filepath, data, fmt=fmt)
+    return before, os.path.getsize(filepath)
+
+
+def _generate_projects(count):
+    """
+    生成基准测试用的项目数据
+    
+    Args:
+        count: 项目数量
+        
+    Returns:
+        dict: {'projects': [...]}
+    """
+    statuses = ['规划', '方案', '设计', '开发', '测试', '已上', '暂停']
+    projects = []
+    for i in range(count):
+        projects.append({
+            'id': f'proj-{i:08d}-0000-4000-8000-000000000000',
+            'name': f'项目{i}',
+            'productLineId': f'pl-{i % 40:04d}-0000-4000-8000-000000000000',
+            'ownerId': f'owner-{i % 200:04d}-0000-4000-8000-000000000000',
+            'isPending': i % 9 == 0,
+            'startDate': f'20{20 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            'endDate': f'20{21 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            'status': statuses[i % len(statuses)],
+            'remarks': '' if i % 3 else '备注信息',
+            'createdAt': 1700000000000 + i,
+            'updatedAt': 1700000000000 + i * 7
+        })
+    return {'projects': projects}
+
+
+def benchmark(counts, repeat=3):
+    """
+    对比各格式的文件大小和冷加载耗时
+    
+    Args:
+        counts: 项目数量列表（如 [10000, 100000]）
+        repeat: 每项重复次数（取最小值）
+        
+    Returns:
+        list: [(项目数, 格式, 字节数, 加载毫秒数), ...]
+    """
+    import time
+    
+    results = []
+    for count in counts:
+        data = _generate_projects(count)
+        for fmt in FORMATS:
+            raw = dumps(data, fmt)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                loaded = loads(raw)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            assert loaded == data
+            results.append((count, fmt, len(raw), best * 1000))
+    return results
+
+
+def main(argv):
+    """
+    命令行入口
+    
+    Args:
+        argv: 命令行参数（不含程序名）
+        
+    Returns:
+        int: 退出码
+    """
+    if len(argv) >= 3 and argv[0] == 'convert':
+        fmt = argv[1]
+        if fmt not in FORMATS:
+            print(f"不支持的格式: {fmt}（可选值: {', '.join(FORMATS)}）")
+            return 1
+        for filepath in argv[2:]:
+            before, after = convert_file(filepath, fmt)
+            print(f"{filepath}: {before} -> {after} 字节（{fmt}）")
+        return 0
+    
+    if argv and argv[0] == 'bench':
+        counts = [int(c) for c in argv[1:]] or [10000, 100000]
+        print(f"{'项目数':>8}  {'格式':<14}{'大小(KB)':>12}{'冷加载(ms)':>12}")
+        for count, fmt, size, millis in benchmark(counts):
+            print(f"{count:>10}  {fmt:<14}{size / 1024:>12.1f}{millis:>12.1f}")
+        return 0
+    
+    print(__doc__)
+    return 1
+
+
+if __name__ == '__main__':
+    # 添加项目根目录到Python路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,130 @@
+"""
+项目排序索引模块
+按某个字段维护项目的有序键列表 [(字段值, 项目ID), ...]，用于项目列表的游标
+分页（keyset分页）
+
+- 键由字段值和项目ID组成，字段值相同的项目按ID排序，顺序是稳定的全序
+- 游标记录上一页最后一个项目的键，下一页从该键之后开始（二分查找定位），
+  第N页的开销与第1页相同；翻页期间其他用户的写入不会使未修改的项目重复或
+  遗漏
+- 索引不可变，修改时返回新的索引（数据集的每个版本各自持有一个索引，见
+  utils/dataset.py），一次写入只在复制的键列表上删除和插入变化的项目
+"""
+from bisect import bisect_left, bisect_right
+
+# 可排序的字段及其缺省值（字段缺失或类型不符时使用，保证键之间可以比较）
+SORT_FIELDS = {
+    'startDate': '',
+    'endDate': '',
+    'updatedAt': 0,
+    'createdAt': 0,
+    'name': ''
+}
+
+
+def sort_key(record, field):
+    """
+    获取项目在排序索引中的键
+    
+    Args:
+        record: 项目字典
+        field: 排序字段（SORT_FIELDS之一）
+        
+    Returns:
+        tuple: (字段值, 项目ID)
+    """
+    default = SORT_FIELDS[field]
+    value = record.get(field, default)
+    if type(value) is not type(default):
+        value = default
+    return value, record['id']
+
+
+def valid_key(key, field):
+    """
+    判断键是否可以与该字段的排序索引比较（用于校验客户端传回的游标）
+    
+    Args:
+        key: 键 (字段值, 项目ID)
+        field: 排序字段
+        
+    Returns:
+        bool: 可以比较返回True
+    """
+    return (
+        isinstance(key, tuple) and len(key) == 2
+        and type(key[0]) is type(SORT_FIELDS[field])
+        and isinstance(key[1], str)
+    )
+
+
+class SortedIndex:
+    """
+    项目排序索引（不可变）
+    
+    Attributes:
+        field: 排序字段
+    """
+    
+    __slots__ = ('field', '_keys')
+    
+    def __init__(self, field, keys):
+        self.field = field
+        self._keys = keys
+    
+    @classmethod
+    def build(cls, records, field):
+        """
+        从项目列表构建索引
+        
+        Args:
+            records: 项目字典列表
+            field: 排序字段
+            
+        Returns:
+            SortedIndex: 排序索引
+        """
+        return cls(field, sorted(sort_key(record, field) for record in records))
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def with_changes(self, removed, added):
+        """
+        返回应用修改后的新索引（本索引不变）
+        
+        Args:
+            removed: 删除或被修改前的项目字典列表
+            added: 新增或修改后的项目字典列表
+            
+        Returns:
+            SortedIndex: 新索引
+        """
+        keys = list(self._keys)
+        for record in removed:
+            key = sort_key(record, self.field)
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        for record in added:
+            key = sort_key(record, self.field)
+            keys.insert(bisect_left(keys, key), key)
+        return SortedIndex(self.field, keys)
+    
+    def keys_after(self, after=None, descending=False):
+        """
+        从游标位置开始依次返回键
+        
+        Args:
+            after: 上一页最后一个项目的键（可选，不提供则从头开始）
+            descending: 是否按降序
+            
+        Returns:
+            iterator: 键 (字段值, 项目ID) 的迭代器
+        """
+        keys = self._keys
+        if descending:
+            stop = len(keys) if after is None else bisect_left(keys, after)
+            return (keys[i] for i in range(stop - 1, -1, -1))
+        start = 0 if after is None else bisect_right(keys, after)
+        return (keys[i] for i in range(start, len(keys)))
@@ -0,0 +1,712 @@
+"""
+SQLite存储工具模块
+为项目、人员、产品线和设置提供基于标准库sqlite3的可选存储后端
+
+- 数据库使用WAL模式，读写互不阻塞，支持多个编辑者并发写入
+- 每个线程使用独立的连接（threading.local）
+- projects表在productLineId、ownerId、status、startDate、endDate上建有索引，
+  关联项目数量统计是走索引的COUNT查询，不再全量扫描
+- 项目修改的历史版本在修改所在的写事务中插入project_history表，与修改
+  一起提交
+
+通过环境变量 ROADMAP_STORAGE_BACKEND=sqlite 启用，
+首次启用前使用 utils/migrate_sqlite.py 从JSON文件导入数据。
+"""
+import copy
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import config
+from utils import generation
+from utils.file_handler import get_data_file_path
+
+# 项目字段（与Project.to_dict的字段顺序一致）
+PROJECT_COLUMNS = [
+    'id', 'name', 'productLineId', 'ownerId', 'isPending', 'startDate',
+    'endDate', 'status', 'remarks', 'createdAt', 'updatedAt'
+]
+
+# 允许按字段统计的项目列（均建有索引）
+INDEXED_PROJECT_COLUMNS = ['productLineId', 'ownerId', 'status', 'startDate', 'endDate']
+
+OWNER_COLUMNS = ['id', 'name', 'color', 'createdAt', 'visible']
+PRODUCTLINE_COLUMNS = ['id', 'name', 'createdAt', 'order']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    productLineId TEXT NOT NULL,
+    ownerId TEXT,
+    isPending INTEGER NOT NULL DEFAULT 0,
+    startDate TEXT NOT NULL,
+    endDate TEXT NOT NULL,
+    status TEXT NOT NULL,
+    remarks TEXT,
+    createdAt INTEGER,
+    updatedAt INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_projects_productLineId ON projects (productLineId);
+CREATE INDEX IF NOT EXISTS idx_projects_ownerId ON projects (ownerId);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects (status);
+CREATE INDEX IF NOT EXISTS idx_projects_startDate ON projects (startDate);
+CREATE INDEX IF NOT EXISTS idx_projects_endDate ON projects (endDate);
+
+CREATE TABLE IF NOT EXISTS owners (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    color TEXT,
+    createdAt INTEGER,
+    visible INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS productlines (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    createdAt INTEGER,
+    "order" INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS archived_projects (
+    id TEXT PRIMARY KEY,
+    year INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archived_projects_year ON archived_projects (year);
+
+CREATE TABLE IF NOT EXISTS project_history (
+    seq INTEGER PRIMARY KEY,
+    record_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    checkpoint INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (record_id, version)
+);
+'''
+
+# 每个线程一个连接
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def get_db_path():
+    """
+    获取SQLite数据库文件路径
+    
+    Returns:
+        str: 数据库文件完整路径
+    """
+    return get_data_file_path(config.SQLITE_DB_NAME)
+
+
+def get_connection(db_path=None):
+    """
+    获取当前线程的数据库连接（首次调用时创建并初始化表结构）
+    
+    Args:
+        db_path: 数据库文件路径（可选，默认使用get_db_path()）
+        
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    db_path = db_path or get_db_path()
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    
+    conn = connections.get(db_path)
+    if conn is None:
+        # isolation_level=None：由代码显式控制事务
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with _schema_lock:
+            if db_path not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready.add(db_path)
+        connections[db_path] = conn
+    return conn
+
+
+class _WriteTransaction:
+    """
+    写事务上下文：BEGIN IMMEDIATE 立即获取写锁，正常退出提交，异常回滚
+    提交后递增数据库文件的共享写入代数（见 utils/generation.py）
+    """
+    
+    def __init__(self, conn, db_path):
+        self.conn = conn
+        self.db_path = db_path
+    
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+            generation.bump(self.db_path)
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+def write_transaction(db_path=None):
+    """
+    开启写事务
+    
+    Args:
+        db_path: 数据库文件路径（可选）
+        
+    Returns:
+        _WriteTransaction: 事务上下文管理器
+    """
+    db_path = db_path or get_db_path()
+    return _WriteTransaction(get_connection(db_path), db_path)
+
+
+def _project_from_row(row):
+    """
+    将projects表的一行转换为项目字典
+    
+    Args:
+        row: 按PROJECT_COLUMNS顺序的元组
+        
+    Returns:
+        dict: 项目数据字典
+    """
+    project = dict(zip(PROJECT_COLUMNS, row))
+    project['isPending'] = bool(project['isPending'])
+    return project
+
+
+def _project_to_row(project):
+    """
+    将项目字典转换为projects表的一行
+    
+    Args:
+        project: 项目数据字典
+        
+    Returns:
+        tuple: 按PROJECT_COLUMNS顺序的值
+    """
+    row = [project.get(column) for column in PROJECT_COLUMNS]
+    row[PROJECT_COLUMNS.index('isPending')] = 1 if project.get('isPending') else 0
+    if row[PROJECT_COLUMNS.index('remarks')] is None:
+        row[PROJECT_COLUMNS.index('remarks')] = ''
+    return tuple(row)
+
+
+_PROJECT_SELECT = 'SELECT {} FROM projects'.format(', '.join(PROJECT_COLUMNS))
+_PROJECT_UPSERT = 'INSERT INTO projects ({}) VALUES ({}) ON CONFLICT(id) DO UPDATE SET {}'.format(
+    ', '.join(PROJECT_COLUMNS),
+    ', '.join('?' for _ in PROJECT_COLUMNS),
+    ', '.join(f'{c} = excluded.{c}' for c in PROJECT_COLUMNS if c != 'id')
+)
+
+
+def _insert_history(conn, entries):
+    """
+    插入历史版本（在调用方的写事务中）
+    
+    Args:
+        conn: 数据库连接
+        entries: 历史版本列表
+    """
+    conn.executemany(
+        'INSERT INTO project_history (record_id, version, ts, op, checkpoint, data) VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (e['id'], e['v'], e['ts'], e['op'], int('record' in e), json.dumps(e, ensure_ascii=False))
+            for e in entries
+        ]
+    )
+
+
+def _record_history(conn, history, record_id, current, record):
+    """
+    在写事务中计算并插入一次修改的历史版本
+    
+    Args:
+        conn: 数据库连接
+        history: 历史回调 (项目ID, 修改前, 修改后) -> 历史版本或None（可以为None）
+        record_id: 项目ID
+        current: 修改前的项目（不存在为None）
+        record: 修改后的项目（删除为None）
+    """
+    if history is None:
+        return
+    entry = history(record_id, current, record)
+    if entry is not None:
+        _insert_history(conn, [entry])
+
+
+class SqliteProjectStore:
+    """
+    基于SQLite的项目存储
+    接口与JournaledCollection一致，供ProjectService使用
+    """
+    
+    def __init__(self, db_path=None):
+        """
+        初始化项目存储
+        
+        Args:
+            db_path: 数据库文件路径（可选）
+        """
+        self.db_path = db_path
+    
+    def values(self):
+        """
+        获取全部项目（按创建顺序）
+        
+        Returns:
+            list: 项目字典列表
+        """
+        conn = get_connection(self.db_path)
+        rows = conn.execute(_PROJECT_SELECT + ' ORDER BY rowid').fetchall()
+        return [_project_from_row(row) for row in rows]
+    
+    def get(self, record_id):
+        """
+        根据ID获取项目（主键查询）
+        
+        Args:
+            record_id: 项目ID
+            
+        Returns:
+            dict: 项目数据，不存在返回None
+        """
+        conn = get_connection(self.db_path)
+        row = conn.execute(_PROJECT_SELECT + ' WHERE id = ?', (record_id,)).fetchone()
+        return _project_from_row(row) if row else None
+    
+    def put(self, record, op='update', history=None):
+        """
+        写入（新增或替换）一个项目，已存在的项目保持原有顺序
+        
+        Args:
+            record: 完整项目字典
+            op: 操作类型（与JournaledCollection接口保持一致，此处不区分）
+            history: 历史回调（可选，见 JournaledCollection.put）
+        """
+        with write_transaction(self.db_path) as conn:
+            if history is not None:
+                row = conn.execute(_PROJECT_SELECT + ' WHERE id = ?', (record['id'],)).fetchone()
+                _record_history(conn, history, record['id'], _project_from_row(row) if row else None, record)
+            conn.execute(_PROJECT_UPSERT, _project_to_row(record))
+    
+    def modify(self, record_id, fn, history=None):
+        """
+        在同一个写事务内读取、修改并写回一个项目，数据没有变化时不写入
+        
+        Args:
+            record_id: 项目ID
+            fn: 修改函数，接收当前项目的副本，返回修改后的完整项目字典
+            history: 历史回调（可选，见 JournaledCollection.put）
+            
+        Returns:
+            dict: 修改后的项目，项目不存在返回None
+        """
+        with write_transaction(self.db_path) as conn:
+            row = conn.execute(_PROJECT_SELECT + ' WHERE id = ?', (record_id,)).fetchone()
+            if row is None:
+                return None
+            current = _project_from_row(row)
+            record = fn(dict(current))
+            if record != current:
+                _record_history(conn, history, record_id, current, record)
+                conn.execute(_PROJECT_UPSERT, _project_to_row(record))
+        return record
+    
+    def remove(self, record_id, history=None):
+        """
+        删除一个项目
+        
+        Args:
+            record_id: 项目ID
+            history: 历史回调（可选，见 JournaledCollection.put）
+            
+        Returns:
+            bool: 删除成功返回True，项目不存在返回False
+        """
+        with write_transaction(self.db_path) as conn:
+            cursor = conn.execute('DELETE FROM projects WHERE id = ?', (record_id,))
+            if cursor.rowcount > 0:
+                _record_history(conn, history, record_id, None, None)
+        return cursor.rowcount > 0
+    
+    def count_by(self, field, value):
+        """
+        统计指定字段等于指定值的项目数量（走索引的COUNT查询）
+        
+        Args:
+            field: 字段名（必须是INDEXED_PROJECT_COLUMNS之一）
+            value: 字段值
+            
+        Returns:
+            int: 项目数量
+            
+        Raises:
+            ValueError: 字段不支持统计
+        """
+        if field not in INDEXED_PROJECT_COLUMNS:
+            raise ValueError(f"不支持按字段统计: {field}")
+        conn = get_connection(self.db_path)
+        return conn.execute(f'SELECT COUNT(*) FROM projects WHERE {field} = ?', (value,)).fetchone()[0]
+    
+    def source_files(self):
+        """
+        获取数据库文件（用于检测数据变化，WAL模式下提交只修改-wal文件）
+        
+        Returns:
+            list: 数据库文件和WAL文件的路径
+        """
+        db_path = self.db_path or get_db_path()
+        return [db_path, db_path + '-wal']
+    
+    def compact(self):
+        """
+        与JournaledCollection接口保持一致（SQLite由自身的WAL检查点处理，无需压缩）
+        """
+    
+    def replace_all(self, records):
+        """
+        用给定列表替换全部项目（导入数据时使用）
+        
+        Args:
+            records: 项目字典列表
+        """
+        with write_transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM projects')
+            conn.executemany(_PROJECT_UPSERT, [_project_to_row(r) for r in records])
+
+
+class SqliteArchiveStore:
+    """
+    基于SQLite的项目归档分区（archived_projects表，按年份建索引）
+    接口与 utils/archive.py 中的FileArchiveStore一致
+    """
+    
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: 数据库文件路径（可选）
+        """
+        self.db_path = db_path
+    
+    def years(self):
+        """获取所有归档年份（升序）"""
+        conn = get_connection(self.db_path)
+        return [row[0] for row in conn.execute('SELECT DISTINCT year FROM archived_projects ORDER BY year')]
+    
+    def values(self, year):
+        """读取一个年份的归档项目"""
+        conn = get_connection(self.db_path)
+        rows = conn.execute('SELECT data FROM archived_projects WHERE year = ? ORDER BY id', (year,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def put(self, year, records):
+        """把项目写入归档（按ID新增或替换）"""
+        with write_transaction(self.db_path) as conn:
+            conn.executemany(
+                'INSERT INTO archived_projects (id, year, data) VALUES (?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET year = excluded.year, data = excluded.data',
+                [(r['id'], year, json.dumps(r, ensure_ascii=False)) for r in records]
+            )
+    
+    def remove(self, year, ids):
+        """从归档中删除项目，返回实际删除的数量"""
+        with write_transaction(self.db_path) as conn:
+            return sum(
+                conn.execute('DELETE FROM archived_projects WHERE year = ? AND id = ?', (year, i)).rowcount
+                for i in ids
+            )
+    
+    def count_by(self, field, value):
+        """统计归档中指定字段等于指定值的项目数量"""
+        if field not in INDEXED_PROJECT_COLUMNS:
+            raise ValueError(f"不支持按字段统计: {field}")
+        conn = get_connection(self.db_path)
+        return conn.execute(
+            'SELECT COUNT(*) FROM archived_projects WHERE json_extract(data, ?) = ?', (f'$.{field}', value)
+        ).fetchone()[0]
+    
+    def replace_all(self, partitions):
+        """用给定的分区替换全部归档（导入数据时使用），partitions为 {年份: 项目列表}"""
+        with write_transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM archived_projects')
+            conn.executemany(
+                'INSERT INTO archived_projects (id, year, data) VALUES (?, ?, ?)',
+                [
+                    (r['id'], year, json.dumps(r, ensure_ascii=False))
+                    for year, records in partitions.items() for r in records
+                ]
+            )
+    
+    def find(self, record_id):
+        """查找归档中的项目，返回 (年份, 项目字典)，不存在返回 (None, None)"""
+        conn = get_connection(self.db_path)
+        row = conn.execute('SELECT year, data FROM archived_projects WHERE id = ?', (record_id,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+
+class SqliteHistoryStore:
+    """
+    基于SQLite的项目变更历史（project_history表，按项目ID和版本号唯一）
+    接口与 utils/history.py 中的FileHistoryStore一致，读取键为seq
+    """
+    
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: 数据库文件路径（可选）
+        """
+        self.db_path = db_path
+        self.lock_path = (db_path or get_db_path()) + '.history'
+    
+    def append(self, entries):
+        """追加版本（调用方持有历史锁）"""
+        if not entries:
+            return
+        with write_transaction(self.db_path) as conn:
+            _insert_history(conn, entries)
+    
+    def replace_all(self, entries):
+        """用给定的版本替换全部历史（导入数据时使用）"""
+        with write_transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM project_history')
+            _insert_history(conn, entries)
+    
+    def sync(self):
+        """与FileHistoryStore接口保持一致（历史与项目在同一个事务中提交，无需同步）"""
+    
+    def truncate(self, cutoff):
+        """
+        截断早于cutoff的版本（见 utils/history.py 的 truncation），在一个写事务中
+        计算并替换，期间的项目修改等待事务完成
+        
+        Args:
+            cutoff: 毫秒时间戳
+            
+        Returns:
+            int: 删除的版本数量
+        """
+        from utils.history import truncation
+        
+        with write_transaction(self.db_path) as conn:
+            kept = truncation(self, cutoff)
+            if kept is None:
+                return 0
+            before = conn.execute('SELECT COUNT(*) FROM project_history').fetchone()[0]
+            conn.execute('DELETE FROM project_history')
+            _insert_history(conn, kept)
+        return before - len(kept)
+    
+    def meta(self, record_id):
+        """获取项目的版本元数据：按版本号升序的 (版本号, 时间戳, 操作, 是否检查点, seq)"""
+        conn = get_connection(self.db_path)
+        rows = conn.execute(
+            'SELECT version, ts, op, checkpoint, seq FROM project_history WHERE record_id = ? ORDER BY version',
+            (record_id,)
+        )
+        return [(version, ts, op, bool(checkpoint), seq) for version, ts, op, checkpoint, seq in rows]
+    
+    def record_ids(self):
+        """获取有历史的全部项目ID"""
+        conn = get_connection(self.db_path)
+        return [row[0] for row in conn.execute('SELECT DISTINCT record_id FROM project_history')]
+    
+    def first_ts(self):
+        """获取最早版本的时间戳，没有历史时返回None"""
+        conn = get_connection(self.db_path)
+        return conn.execute('SELECT MIN(ts) FROM project_history').fetchone()[0]
+    
+    def read(self, keys):
+        """读取版本内容（与keys顺序一致）"""
+        conn = get_connection(self.db_path)
+        entries = {}
+        unique = sorted(set(keys))
+        # 分批查询，避免超出SQLite的参数数量上限
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            rows = conn.execute(
+                'SELECT seq, data FROM project_history WHERE seq IN ({})'.format(', '.join('?' * len(batch))),
+                batch
+            )
+            entries.update((seq, json.loads(data)) for seq, data in rows)
+        return [entries[key] for key in keys]
+
+
+def _quote(column):
+    """为列名加引号（order是SQL关键字）"""
+    return f'"{column}"'
+
+
+def read_document(name, db_path=None):
+    """
+    以JSON文件相同的结构读取人员、产品线或设置数据
+    
+    Args:
+        name: 文档名（owners、productlines或settings）
+        db_path: 数据库文件路径（可选）
+        
+    Returns:
+        dict: 与对应JSON文件结构相同的数据；settings未保存过时返回None
+    """
+    return _read_document_rows(get_connection(db_path), name)
+
+
+def _read_document_rows(conn, name):
+    """
+    从数据库连接读取文档数据
+    
+    Args:
+        conn: 数据库连接
+        name: 文档名
+        
+    Returns:
+        dict: 与对应JSON文件结构相同的数据；settings未保存过时返回None
+    """
+    if name == 'settings':
+        rows = conn.execute('SELECT key, value FROM settings').fetchall()
+        if not rows:
+            return None
+        return {key: json.loads(value) for key, value in rows}
+    
+    columns = _document_columns(name)
+    rows = conn.execute(
+        'SELECT {} FROM {} ORDER BY position'.format(', '.join(_quote(c) for c in columns), name)
+    ).fetchall()
+    records = [dict(zip(columns, row)) for row in rows]
+    if name == 'owners':
+        for owner in records:
+            owner['visible'] = bool(owner['visible'])
+    return {name: records}
+
+
+def write_document(name, data, db_path=None):
+    """
+    以JSON文件相同的结构整体写入人员、产品线或设置数据
+    （人员和产品线数据量很小，整体替换即可）
+    
+    Args:
+        name: 文档名（owners、productlines或settings）
+        data: 与对应JSON文件结构相同的数据
+        db_path: 数据库文件路径（可选）
+    """
+    with write_transaction(db_path) as conn:
+        _write_document_rows(conn, name, data)
+
+
+def _write_document_rows(conn, name, data):
+    """
+    在写事务中整体替换文档数据
+    
+    Args:
+        conn: 处于写事务中的数据库连接
+        name: 文档名
+        data: 与对应JSON文件结构相同的数据
+    """
+    if name == 'settings':
+        conn.execute('DELETE FROM settings')
+        conn.executemany(
+            'INSERT INTO settings (key, value) VALUES (?, ?)',
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in data.items()]
+        )
+        return
+    
+    columns = _document_columns(name)
+    conn.execute(f'DELETE FROM {name}')
+    conn.executemany(
+        'INSERT INTO {} (position, {}) VALUES (?, {})'.format(
+            name,
+            ', '.join(_quote(c) for c in columns),
+            ', '.join('?' for _ in columns)
+        ),
+        [
+            (position,) + tuple(_document_value(record, c) for c in columns)
+            for position, record in enumerate(data.get(name, []))
+        ]
+    )
+
+
+@contextmanager
+def document_transaction(name, default=None, db_path=None):
+    """
+    文档的读取-修改-写回事务，与 file_handler.transaction 用法相同
+    读取和写回在同一个 BEGIN IMMEDIATE 事务中完成，数据没有变化时不写入
+    
+    Args:
+        name: 文档名（owners、productlines或settings）
+        default: settings尚未保存过时使用的初始数据（可选）
+        db_path: 数据库文件路径（可选）
+        
+    Yields:
+        dict: 可修改的数据
+        
+    Raises:
+        FileNotFoundError: settings尚未保存过且未提供default
+    """
+    with write_transaction(db_path) as conn:
+        original = _read_document_rows(conn, name)
+        if original is None and default is None:
+            raise FileNotFoundError(f"数据不存在: {name}")
+        
+        data = copy.deepcopy(default if original is None else original)
+        yield data
+        
+        if original is None or data != original:
+            _write_document_rows(conn, name, data)
+
+
+def _document_columns(name):
+    """
+    获取文档对应的列名
+    
+    Args:
+        name: 文档名
+        
+    Returns:
+        list: 列名列表
+        
+    Raises:
+        ValueError: 未知的文档名
+    """
+    if name == 'owners':
+        return OWNER_COLUMNS
+    if name == 'productlines':
+        return PRODUCTLINE_COLUMNS
+    raise ValueError(f"未知的数据类型: {name}")
+
+
+def _document_value(record, column):
+    """
+    读取记录字段并转换为数据库存储值
+    
+    Args:
+        record: 记录字典
+        column: 列名
+        
+    Returns:
+        字段值（布尔值转换为整数）
+    """
+    value = record.get(column)
+    if column == 'visible':
+        return 0 if value is False else 1
+    if column == 'order' and value is None:
+        return 0
+    return value
@@ -0,0 +1,248 @@
+"""
+延迟写入（write-behind）工具模块
+按文件配置持久化策略，并由后台刷盘线程统一落盘
+
+持久化策略：
+- sync：写入方等待数据落盘后才返回（默认）
+- interval：内存中的数据立即生效并返回，由后台线程按时间间隔或
+  脏数据数量阈值落盘；进程崩溃时最多丢失一个间隔内的修改
+- on-shutdown：只在进程正常退出（或显式调用flush_all）时落盘
+
+策略通过环境变量 ROADMAP_WRITE_DURABILITY 配置，逗号分隔，不带等号的项
+为默认策略，"文件名模式=策略" 为单个文件的策略，例如：
+    ROADMAP_WRITE_DURABILITY="sync,settings.json=interval,shard-*.json=interval"
+
+延迟落盘的数据只在本进程内立即可见，多worker进程部署时应使用sync。
+进程收到退出信号或正常退出时会刷写全部脏数据（见app.py）。
+"""
+import atexit
+import fnmatch
+import os
+import threading
+import time
+
+import config
+
+# 脏数据表：{键: _DirtyEntry}
+_dirty = {}
+_cond = threading.Condition(threading.Lock())
+
+_flusher = None
+_flusher_pid = None
+_stopping = False
+_atexit_registered = False
+
+_stats = {
+    'flushes': 0,
+    'errors': 0,
+    'lastFlushLagMs': 0.0,
+    'maxFlushLagMs': 0.0
+}
+
+
+class _DirtyEntry:
+    """
+    一个待落盘的脏数据项
+    
+    Attributes:
+        flush: 落盘函数（无参数，失败时抛出异常）
+        mode: 持久化策略（interval或on-shutdown）
+        since: 最早一次未落盘修改的时间（time.monotonic()）
+        count: 未落盘的修改次数
+    """
+    
+    def __init__(self, flush, mode):
+        self.flush = flush
+        self.mode = mode
+        self.since = time.monotonic()
+        self.count = 0
+
+
+def get_durability(filepath):
+    """
+    获取文件的持久化策略
+    
+    Args:
+        filepath: 文件路径
+        
+    Returns:
+        str: sync / interval / on-shutdown
+    """
+    name = os.path.basename(filepath)
+    for pattern, mode in config.WRITE_DURABILITY_OVERRIDES:
+        if fnmatch.fnmatch(name, pattern):
+            return mode
+    return config.WRITE_DURABILITY
+
+
+def mark_dirty(key, flush, mode):
+    """
+    登记一项待落盘的修改
+    
+    同一个键在落盘前多次登记只会落盘一次（flush函数应写入最新数据）。
+    
+    Args:
+        key: 脏数据项的键（通常为文件路径）
+        flush: 落盘函数
+        mode: 持久化策略（interval或on-shutdown）
+    """
+    with _cond:
+        _ensure_flusher()
+        entry = _dirty.get(key)
+        if entry is None:
+            entry = _dirty[key] = _DirtyEntry(flush, mode)
+        entry.flush = flush
+        entry.mode = mode
+        entry.count += 1
+        if mode == 'interval' and _interval_dirty_count() >= config.FLUSH_DIRTY_THRESHOLD:
+            # 脏数据达到阈值，立即唤醒刷盘线程
+            _cond.notify_all()
+
+
+def _interval_dirty_count():
+    """
+    统计按间隔落盘的未落盘修改次数（调用方需持有_cond）
+    
+    Returns:
+        int: 修改次数
+    """
+    return sum(e.count for e in _dirty.values() if e.mode == 'interval')
+
+
+def _ensure_flusher():
+    """
+    确保后台刷盘线程正在运行（调用方需持有_cond）
+    fork出的子进程不会继承父进程的线程，因此按pid检查
+    """
+    global _flusher, _flusher_pid, _atexit_registered
+    
+    if _flusher is not None and _flusher_pid == os.getpid() and _flusher.is_alive():
+        return
+    
+    _flusher = threading.Thread(target=_flush_loop, name='write-behind-flusher', daemon=True)
+    _flusher_pid = os.getpid()
+    _flusher.start()
+    
+    if not _atexit_registered:
+        atexit.register(shutdown)
+        _atexit_registered = True
+
+
+def _flush_loop():
+    """
+    后台刷盘线程：每个间隔检查一次，脏数据达到阈值时被提前唤醒
+    """
+    while True:
+        with _cond:
+            if _stopping:
+                return
+            # 睡到最早的脏数据到期为止，最长一个间隔
+            oldest = min((e.since for e in _dirty.values() if e.mode == 'interval'), default=None)
+            timeout = config.FLUSH_INTERVAL
+            if oldest is not None:
+                timeout = max(0.0, oldest + config.FLUSH_INTERVAL - time.monotonic())
+            _cond.wait(timeout=timeout)
+            if _stopping:
+                return
+            now = time.monotonic()
+            over_threshold = _interval_dirty_count() >= config.FLUSH_DIRTY_THRESHOLD
+            due = [
+                key for key, entry in _dirty.items()
+                if entry.mode == 'interval'
+                and (over_threshold or now - entry.since >= config.FLUSH_INTERVAL)
+            ]
+        _flush_keys(due)
+
+
+def _flush_keys(keys):
+    """
+    落盘指定的脏数据项，失败的项保留在脏数据表中等待下次重试
+    
+    Args:
+        keys: 脏数据项的键列表
+        
+    Returns:
+        list: 落盘失败的 (键, 异常) 列表
+    """
+    failed = []
+    for key in keys:
+        with _cond:
+            entry = _dirty.pop(key, None)
+        if entry is None:
+            continue
+        
+        try:
+            entry.flush()
+        except Exception as e:
+            print(f"延迟写入落盘失败: {key}: {str(e)}")
+            failed.append((key, e))
+            with _cond:
+                _stats['errors'] += 1
+                # 重新登记，保留最早的修改时间以便如实反映落盘延迟
+                current = _dirty.get(key)
+                if current is None:
+                    _dirty[key] = entry
+                else:
+                    current.since = min(current.since, entry.since)
+                    current.count += entry.count
+            continue
+        
+        lag_ms = (time.monotonic() - entry.since) * 1000
+        with _cond:
+            _stats['flushes'] += 1
+            _stats['lastFlushLagMs'] = round(lag_ms, 2)
+            _stats['maxFlushLagMs'] = round(max(_stats['maxFlushLagMs'], lag_ms), 2)
+    return failed
+
+
+def flush_all():
+    """
+    立即落盘全部脏数据（包括on-shutdown策略的数据）
+    
+    Returns:
+        bool: 全部落盘成功返回True
+    """
+    with _cond:
+        keys = list(_dirty.keys())
+    return not _flush_keys(keys)
+
+
+def shutdown():
+    """
+    停止后台刷盘线程并落盘全部脏数据（进程退出时调用）
+    """
+    global _stopping
+    
+    with _cond:
+        _stopping = True
+        _cond.notify_all()
+        flusher = _flusher if _flusher_pid == os.getpid() else None
+    if flusher is not None and flusher is not threading.current_thread():
+        flusher.join(timeout=config.LOCK_TIMEOUT)
+    if not flush_all():
+        print("警告：部分延迟写入的数据未能落盘")
+    with _cond:
+        _stopping = False
+
+
+def get_write_behind_stats():
+    """
+    获取延迟写入统计信息
+    
+    Returns:
+        dict: 包含dirty（未落盘项数）、pendingWrites（未落盘修改次数）、
+              flushLagMs（最早一次未落盘修改至今的毫秒数）、lastFlushLagMs、
+              maxFlushLagMs（从修改到落盘的延迟）、flushes和errors的统计数据
+    """
+    now = time.monotonic()
+    with _cond:
+        oldest = min((e.since for e in _dirty.values()), default=None)
+        return {
+            'dirty': len(_dirty),
+            'pendingWrites': sum(e.count for e in _dirty.values()),
+            'flushLagMs': round((now - oldest) * 1000, 2) if oldest is not None else 0.0,
+            'lastFlushLagMs': _stats['lastFlushLagMs'],
+            'maxFlushLagMs': _stats['maxFlushLagMs'],
+            'flushes': _stats['flushes'],
+            'errors': _stats['errors']
+        }
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect, useCallback, useRef } from 'react'
 import { Layout, Button, message, Row, Col } from 'antd'
 import { PlusOutlined } from '@ant-design/icons'
 import ProjectModal from './components/ProjectModal'
@@ -8,8 +8,9 @@ import ProductLineSettings from './components/ProductLineSettings'
 import ProductLineManagement from './components/ProductLineManagement'
 import TimelineSettings from './components/TimelineSettings'
 import OwnerManagement from './components/OwnerManagement'
-import { getProjects, getProductLines, getSettings, updateVisibleProductLines, getOwners } from './services/api'
+import { getProjects, getProjectDateRange, getProductLines, getSettings, updateVisibleProductLines, getOwners } from './services/api'
 import { loadTimelineSettings, saveTimelineSettings } from './utils/storageUtils'
+import { calculateCustomTimelineParams } from './utils/dateUtils'
 import { DEFAULT_VISIBLE_MONTHS, BOARD_TYPES } from './utils/constants'
 import './styles/calendar.css'
 
@@ -17,6 +18,8 @@ const { Header, Content } = Layout
 
 function App() {
   const [projects, setProjects] = useState([])
+  // 可见产品线全部项目的日期范围（projects只包含时间轴范围内的项目）
+  const [projectsDateRange, setProjectsDateRange] = useState(null)
   const [productLines, setProductLines] = useState([])
   const [loading, setLoading] = useState(true)
   const [modalVisible, setModalVisible] = useState(false)
@@ -25,6 +28,8 @@ function App() {
   const [managementVisible, setManagementVisible] = useState(false)
   const [ownerManagementVisible, setOwnerManagementVisible] = useState(false)
   const [owners, setOwners] = useState([])
+  // 最近一次项目请求的序号（丢弃先发后到的旧响应）
+  const projectsRequestRef = useRef(0)
   
   // 左侧设置面板展开/收起状态（从localStorage读取）
   const [settingsPanelCollapsed, setSettingsPanelCollapsed] = useState(() => {
@@ -85,21 +90,77 @@ function App() {
   }, [settingsPanelCollapsed])
 
   /**
-   * 加载项目、产品线和设置数据
+   * 加载项目（由服务端按可见产品线和时间轴范围筛选）
+   * 日历视图可以切换到任意月份，只按产品线筛选
+   */
+  const loadProjects = useCallback(async () => {
+    const requestId = ++projectsRequestRef.current
+    if (selectedProductLines.length === 0) {
+      setProjects([])
+      return
+    }
+    
+    const filters = { productLineIds: selectedProductLines }
+    if (viewType !== 'calendar') {
+      const { minDate, maxDate } = calculateCustomTimelineParams(timelineRange.type, timelineRange.customRange)
+      filters.from = minDate.format('YYYY-MM-DD')
+      filters.to = maxDate.format('YYYY-MM-DD')
+    }
+    
+    try {
+      const projectsData = await getProjects(filters)
+      if (requestId === projectsRequestRef.current) {
+        setProjects(projectsData)
+      }
+    } catch (error) {
+      message.error('项目加载失败: ' + error.message)
+    }
+  }, [selectedProductLines, viewType, timelineRange])
+
+  /**
+   * 可见产品线、视图类型或时间轴范围变化后重新加载项目
+   */
+  useEffect(() => {
+    loadProjects()
+  }, [loadProjects])
+
+  /**
+   * 可见产品线变化（或数据重新加载）后更新项目的整体日期范围
+   */
+  useEffect(() => {
+    if (selectedProductLines.length === 0) {
+      setProjectsDateRange(null)
+      return
+    }
+    let cancelled = false
+    getProjectDateRange(selectedProductLines)
+      .then(range => {
+        if (!cancelled) {
+          setProjectsDateRange(range.minDate && range.maxDate ? range : null)
+        }
+      })
+      .catch(error => {
+        console.error('获取项目时间范围失败:', error)
+      })
+    return () => {
+      cancelled = true
+    }
+  }, [selectedProductLines])
+
+  /**
+   * 加载产品线、人员和设置数据（项目随之按可见产品线重新加载）
    */
   const loadData = async () => {
     try {
       setLoading(true)
       
       // 并行加载所有数据
-      const [projectsData, productLinesData, settingsData, ownersData] = await Promise.all([
-        getProjects(),
+      const [productLinesData, settingsData, ownersData] = await Promise.all([
         getProductLines(),
         getSettings(),
         getOwners()
       ])
       
-      setProjects(projectsData)
       setProductLines(productLinesData)
       setOwners(ownersData.owners || [])
       
@@ -327,7 +388,7 @@ function App() {
               {/* 时间轴设置 - 收起时隐藏 */}
               {!settingsPanelCollapsed && (
                 <TimelineSettings
-                  projects={projects}
+                  projectsDateRange={projectsDateRange}
                   currentRange={timelineRange}
                   onRangeChange={handleRangeChange}
                   visibleMonths={visibleMonths}
@@ -406,7 +467,6 @@ function App() {
         visible={managementVisible}
         onClose={handleCloseManagement}
         productLines={productLines}
-        projects={projects}
         selectedProductLines={selectedProductLines}
         onRefresh={handleManagementRefresh}
         onVisibilityChange={handleProductLineSelectionChange}
@@ -73,8 +73,7 @@ function DraggableRow({ id, children, ...props }) {
  * 
  * @param {boolean} visible - 抽屉是否可见
  * @param {function} onClose - 关闭回调
- * @param {Array} productLines - 产品线列表
- * @param {Array} projects - 项目列表（用于统计关联数）
+ * @param {Array} productLines - 产品线列表（含服务端统计的关联项目数projectCount）
  * @param {Array} selectedProductLines - 选中的产品线ID列表
  * @param {function} onRefresh - 刷新数据回调
  * @param {function} onVisibilityChange - 显示状态变化回调
@@ -83,7 +82,6 @@ function ProductLineManagement({
   visible,
   onClose,
   productLines,
-  projects,
   selectedProductLines,
   onRefresh,
   onVisibilityChange
@@ -149,7 +147,8 @@ function ProductLineManagement({
    * @returns {number} 关联的项目数量
    */
   const getRelatedProjectsCount = (productLineId) => {
-    return projects.filter(p => p.productLineId === productLineId).length
+    const productLine = productLines.find(pl => pl.id === productLineId)
+    return productLine?.projectCount || 0
   }
 
   /**
@@ -2,7 +2,7 @@ import { Card, Radio, DatePicker, Button, Space, message, Slider } from 'antd'
 import { ZoomInOutlined, ZoomOutOutlined } from '@ant-design/icons'
 import { useState, useEffect, useCallback } from 'react'
 import dayjs from 'dayjs'
-import { getProjectsDateRange, validateDateRange } from '../utils/dateUtils'
+import { validateDateRange } from '../utils/dateUtils'
 import { MIN_VISIBLE_MONTHS, MAX_VISIBLE_MONTHS } from '../utils/constants'
 import '../styles/timeline-settings.css'
 
@@ -11,7 +11,7 @@ const { RangePicker } = DatePicker
 /**
  * 时间轴设置组件
  * 提供时间范围设置、缩放控制和单月宽度调整功能
- * @param {Array} projects - 项目列表
+ * @param {Object|null} projectsDateRange - 可见产品线全部项目的日期范围 { minDate, maxDate }，无项目时为null
  * @param {Object} currentRange - 当前时间范围 { type, customRange }
  * @param {Function} onRangeChange - 时间范围变化回调
  * @param {Number} visibleMonths - 当前缩放级别
@@ -21,7 +21,7 @@ const { RangePicker } = DatePicker
  * @param {Function} onMonthWidthReset - 重置单月宽度回调
  */
 function TimelineSettings({ 
-  projects, 
+  projectsDateRange, 
   currentRange, 
   onRangeChange, 
   visibleMonths, 
@@ -38,17 +38,8 @@ function TimelineSettings({
       : null
   )
   const [showCustomPicker, setShowCustomPicker] = useState(currentRange.type === 'custom')
-  const [projectsDateRange, setProjectsDateRange] = useState(null)
   const [validationWarning, setValidationWarning] = useState(null)
 
-  /**
-   * 计算并更新项目时间范围提示
-   */
-  useEffect(() => {
-    const range = getProjectsDateRange(projects)
-    setProjectsDateRange(range)
-  }, [projects])
-
   /**
    * 同步外部传入的currentRange
    */
@@ -146,14 +146,57 @@ export const reorderProductLines = async (orderList) => {
 // ==================== 项目API ====================
 
 /**
- * 获取所有项目
+ * 获取项目（不传筛选条件时返回全部热数据）
+ * @param {Object} [filters] - 筛选条件（由服务端按索引筛选）
+ * @param {string} [filters.from] - 只返回结束日期不早于该日期的项目 (YYYY-MM-DD)
+ * @param {string} [filters.to] - 只返回开始日期不晚于该日期的项目 (YYYY-MM-DD)
+ * @param {Array<string>} [filters.productLineIds] - 产品线ID列表
+ * @param {Array<string>} [filters.ownerIds] - 负责人ID列表
+ * @param {Array<string>} [filters.status] - 项目状态列表
+ * @param {boolean} [filters.isPending] - 只返回暂定或非暂定项目
  * @returns {Promise<Array>} 项目列表
  */
-export async function getProjects() {
-  const data = await fetchWithErrorHandling(`${API_BASE_URL}/projects`)
+export async function getProjects(filters = {}) {
+  const params = new URLSearchParams()
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value === undefined || value === null) return
+    params.set(key, Array.isArray(value) ? value.join(',') : String(value))
+  })
+  const query = params.toString()
+  const data = await fetchWithErrorHandling(`${API_BASE_URL}/projects${query ? `?${query}` : ''}`)
   return data.data.projects
 }
 
+/**
+ * 按游标分页获取项目
+ * @param {Object} [params] - 分页参数，筛选条件同 getProjects
+ * @param {number} [params.limit] - 每页数量（默认100，最大1000）
+ * @param {string} [params.sort] - 排序字段：startDate、endDate、updatedAt、createdAt 或 name
+ * @param {string} [params.order] - asc 或 desc
+ * @param {string} [params.cursor] - 上一页返回的 nextCursor
+ * @returns {Promise<Object>} { projects, nextCursor }，没有下一页时 nextCursor 为 null
+ */
+export async function getProjectsPage(params = {}) {
+  const query = new URLSearchParams()
+  Object.entries({ limit: 100, ...params }).forEach(([key, value]) => {
+    if (value === undefined || value === null) return
+    query.set(key, Array.isArray(value) ? value.join(',') : String(value))
+  })
+  const data = await fetchWithErrorHandling(`${API_BASE_URL}/projects?${query}`)
+  return data.data
+}
+
+/**
+ * 获取项目的整体日期范围（不受时间轴范围影响，不含归档项目）
+ * @param {Array<string>} [productLineIds] - 只统计这些产品线的项目
+ * @returns {Promise<Object>} { minDate, maxDate }，没有项目时均为 null
+ */
+export async function getProjectDateRange(productLineIds = []) {
+  const query = productLineIds.length > 0 ? `?productLineIds=${encodeURIComponent(productLineIds.join(','))}` : ''
+  const data = await fetchWithErrorHandling(`${API_BASE_URL}/projects/date-range${query}`)
+  return data.data
+}
+
 /**
  * 根据ID获取项目
  * @param {string} projectId - 项目ID
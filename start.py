@@ -264,8 +264,10 @@ def start_backend():
     try:
         # 启动Flask服务器（不捕获输出，让其直接显示在终端）
         # 注意：不设置cwd，直接使用相对路径运行
+        # 以新会话启动（非Windows），停止时可以向后端的整个进程组发送信号
         process = subprocess.Popen(
-            [sys.executable, str(app_file)]
+            [sys.executable, str(app_file)],
+            start_new_session=(os.name != 'nt')
         )
         
         # Flask在debug模式下会重启，需要等待更长时间
@@ -361,7 +363,12 @@ def cleanup(backend_process, frontend_process):
     print_info("\n正在关闭服务...")
     
     if backend_process and backend_process.poll() is None:
-        backend_process.terminate()
+        if os.name != 'nt':
+            # debug模式下真正处理请求的是子进程：发送SIGHUP让其落盘延迟写入的数据后退出
+            # （见backend/app.py的install_shutdown_handlers）
+            os.killpg(backend_process.pid, signal.SIGHUP)
+        else:
+            backend_process.terminate()
         backend_process.wait(timeout=5)
         print_success("后端服务已关闭")
     